@@ -0,0 +1,439 @@
+import os
+import re
+import struct
+from array import array
+from typing import Dict, List, Tuple
+
+AVIIF_KEYFRAME = 0x10
+AVI_INDEX_OF_INDEXES = 0x00
+AVI_INDEX_OF_CHUNKS = 0x01
+ODML_NOT_KEYFRAME = 0x80000000
+CHUNK_HEADER_SIZE = 8  # fourcc + size in front of every AVI chunk payload
+
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+VIDEO_CHUNK_TYPES = (b'dc', b'db')
+_VIDEO_CHUNK_RE = re.compile(rb'[0-9]{2}d[cb]')
+_MOVI_CHUNK_RE = re.compile(rb'[0-9]{2}(?:d[cb]|wb|pc|tx)|ix[0-9]{2}|JUNK|LIST')
+
+class FrameIndex:
+    """
+    Compact frame table for a video file.
+    offsets are chunk header offsets (the payload starts header_size bytes
+    later: 8 for AVI chunks, 0 for MP4 samples),
+    sizes are declared payload sizes, flags are idx1 flags (AVIIF_KEYFRAME)
+    and stream_ids the two-digit stream number from the chunk id.
+    coded_starts/coded_ends (relative to the payload) and frame_types are
+    filled in by bitstream.analyze_index for codec-aware glitching.
+    """
+    def __init__(self, source: str = 'walk'):
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.flags = array('I')
+        self.stream_ids = array('H')
+        self.coded_starts = array('I')
+        self.coded_ends = array('I')
+        self.frame_types = array('B')   # bitstream.FRAME_* codes
+        self.source = source        # 'indx', 'idx1', 'idx1+walk', 'walk', 'scan' or 'stbl' (MP4 sample tables)
+        self.micro_sec_per_frame = 0
+        self.streams: Dict[int, Dict] = {}  # stream id -> strh fields
+        self.cached = False                 # True when loaded from a sidecar cache
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, offset: int, size: int, flags: int = 0, stream_id: int = 0):
+        self.offsets.append(offset)
+        self.sizes.append(size)
+        self.flags.append(flags)
+        self.stream_ids.append(stream_id)
+
+    def chunk(self, i: int) -> Tuple[int, int]:
+        return self.offsets[i], self.sizes[i]
+
+    def chunks(self) -> List[Tuple[int, int]]:
+        """Frame table as the (offset, size) tuples returned by HexFucker.find_frame_chunks"""
+        return list(zip(self.offsets, self.sizes))
+
+    @property
+    def has_keyframe_flags(self) -> bool:
+        return self.source in ('indx', 'idx1', 'stbl')
+
+    @property
+    def header_size(self) -> int:
+        return 0 if self.source == 'stbl' else CHUNK_HEADER_SIZE
+
+    def is_keyframe(self, i: int) -> bool:
+        return bool(self.flags[i] & AVIIF_KEYFRAME)
+
+    @property
+    def has_bitstream_info(self) -> bool:
+        return len(self.frame_types) == len(self.offsets)
+
+    def coded_range(self, i: int) -> Tuple[int, int]:
+        """Coded bytes of frame i relative to its payload start (bitstream info required)"""
+        return self.coded_starts[i], self.coded_ends[i]
+
+    @property
+    def fps(self) -> float:
+        """Video frame rate from the strh rate/scale, else from avih (25 if neither is set)"""
+        for info in self.streams.values():
+            if info['type'] == 'vids' and info['scale'] and info['rate']:
+                return info['rate'] / info['scale']
+        if self.micro_sec_per_frame:
+            return 1000000 / self.micro_sec_per_frame
+        return 25.0
+
+    def sort(self):
+        """Order frames by file offset (needed after merging several streams or segments)"""
+        order = sorted(range(len(self.offsets)), key=self.offsets.__getitem__)
+        if all(order[i] == i for i in range(len(order))):
+            return
+        names = ['offsets', 'sizes', 'flags', 'stream_ids']
+        if self.has_bitstream_info:
+            names += ['coded_starts', 'coded_ends', 'frame_types']
+        for name in names:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in order]))
+
+class _Reader:
+    """Random access over a path, a binary file object or an in-memory buffer"""
+    def __init__(self, source):
+        self._file = None
+        self._buffer = None
+        self._owned = False
+        if isinstance(source, (str, os.PathLike)):
+            self._file = open(source, 'rb')
+            self._owned = True
+        elif hasattr(source, 'read') and not hasattr(source, 'find'):
+            self._file = source
+        else:
+            self._buffer = source
+        if self._file is not None:
+            self.size = self._file.seek(0, os.SEEK_END)
+        else:
+            self.size = len(self._buffer)
+
+    def read_at(self, pos: int, n: int) -> bytes:
+        if self._file is not None:
+            self._file.seek(pos)
+            return self._file.read(n)
+        return bytes(self._buffer[pos:pos + n])
+
+    def header_at(self, pos: int):
+        """Return (fourcc, size) of the chunk header at pos, or None past EOF"""
+        raw = self.read_at(pos, 8)
+        if len(raw) < 8:
+            return None
+        return raw[:4], struct.unpack('<I', raw[4:])[0]
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+
+def _u32_array(raw: bytes) -> array:
+    table = array('I', raw)
+    if struct.pack('=I', 1) != struct.pack('<I', 1):
+        table.byteswap()
+    return table
+
+def _stream_id(ckid: bytes) -> int:
+    return (ckid[0] - 48) * 10 + (ckid[1] - 48)
+
+def _is_video_ckid(ckid: bytes) -> bool:
+    return len(ckid) == 4 and ckid[:2].isdigit() and ckid[2:] in VIDEO_CHUNK_TYPES
+
+def _next_chunk(pos: int, size: int) -> int:
+    return pos + 8 + size + (size & 1)
+
+class _AviLayout:
+    def __init__(self):
+        self.movi_lists: List[Tuple[int, int]] = []  # (offset of 'movi' fourcc, end offset)
+        self.idx1 = None                            # (payload offset, size)
+        self.super_indexes: Dict[int, bytes] = {}   # stream id -> indx payload
+        self.streams: Dict[int, Dict] = {}
+        self.micro_sec_per_frame = 0
+
+def _parse_strl(reader: _Reader, pos: int, end: int, stream_id: int, layout: _AviLayout):
+    while pos + 8 <= end:
+        header = reader.header_at(pos)
+        if header is None:
+            return
+        fcc, size = header
+        if fcc == b'strh' and size >= 48:
+            raw = reader.read_at(pos + 8, 48)
+            fcc_type, handler = raw[0:4], raw[4:8]
+            scale, rate, start, length = struct.unpack('<IIII', raw[20:36])
+            layout.streams[stream_id] = {
+                'type': fcc_type.decode('latin-1'),
+                'handler': handler.decode('latin-1'),
+                'scale': scale,
+                'rate': rate,
+                'start': start,
+                'length': length,
+            }
+        elif fcc == b'indx':
+            layout.super_indexes[stream_id] = reader.read_at(pos + 8, size)
+        pos = _next_chunk(pos, size)
+
+def _parse_hdrl(reader: _Reader, pos: int, end: int, layout: _AviLayout):
+    stream_id = 0
+    while pos + 8 <= end:
+        header = reader.header_at(pos)
+        if header is None:
+            return
+        fcc, size = header
+        if fcc == b'avih' and size >= 4:
+            layout.micro_sec_per_frame = struct.unpack('<I', reader.read_at(pos + 8, 4))[0]
+        elif fcc == b'LIST' and reader.read_at(pos + 8, 4) == b'strl':
+            _parse_strl(reader, pos + 12, min(_next_chunk(pos, size), end), stream_id, layout)
+            stream_id += 1
+        pos = _next_chunk(pos, size)
+
+def _parse_riff(reader: _Reader, pos: int, end: int, layout: _AviLayout):
+    while pos + 8 <= end:
+        header = reader.header_at(pos)
+        if header is None:
+            return
+        fcc, size = header
+        if fcc == b'LIST':
+            list_type = reader.read_at(pos + 8, 4)
+            list_end = min(_next_chunk(pos, size), reader.size)
+            if list_type == b'hdrl':
+                _parse_hdrl(reader, pos + 12, list_end, layout)
+            elif list_type == b'movi':
+                layout.movi_lists.append((pos + 8, list_end))
+        elif fcc == b'idx1' and layout.idx1 is None:
+            layout.idx1 = (pos + 8, min(size, reader.size - pos - 8))
+        pos = _next_chunk(pos, size)
+
+def _read_layout(reader: _Reader):
+    """Walk top-level RIFF/AVIX segments; returns None if this is not a RIFF AVI"""
+    if reader.read_at(0, 4) != b'RIFF' or reader.read_at(8, 4) != b'AVI ':
+        return None
+    layout = _AviLayout()
+    pos = 0
+    while pos + 12 <= reader.size:
+        header = reader.header_at(pos)
+        if header is None or header[0] != b'RIFF':
+            break
+        fcc, size = header
+        segment_end = min(_next_chunk(pos, size), reader.size)
+        # A zero or truncated RIFF size (streamed or unfinished captures) means "until EOF"
+        if size == 0 or segment_end <= pos + 12:
+            segment_end = reader.size
+        _parse_riff(reader, pos + 12, segment_end, layout)
+        pos = segment_end
+    return layout
+
+def _video_stream_ids(layout: _AviLayout):
+    ids = {sid for sid, info in layout.streams.items() if info['type'] == 'vids'}
+    return ids or None
+
+def _index_from_indx(reader: _Reader, layout: _AviLayout, video_ids) -> FrameIndex:
+    index = FrameIndex('indx')
+    for stream_id, payload in sorted(layout.super_indexes.items()):
+        if video_ids is not None and stream_id not in video_ids:
+            continue
+        if len(payload) < 24:
+            continue
+        longs_per_entry, sub_type, index_type, entries, chunk_id = struct.unpack('<HBBI4s', payload[:12])
+        if video_ids is None and not _is_video_ckid(chunk_id):
+            continue
+        if index_type == AVI_INDEX_OF_INDEXES:
+            for i in range(entries):
+                entry = payload[24 + i * 16:24 + (i + 1) * 16]
+                if len(entry) < 16:
+                    break
+                ix_offset, ix_size, _duration = struct.unpack('<QII', entry)
+                header = reader.header_at(ix_offset)
+                if header is None:
+                    continue
+                _append_std_index(index, reader.read_at(ix_offset + 8, header[1]), stream_id)
+        elif index_type == AVI_INDEX_OF_CHUNKS:
+            _append_std_index(index, payload, stream_id)
+    index.sort()
+    return index
+
+def _append_std_index(index: FrameIndex, payload: bytes, stream_id: int):
+    """Append the entries of an OpenDML standard index ('ix##') chunk"""
+    if len(payload) < 24:
+        return
+    longs_per_entry, sub_type, index_type, entries, chunk_id, base_offset = struct.unpack('<HBBI4sQ', payload[:20])
+    stride = 4 * max(2, longs_per_entry)
+    entries = min(entries, (len(payload) - 24) // stride)
+    table = _u32_array(payload[24:24 + entries * stride])
+    step = stride // 4
+    for rel_offset, size in zip(table[0::step], table[1::step]):
+        flags = 0 if size & ODML_NOT_KEYFRAME else AVIIF_KEYFRAME
+        # ix## offsets point at the payload, not the chunk header
+        index.append(base_offset + rel_offset - 8, size & ~ODML_NOT_KEYFRAME, flags, stream_id)
+
+def _index_from_idx1(reader: _Reader, layout: _AviLayout, video_ids) -> FrameIndex:
+    index = FrameIndex('idx1')
+    pos, size = layout.idx1
+    raw = reader.read_at(pos, size - size % 16)
+    table = _u32_array(raw)
+    ckids, flags, offsets, sizes = table[0::4], table[1::4], table[2::4], table[3::4]
+    wanted = set()
+    for ckid in set(ckids):
+        fcc = struct.pack('<I', ckid)
+        if _is_video_ckid(fcc) and (video_ids is None or _stream_id(fcc) in video_ids):
+            wanted.add(ckid)
+    if not wanted:
+        return index
+    base = _idx1_base(reader, layout, ckids, offsets, wanted)
+    stream_of = {ckid: _stream_id(struct.pack('<I', ckid)) for ckid in wanted}
+    for ckid, flag, offset, chunk_size in zip(ckids, flags, offsets, sizes):
+        if ckid in wanted:
+            index.append(base + offset, chunk_size, flag, stream_of[ckid])
+    return index
+
+def _idx1_base(reader: _Reader, layout: _AviLayout, ckids, offsets, wanted) -> int:
+    """idx1 offsets are usually relative to the 'movi' fourcc, but some muxers write absolute offsets"""
+    movi_start = layout.movi_lists[0][0] if layout.movi_lists else 0
+    for ckid, offset in zip(ckids, offsets):
+        if ckid in wanted:
+            expected = struct.pack('<I', ckid)
+            if reader.read_at(movi_start + offset, 4) == expected:
+                return movi_start
+            if reader.read_at(offset, 4) == expected:
+                return 0
+            break
+    return movi_start
+
+def _plausible_header(reader: _Reader, pos: int, end: int) -> bool:
+    header = reader.header_at(pos)
+    if header is None:
+        return pos >= reader.size
+    fcc, size = header
+    if not _MOVI_CHUNK_RE.fullmatch(fcc):
+        return False
+    return fcc == b'LIST' or _next_chunk(pos, size) <= end + 1
+
+def _resync(reader: _Reader, pos: int, end: int) -> int:
+    """Find the next chunk header after damage whose declared size leads to another valid header"""
+    while pos < end:
+        block = reader.read_at(pos, min(SCAN_BLOCK_SIZE, end - pos))
+        if not block:
+            break
+        for match in _MOVI_CHUNK_RE.finditer(block):
+            at = pos + match.start()
+            header = reader.header_at(at)
+            if header is None:
+                return end
+            following = _next_chunk(at, header[1])
+            if header[0] != b'LIST' and following <= end + 1 and (following >= end or _plausible_header(reader, following, end)):
+                return at
+        pos += max(1, len(block) - 3)
+    return end
+
+def _walk_movi(reader: _Reader, pos: int, end: int, index: FrameIndex, video_ids) -> bool:
+    """
+    Append video chunks of a movi list by following declared sizes.
+    Damaged headers are skipped by resynchronising on the next valid chunk chain;
+    returns False if that was necessary.
+    """
+    intact = True
+    while pos + 8 <= end:
+        header = reader.header_at(pos)
+        if header is None:
+            break
+        fcc, size = header
+        if fcc == b'LIST':
+            # 'rec ' groups: descend into the list body
+            pos += 12
+            continue
+        if not _MOVI_CHUNK_RE.fullmatch(fcc) or _next_chunk(pos, size) > end + 1:
+            intact = False
+            pos = _resync(reader, pos + 1, end)
+            continue
+        if _is_video_ckid(fcc) and (video_ids is None or _stream_id(fcc) in video_ids):
+            index.append(pos, size, 0, _stream_id(fcc))
+        pos = _next_chunk(pos, size)
+    return intact
+
+def _scan_range(reader: _Reader, start: int, end: int, index: FrameIndex, video_ids):
+    """Byte-scan fallback for damaged or index-less data"""
+    pos = start
+    while pos < end:
+        block = reader.read_at(pos, min(SCAN_BLOCK_SIZE, end - pos) + 7)
+        if not block:
+            break
+        limit = min(SCAN_BLOCK_SIZE, end - pos)
+        for match in _VIDEO_CHUNK_RE.finditer(block, 0, limit + 3):
+            if match.start() >= limit:
+                break
+            at = match.start()
+            if at + 8 > len(block):
+                continue
+            fcc = block[at:at + 4]
+            if video_ids is not None and _stream_id(fcc) not in video_ids:
+                continue
+            index.append(pos + at, struct.unpack('<I', block[at + 4:at + 8])[0], 0, _stream_id(fcc))
+        pos += limit
+
+def _scan_file(source, reader: _Reader, index: FrameIndex, video_ids):
+    """
+    Whole-file fallback: paths and buffers go through the chain-validating
+    (and, for paths, multi-core) recovery scanner; file objects are byte-scanned.
+    """
+    if reader._file is not None and not reader._owned:
+        _scan_range(reader, 0, reader.size, index, video_ids)
+        return
+    from recovery import scan_chunks
+    scan_chunks(source, index, video_ids)
+
+def index_avi(source) -> FrameIndex:
+    """
+    Build the frame table for an AVI file without scanning its payload.
+    source may be a path, a binary file object or a buffer (bytes, bytearray, mmap).
+    Prefers the OpenDML super index, then idx1, then walks the movi lists
+    by declared chunk size; a byte scan is only used for damaged files.
+    """
+    reader = _Reader(source)
+    try:
+        layout = _read_layout(reader)
+        if layout is None:
+            index = FrameIndex('scan')
+            _scan_file(source, reader, index, None)
+            return index
+        video_ids = _video_stream_ids(layout)
+        index = None
+        if layout.super_indexes:
+            index = _index_from_indx(reader, layout, video_ids)
+        if not index and layout.idx1 is not None:
+            index = _index_from_idx1(reader, layout, video_ids)
+            if index and len(layout.movi_lists) > 1:
+                # idx1 only covers the first RIFF segment; walk the AVIX extensions. Walked frames
+                # have no keyframe flags, so the index as a whole no longer claims to have them
+                indexed = len(index)
+                for movi_start, movi_end in layout.movi_lists[1:]:
+                    _walk_movi(reader, movi_start + 4, movi_end, index, video_ids)
+                if len(index) > indexed:
+                    index.source = 'idx1+walk'
+        if not index:
+            index = FrameIndex('walk')
+            for movi_start, movi_end in layout.movi_lists:
+                if not _walk_movi(reader, movi_start + 4, movi_end, index, video_ids):
+                    index.source = 'scan'
+            if not layout.movi_lists:
+                index.source = 'scan'
+                _scan_file(source, reader, index, video_ids)
+        index.micro_sec_per_frame = layout.micro_sec_per_frame
+        index.streams = layout.streams
+        return index
+    finally:
+        reader.close()
+
+def index_video(source) -> FrameIndex:
+    """Frame table of an AVI file (index_avi) or an MP4/MOV file (mp4_index.index_mp4)"""
+    reader = _Reader(source)
+    try:
+        head = reader.read_at(0, 12)
+    finally:
+        reader.close()
+    if head[:4] != b'RIFF':
+        from mp4_index import index_mp4, is_iso_bmff
+        if is_iso_bmff(head):
+            return index_mp4(source)
+    return index_avi(source)
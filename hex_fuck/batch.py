@@ -0,0 +1,262 @@
+import io
+import os
+import csv
+import glob
+import json
+import time
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# Settings a manifest row may override; defaults come from the hex_fucker command line
+JOB_SETTINGS = {
+    'pattern': str,
+    'strategy': str,
+    'value': int,
+    'max_glitches': int,
+    'intensity': str,
+    'seed': int,
+    'smear_mode': bool,
+    'auto_encode': bool,
+    'output_mode': str,
+    'select': str,
+    'smear_size': int,
+    'smear_drift': str,
+    'codec_aware': bool,
+}
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.mov', '.m4v')
+GLITCHED_SUFFIX = '_glitched'  # Default output names; directory and glob batches skip files containing it
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+def _coerce(settings: Dict) -> Dict:
+    """Type job settings per JOB_SETTINGS, dropping empty values; raises ValueError for unknown keys"""
+    unknown = sorted(key for key in settings if key.strip().replace('-', '_') not in JOB_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown job settings: {', '.join(unknown)}")
+    out = {}
+    for key, value in settings.items():
+        key = key.strip().replace('-', '_')
+        if value is None or value == '':
+            continue
+        kind = JOB_SETTINGS[key]
+        out[key] = _to_bool(value) if kind is bool else kind(value)
+    return out
+
+def _default_output(input_path: str, out_dir: Optional[str]) -> str:
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    return os.path.join(out_dir or os.path.dirname(input_path), f"{stem}{GLITCHED_SUFFIX}{ext or '.avi'}")
+
+def _is_glitched_output(path: str) -> bool:
+    return GLITCHED_SUFFIX in os.path.splitext(os.path.basename(path))[0]
+
+def load_jobs(spec: str, defaults: Dict, out_dir: Optional[str] = None) -> List[Dict]:
+    """
+    Expand a batch spec into job dicts (input, output and settings).
+    spec is a directory (every file in it with one of VIDEO_EXTENSIONS), a
+    glob pattern, or a manifest: .json (a list of objects) or .csv (header
+    row) with input, output and optional per-job settings columns. Directory
+    and glob batches skip files named like outputs (*_glitched*), so a rerun
+    does not glitch the previous run's results. Raises ValueError for
+    unreadable manifests and rows without an input or with unknown or bad
+    settings.
+    """
+    if os.path.isdir(spec):
+        inputs = sorted(os.path.join(spec, name) for name in os.listdir(spec)
+                        if name.lower().endswith(VIDEO_EXTENSIONS) and not _is_glitched_output(name))
+        rows = [{'input': path} for path in inputs]
+    elif spec.lower().endswith('.json') and os.path.isfile(spec):
+        with open(spec, 'r') as f:
+            try:
+                rows = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON manifest {spec}: {e}") from None
+        if not isinstance(rows, list):
+            raise ValueError(f"A JSON manifest must be a list of job objects: {spec}")
+    elif spec.lower().endswith('.csv') and os.path.isfile(spec):
+        with open(spec, 'r', newline='') as f:
+            try:
+                rows = list(csv.DictReader(f))
+            except csv.Error as e:
+                raise ValueError(f"Invalid CSV manifest {spec}: {e}") from None
+    else:
+        rows = [{'input': path} for path in sorted(glob.glob(spec)) if not _is_glitched_output(path)]
+    base = os.path.dirname(os.path.abspath(spec)) if os.path.isfile(spec) else None
+    jobs = []
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict) or not isinstance(row.get('input'), str) or not row['input']:
+            raise ValueError(f"Manifest row {number} has no 'input' path")
+        if row.get('output') is not None and not isinstance(row['output'], str):
+            raise ValueError(f"Manifest row {number}: 'output' must be a path")
+        if None in row:
+            raise ValueError(f"Manifest row {number} has more fields than the header")
+        input_path = row['input']
+        if base is not None and not os.path.isabs(input_path):
+            input_path = os.path.join(base, input_path)
+        output_path = row.get('output') or _default_output(input_path, out_dir)
+        if base is not None and not os.path.isabs(output_path) and row.get('output'):
+            output_path = os.path.join(base, output_path)
+        settings = dict(defaults)
+        try:
+            settings.update(_coerce({key: value for key, value in row.items() if key not in ('input', 'output')}))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Manifest row {number}: {e}") from None
+        jobs.append({'input': input_path, 'output': output_path, 'settings': settings})
+    return jobs
+
+def _init_worker():
+    # Load the pattern bank once per worker rather than once per job
+    from patterns import GLITCH_PATTERNS
+    len(GLITCH_PATTERNS)
+
+def _build_config(settings: Dict):
+    from glitcher import GlitchConfig, SMEAR_STEP_MAX, SMEAR_STEP_MIN, SMEAR_WRITE_SIZE, parse_smear_drift
+    from intensity import get_intensity_params
+    from patterns import resolve_patterns
+    try:
+        patterns = resolve_patterns(settings['pattern'])
+    except KeyError as e:
+        raise ValueError(f"Pattern {e} not found") from None
+    intensity_params = get_intensity_params(settings['intensity'])
+    if settings.get('select'):
+        from selection import FrameSelection
+        FrameSelection(settings['select'])
+    return GlitchConfig(
+        patterns=patterns,
+        target_strategy=settings['strategy'],
+        target_value=settings['value'],
+        max_glitches=settings['max_glitches'],
+        skip_header_bytes=intensity_params['skip_header_bytes'],
+        glitch_size=intensity_params['overwrite_size_max'],
+        intensity=settings['intensity'],
+        seed=settings.get('seed'),
+        select=settings.get('select'),
+        smear_size=settings.get('smear_size', SMEAR_WRITE_SIZE),
+        smear_drift=parse_smear_drift(settings.get('smear_drift', f'{SMEAR_STEP_MIN}:{SMEAR_STEP_MAX}')),
+        codec_aware=settings.get('codec_aware', False),
+    )
+
+def run_glitch_job(input_path: str, output_path: str, settings: Dict, frame_index=None, hooks=None) -> Dict:
+    """
+    Glitch one file; returns a status dict (never raises).
+    frame_index skips indexing the input; hooks are passed on to the run's RunStats.
+    """
+    from glitcher import HexFucker
+    from stats import RunStats
+    start = time.perf_counter()
+    messages = io.StringIO()
+    result = {'input': input_path, 'output': output_path, 'ok': False, 'glitches': 0, 'error': None}
+    try:
+        config = _build_config(settings)
+        hex_fucker = HexFucker(config, smear_mode=settings.get('smear_mode', False),
+                               output_mode=settings.get('output_mode', 'mmap'), stats=RunStats(hooks))
+        with redirect_stdout(messages):
+            result['ok'] = hex_fucker.fuck_video(input_path, output_path, frame_index=frame_index,
+                                                 use_index_cache=not settings.get('auto_encode'))
+        result['glitches'] = len(hex_fucker.glitch_log)
+        result['stats'] = hex_fucker.stats.as_dict()
+        if not result['ok']:
+            lines = messages.getvalue().strip().splitlines()
+            result['error'] = lines[-1] if lines else 'unknown error'
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_jobs(jobs: List[Dict], workers: Optional[int] = None, ffmpeg_jobs: int = 1,
+             on_result=None) -> List[Dict]:
+    """
+    Run jobs on a bounded process pool. Jobs with auto_encode first go through
+    FFmpeg on a separate pool of at most ffmpeg_jobs concurrent encodes (into
+    unique temp files), then join the glitch queue.
+    """
+    from ffmpeg_utils import run_ffmpeg_auto_encode, cleanup_temp_file, make_temp_encode_path
+    workers = max(1, workers or os.cpu_count() or 1)
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    lock = threading.Lock()
+
+    def failure(i: int, error: str) -> Dict:
+        return {'output': jobs[i]['output'], 'ok': False, 'glitches': 0, 'seconds': 0.0, 'error': error}
+
+    def finish(i: int, result: Dict, temp_path: Optional[str] = None):
+        if temp_path is not None:
+            cleanup_temp_file(temp_path)
+        result['input'] = jobs[i]['input']
+        with lock:
+            results[i] = result
+            if on_result is not None:
+                on_result(result)
+
+    def finish_future(i: int, future, temp_path: Optional[str] = None):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = failure(i, f"Worker failed: {e}")
+        finish(i, result, temp_path)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as glitch_pool, \
+            ThreadPoolExecutor(max_workers=max(1, ffmpeg_jobs)) as encode_pool:
+
+        def submit_glitch(i: int, input_path: str, temp_path: Optional[str] = None):
+            job = jobs[i]
+            future = glitch_pool.submit(run_glitch_job, input_path, job['output'], job['settings'])
+            future.add_done_callback(lambda f: finish_future(i, f, temp_path))
+
+        def encode_then_glitch(i: int):
+            job = jobs[i]
+            temp_path = make_temp_encode_path(job['output'])
+            try:
+                run_ffmpeg_auto_encode(job['input'], temp_path)
+            except Exception as e:
+                finish(i, failure(i, f"FFmpeg failed: {e}"), temp_path)
+                return
+            submit_glitch(i, temp_path, temp_path)
+
+        for i, job in enumerate(jobs):
+            if job['settings'].get('auto_encode'):
+                encode_pool.submit(encode_then_glitch, i)
+            else:
+                submit_glitch(i, job['input'])
+        # Leaving the with-block waits for the encode threads, then for every glitch job
+        encode_pool.shutdown(wait=True)
+    return [result if result is not None else failure(i, 'Job did not complete')
+            for i, result in enumerate(results)]
+
+def print_summary(results: List[Dict]):
+    print()
+    print(f"{'Status':<8} {'Glitches':>10} {'Time':>8}  Input -> Output")
+    print("-" * 72)
+    for result in results:
+        status = 'OK' if result['ok'] else 'FAILED'
+        print(f"{status:<8} {result['glitches']:>10,} {result.get('seconds', 0.0):>7.2f}s  {result['input']} -> {result['output']}")
+        if not result['ok']:
+            print(f"{'':<8} {result['error']}")
+    failed = sum(1 for result in results if not result['ok'])
+    print("-" * 72)
+    print(f"{len(results) - failed} succeeded, {failed} failed")
+
+def run_batch(spec: str, defaults: Dict, out_dir: Optional[str] = None, workers: Optional[int] = None,
+              ffmpeg_jobs: int = 1) -> int:
+    """Batch entry point for the CLI; returns the process exit code (1 if any job failed)"""
+    try:
+        jobs = load_jobs(spec, defaults, out_dir)
+    except (OSError, ValueError) as e:
+        print(f"Batch failed: {e}")
+        return 1
+    if not jobs:
+        print(f"No input files found for batch spec: {spec}")
+        return 1
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    print(f"Running {len(jobs)} jobs on {workers or os.cpu_count() or 1} workers")
+
+    def report(result: Dict):
+        print(f"[{'OK' if result['ok'] else 'FAILED'}] {result['input']}")
+
+    results = run_jobs(jobs, workers=workers, ffmpeg_jobs=ffmpeg_jobs, on_result=report)
+    print_summary(results)
+    return 0 if all(result['ok'] for result in results) else 1
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Hex Fucker.
+Times indexing, frame selection, intensity glitching at every intensity,
+smear mode and end-to-end fuck_video on a synthetic (or given) AVI, and
+reports MB/s, glitches/s and peak RSS per stage. Results are saved as JSON
+and can be compared against an earlier run to catch regressions.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import platform
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from glitcher import GlitchConfig, HexFucker
+from intensity import get_intensity_params
+from patterns import GLITCH_PATTERNS
+from stats import peak_rss_bytes
+from synth_avi import write_synthetic_avi
+
+BENCHMARK_VERSION = 1
+INTENSITIES = ('low', 'medium', 'high', 'extreme', 'fucked')
+SELECT_STRATEGIES = (('every_nth', 10), ('random', 25), ('time_offset', 0))
+# A stage regresses when its rate drops by more than this fraction
+DEFAULT_TOLERANCE = 0.15
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak RSS of this process in MB, or None where it cannot be read (no resource module on Windows)"""
+    peak = peak_rss_bytes()
+    return None if peak is None else peak / (1024 * 1024)
+
+def _config(intensity: str = 'medium', strategy: str = 'every_nth', value: int = 1, seed: int = 1) -> GlitchConfig:
+    params = get_intensity_params(intensity)
+    return GlitchConfig(
+        patterns=[info['pattern'] for info in GLITCH_PATTERNS.values()],
+        target_strategy=strategy,
+        target_value=value,
+        max_glitches=0,
+        skip_header_bytes=params['skip_header_bytes'],
+        glitch_size=params['overwrite_size_max'],
+        intensity=intensity,
+        seed=seed,
+    )
+
+def _timed(fn, repeat: int):
+    """Run fn repeat times; returns (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _open_map(path: str, access=mmap.ACCESS_READ):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=access)
+
+def bench_index(path: str, repeat: int) -> Dict:
+    data = _open_map(path)
+    hex_fucker = HexFucker(_config())
+    try:
+        seconds, chunks = _timed(lambda: hex_fucker.find_frame_chunks(data), repeat)
+    finally:
+        data.close()
+    return {'seconds': seconds, 'bytes': os.path.getsize(path), 'items': len(chunks), 'item_unit': 'frames'}
+
+def bench_select(path: str, repeat: int, strategy: str, value: int) -> Dict:
+    from frame_cache import load_frame_index
+    total = len(load_frame_index(path, use_cache=False))
+    hex_fucker = HexFucker(_config(strategy=strategy, value=value))
+    hex_fucker.run_seed = 1
+    seconds, selected = _timed(lambda: hex_fucker.select_frames_to_glitch(total), repeat)
+    return {'seconds': seconds, 'bytes': 0, 'items': total, 'item_unit': 'frames', 'selected': len(selected)}
+
+def bench_intensity(path: str, repeat: int, intensity: str) -> Dict:
+    from frame_cache import load_frame_index
+    chunks = load_frame_index(path, use_cache=False).chunks()
+    chunk_bytes = sum(size for _, size in chunks)
+
+    def run():
+        # A private copy-on-write map: writes stay in this process
+        data = _open_map(path, mmap.ACCESS_COPY)
+        hex_fucker = HexFucker(_config(intensity))
+        random.seed(1)
+        applied = 0
+        try:
+            for chunk_offset, chunk_size in chunks:
+                applied += hex_fucker.apply_intensity_glitches(data, chunk_offset, chunk_size)
+        finally:
+            data.close()
+        return applied
+
+    seconds, glitches = _timed(run, repeat)
+    return {'seconds': seconds, 'bytes': chunk_bytes, 'items': glitches, 'item_unit': 'glitches'}
+
+def bench_smear(path: str, repeat: int) -> Dict:
+    from frame_cache import load_frame_index
+    index = load_frame_index(path, use_cache=False)
+
+    def run():
+        data = _open_map(path, mmap.ACCESS_COPY)
+        hex_fucker = HexFucker(_config(), smear_mode=True)
+        try:
+            hex_fucker._fuck_data(data, index)
+        finally:
+            data.close()
+        return len(hex_fucker.glitch_log)
+
+    seconds, glitches = _timed(run, repeat)
+    return {'seconds': seconds, 'bytes': sum(index.sizes), 'items': glitches, 'item_unit': 'glitches'}
+
+def bench_end_to_end(path: str, repeat: int, output_mode: str) -> Dict:
+    fd, output_path = tempfile.mkstemp(suffix='.avi', prefix='hexfuck-bench-',
+                                       dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+
+    def run():
+        hex_fucker = HexFucker(_config(strategy='every_nth', value=10), output_mode=output_mode)
+        if not hex_fucker.fuck_video(path, output_path, use_index_cache=False):
+            raise RuntimeError(f"fuck_video failed on {path}")
+        return len(hex_fucker.glitch_log)
+
+    try:
+        seconds, glitches = _timed(run, repeat)
+    finally:
+        os.remove(output_path)
+    return {'seconds': seconds, 'bytes': os.path.getsize(path), 'items': glitches, 'item_unit': 'glitches'}
+
+def stage_list(quick: bool = False) -> List[tuple]:
+    """(stage name, function, extra args) for every benchmark stage"""
+    stages = [('index', bench_index, ())]
+    stages += [(f'select_{strategy}', bench_select, (strategy, value)) for strategy, value in SELECT_STRATEGIES]
+    intensities = ('medium',) if quick else INTENSITIES
+    stages += [(f'intensity_{name}', bench_intensity, (name,)) for name in intensities]
+    stages.append(('smear', bench_smear, ()))
+    stages += [(f'end_to_end_{mode}', bench_end_to_end, (mode,)) for mode in ('mmap', 'memory')]
+    return stages
+
+def _run_stage(fn, path: str, repeat: int, args: tuple) -> Dict:
+    # Output of the code under test would drown the report
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = fn(path, repeat, *args)
+        finally:
+            sys.stdout = stdout
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+def run_stage(name: str, fn, path: str, repeat: int, args: tuple = ()) -> Dict:
+    """Run one stage in a fresh process so its peak RSS is its own"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result = pool.submit(_run_stage, fn, path, repeat, args).result()
+    seconds = result['seconds'] or 1e-9
+    result['mb_per_s'] = result['bytes'] / (1024 * 1024) / seconds if result['bytes'] else None
+    result['items_per_s'] = result['items'] / seconds
+    result['name'] = name
+    return result
+
+def run_benchmarks(path: str, repeat: int = 3, quick: bool = False, stages: Optional[List[str]] = None) -> Dict:
+    results = {}
+    for name, fn, args in stage_list(quick):
+        if stages and name not in stages:
+            continue
+        print(f"  {name}...", end='', flush=True)
+        result = run_stage(name, fn, path, repeat, args)
+        print(f" {result['seconds']:.3f}s")
+        results[name] = result
+    return results
+
+def _rate(result: Dict):
+    """The number compared between runs: MB/s where a stage has a byte count, else items/s"""
+    return result['mb_per_s'] if result.get('mb_per_s') else result['items_per_s']
+
+def compare(results: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Names of stages whose rate dropped by more than tolerance against baseline"""
+    regressions = []
+    print(f"\n{'Stage':<22} {'Baseline':>14} {'Current':>14} {'Change':>8}")
+    print("-" * 62)
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        old_rate, new_rate = _rate(old), _rate(result)
+        change = (new_rate - old_rate) / old_rate if old_rate else 0.0
+        flag = ''
+        if change < -tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<22} {old_rate:>14,.1f} {new_rate:>14,.1f} {change:>+7.1%}{flag}")
+    return regressions
+
+def print_report(report: Dict):
+    source = report['file']
+    print(f"\n{source['path']}: {source['size'] / (1024 * 1024):,.1f} MB, {source['frames']:,} frames")
+    print(f"{'Stage':<22} {'Seconds':>9} {'MB/s':>10} {'Rate':>22} {'Peak RSS':>10}")
+    print("-" * 78)
+    for name, result in report['results'].items():
+        mb_per_s = f"{result['mb_per_s']:,.1f}" if result['mb_per_s'] else '-'
+        rate = f"{result['items_per_s']:,.0f} {result['item_unit']}/s"
+        peak = f"{result['peak_rss_mb']:.1f}MB" if result['peak_rss_mb'] is not None else '-'
+        print(f"{name:<22} {result['seconds']:>9.3f} {mb_per_s:>10} {rate:>22} {peak:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Hex Fucker on a synthetic or given AVI')
+    parser.add_argument('--input', help='Benchmark this AVI instead of generating one')
+    parser.add_argument('--size-mb', type=float, default=64, help='Size of the generated AVI')
+    parser.add_argument('--odml', action='store_true', help='Generate an OpenDML (AVIX segmented) file')
+    parser.add_argument('--riff-mb', type=int, help='OpenDML segment size of the generated file')
+    parser.add_argument('--no-audio', action='store_true', help='Generate a video-only file')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (the best time is reported)')
+    parser.add_argument('--quick', action='store_true', help='Only benchmark the medium intensity')
+    parser.add_argument('--stage', action='append', help='Only run this stage (repeatable)')
+    parser.add_argument('--json', help='Save results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a JSON file from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed fractional slowdown before a stage counts as a regression')
+    parser.add_argument('--work-dir', help='Where to write the generated AVI (default: a temp directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated AVI')
+    args = parser.parse_args()
+
+    work_dir = None
+    if args.input:
+        path = args.input
+    else:
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix='hexfuck-bench-')
+        path = os.path.join(work_dir, f"synthetic_{args.size_mb:g}mb{'_odml' if args.odml else ''}.avi")
+        print(f"Generating {args.size_mb:g} MB synthetic AVI: {path}")
+        options = {'audio': not args.no_audio, 'odml': args.odml}
+        if args.riff_mb:
+            options['riff_size'] = args.riff_mb * 1024 * 1024
+        write_synthetic_avi(path, size_mb=args.size_mb, **options)
+    try:
+        from frame_cache import load_frame_index
+        report = {
+            'version': BENCHMARK_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'file': {'path': path, 'size': os.path.getsize(path),
+                     'frames': len(load_frame_index(path, use_cache=False)),
+                     'synthetic': not args.input, 'odml': args.odml},
+            'repeat': args.repeat,
+        }
+        print("Running stages:")
+        report['results'] = run_benchmarks(path, repeat=args.repeat, quick=args.quick, stages=args.stage)
+    finally:
+        if work_dir is not None and not args.keep:
+            os.remove(path)
+            if not args.work_dir:
+                os.rmdir(work_dir)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results: {args.json}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from array import array
+from typing import Dict, Optional, Tuple
+
+START_CODE = b'\x00\x00\x01'
+VOP_START = b'\x00\x00\x01\xb6'
+VOP_TYPES = b'IPBS'
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+JPEG_SOS = 0xda
+HEADER_WINDOW = 256   # Bytes searched for the VOP start code / read for headers
+MAX_VOP_HEADER = 16   # Bytes after the VOP start code assumed to be header when it cannot be parsed
+
+# Frame types stored in FrameIndex.frame_types
+FRAME_I, FRAME_P, FRAME_B, FRAME_S = (ord(t) for t in 'IPBS')
+FRAME_NOT_CODED = ord('N')  # MPEG-4 N-VOP (vop_coded = 0): nothing to glitch
+FRAME_UNKNOWN = ord('?')
+
+class _Bits:
+    """MSB-first reader over a short byte string"""
+    def __init__(self, raw: bytes):
+        self.value = int.from_bytes(raw, 'big')
+        self.length = len(raw) * 8
+        self.pos = 0
+
+    def read(self, n: int) -> int:
+        if self.pos + n > self.length:
+            raise EOFError
+        self.pos += n
+        return (self.value >> (self.length - self.pos)) & ((1 << n) - 1)
+
+class Mpeg4State:
+    """Video object layer fields the VOP header layout depends on (defaults: unknown VOL)"""
+    def __init__(self):
+        self.time_increment_bits: Optional[int] = None
+        self.interlaced = False
+        self.sprite_enable = 0
+
+def parse_vol(raw: bytes, state: Mpeg4State) -> bool:
+    """Read a video_object_layer header (raw starts after its 00 00 01 2x start code)"""
+    bits = _Bits(raw[:64])
+    try:
+        bits.read(1)                     # random_accessible_vol
+        bits.read(8)                     # video_object_type_indication
+        verid = 1
+        if bits.read(1):                 # is_object_layer_identifier
+            verid = bits.read(4)
+            bits.read(3)
+        if bits.read(4) == 15:           # aspect_ratio_info: extended PAR
+            bits.read(16)
+        if bits.read(1):                 # vol_control_parameters
+            bits.read(3)
+            if bits.read(1):             # vbv_parameters
+                bits.read(79)
+        shape = bits.read(2)
+        if shape == 3 and verid != 1:
+            bits.read(4)
+        bits.read(1)
+        resolution = bits.read(16)
+        bits.read(1)
+        time_increment_bits = max(1, (resolution - 1).bit_length())
+        if bits.read(1):                 # fixed_vop_rate
+            bits.read(time_increment_bits)
+        if shape != 0:
+            return False                 # Only rectangular VOPs are parsed
+        bits.read(29)                    # markers, width and height
+        state.interlaced = bool(bits.read(1))
+        bits.read(1)                     # obmc_disable
+        state.sprite_enable = bits.read(1 if verid == 1 else 2)
+        state.time_increment_bits = time_increment_bits
+        return True
+    except EOFError:
+        return False
+
+def _vop_header_end(raw: bytes, state: Mpeg4State) -> Tuple[int, int]:
+    """(header length in bytes, frame type) of a VOP whose header starts at raw[0] (after b6)"""
+    coding_type = raw[0] >> 6 if raw else 0
+    frame_type = VOP_TYPES[coding_type]
+    if state.time_increment_bits is None or (coding_type == 3 and state.sprite_enable):
+        # Without the VOL (or with sprite trajectories) assume a generous header
+        return MAX_VOP_HEADER, frame_type
+    bits = _Bits(raw[:32])
+    try:
+        bits.read(2)
+        while bits.read(1):              # modulo_time_base
+            pass
+        bits.read(1)
+        bits.read(state.time_increment_bits)
+        bits.read(1)
+        if not bits.read(1):             # vop_coded
+            return (bits.pos + 7) // 8, FRAME_NOT_CODED
+        if coding_type == 1:
+            bits.read(1)                 # vop_rounding_type
+        bits.read(3)                     # intra_dc_vlc_thr
+        if state.interlaced:
+            bits.read(2)
+        bits.read(5)                     # vop_quant
+        if coding_type != 0:
+            bits.read(3)                 # vop_fcode_forward
+        if coding_type == 2:
+            bits.read(3)                 # vop_fcode_backward
+    except EOFError:
+        return MAX_VOP_HEADER, frame_type
+    return (bits.pos + 7) // 8, frame_type
+
+def _jpeg_scan(data, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """Entropy-coded scan range of a JPEG frame at data[start:end]"""
+    pos = start + 2
+    while pos + 4 <= end:
+        if data[pos] != 0xff:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xff:               # fill byte
+            pos += 1
+            continue
+        if 0xd0 <= marker <= 0xd9 or marker == 0x01:
+            pos += 2
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        if marker == JPEG_SOS:
+            scan_start = pos + 2 + length
+            eoi = data.rfind(JPEG_EOI, scan_start, end)
+            return scan_start, eoi if eoi >= 0 else end
+        pos += 2 + length
+    return None
+
+def locate_payload(data, start: int, end: int, state: Optional[Mpeg4State] = None) -> Tuple[int, int, int]:
+    """
+    Coded range and frame type of one frame whose payload is data[start:end]
+    (bytes, bytearray or mmap): (first coded byte, end of coded bytes, frame type),
+    offsets relative to start. MPEG-4 Part 2: after the VOP header, up to the next
+    start code (so a packed second VOP keeps its header). MJPEG: the SOS scan up to
+    EOI. Anything else: the whole payload with FRAME_UNKNOWN.
+    """
+    if state is None:
+        state = Mpeg4State()
+    size = end - start
+    window = min(end, start + HEADER_WINDOW)
+    vop = data.find(VOP_START, start, window)
+    if vop >= 0:
+        # A VOL in front of the VOP (Xvid repeats it at keyframes) sets the header layout
+        vol = data.find(START_CODE, start, vop)
+        while 0 <= vol < vop:
+            if 0x20 <= data[vol + 3] <= 0x2f:
+                parse_vol(bytes(data[vol + 4:vop]), state)
+            vol = data.find(START_CODE, vol + 3, vop)
+        header, frame_type = _vop_header_end(bytes(data[vop + 4:vop + 4 + 32]), state)
+        coded_start = min(vop + 4 + header, end)
+        if frame_type == FRAME_NOT_CODED:
+            return coded_start - start, coded_start - start, frame_type
+        next_code = data.find(START_CODE, coded_start, end)
+        coded_end = next_code if next_code >= 0 else end
+        return coded_start - start, coded_end - start, frame_type
+    if size >= 2 and data[start:start + 2] == JPEG_SOI:
+        scan = _jpeg_scan(data, start, end)
+        if scan is not None:
+            return scan[0] - start, scan[1] - start, FRAME_I
+        return 0, size, FRAME_I
+    return 0, size, FRAME_UNKNOWN
+
+def guess_keyframe(fcc: bytes, payload) -> bool:
+    """Keyframe flag from a chunk id and the start of its payload: MPEG-4 I-VOPs, and every frame of an intra-only codec"""
+    vop = payload.find(VOP_START, 0, HEADER_WINDOW)
+    if vop < 0:
+        return fcc[2:] == b'db' or payload[:2] == JPEG_SOI
+    return vop + 4 < len(payload) and (payload[vop + 4] >> 6) == 0
+
+def analyze_index(index, data) -> None:
+    """
+    Fill index.coded_starts / coded_ends / frame_types from the frames in data
+    (the file the index was built from). One pass in file order, so a VOL seen
+    in an early frame applies to the VOPs after it.
+    """
+    starts, ends, types = array('I'), array('I'), array('B')
+    states: Dict[int, Mpeg4State] = {}
+    header = index.header_size
+    data_len = len(data)
+    for offset, size, stream_id in zip(index.offsets, index.sizes, index.stream_ids):
+        start = offset + header
+        end = min(start + size, data_len)
+        if start >= end:
+            starts.append(0)
+            ends.append(0)
+            types.append(FRAME_UNKNOWN)
+            continue
+        state = states.setdefault(stream_id, Mpeg4State())
+        coded_start, coded_end, frame_type = locate_payload(data, start, end, state)
+        starts.append(coded_start)
+        ends.append(coded_end)
+        types.append(frame_type)
+    index.coded_starts, index.coded_ends, index.frame_types = starts, ends, types
@@ -7,6 +7,7 @@ Creates various hex fucked versions of an input video with different effects
 import os
 import sys
 from hex_fucker import HexFucker, GlitchConfig, GLITCH_PATTERNS
+from session import GlitchSession, Variant
 
 def demo_glitch_variations(input_video: str):
     """
@@ -18,58 +19,52 @@ def demo_glitch_variations(input_video: str):
         return
     
     base_name = os.path.splitext(input_video)[0]
+    # The source is read and indexed once; every variant below reuses it
+    session = GlitchSession(input_video)
     
-    # Demo 1: Whiteout every 5th frame
-    print("Demo 1: Whiteout Flash")
-    config1 = GlitchConfig(
-        patterns=[GLITCH_PATTERNS['whiteout']['pattern']],
-        target_strategy='every_nth',
-        target_value=5,
-        max_glitches=30,
-        skip_header_bytes=12,
-        glitch_size=256
-    )
-    glitcher1 = HexFucker(config1)
-    glitcher1.fuck_video(input_video, f"{base_name}_whiteout.avi")
-    
-    # Demo 2: Checkerboard pulse on random frames
-    print("\nDemo 2: Checkerboard Pulse")
-    config2 = GlitchConfig(
-        patterns=[GLITCH_PATTERNS['checkerboard_pulse']['pattern']],
-        target_strategy='random',
-        target_value=25,  # 25% of frames
-        max_glitches=40,
-        skip_header_bytes=8,
-        glitch_size=256
-    )
-    glitcher2 = HexFucker(config2)
-    glitcher2.fuck_video(input_video, f"{base_name}_checkerboard.avi")
-    
-    # Demo 3: Rainbow drift after halfway point
-    print("\nDemo 3: Rainbow Drift")
-    config3 = GlitchConfig(
-        patterns=[GLITCH_PATTERNS['rainbow_drift']['pattern']],
-        target_strategy='time_offset',
-        target_value=50,  # Start after frame 50
-        max_glitches=25,
-        skip_header_bytes=16,
-        glitch_size=256
-    )
-    glitcher3 = HexFucker(config3)
-    glitcher3.fuck_video(input_video, f"{base_name}_rainbow.avi")
-    
-    # Demo 4: Garbage binary - heavy corruption
-    print("\nDemo 4: Garbage Binary")
-    config4 = GlitchConfig(
-        patterns=[GLITCH_PATTERNS['garbage_binary']['pattern']],
-        target_strategy='every_nth',
-        target_value=3,  # Every 3rd frame
-        max_glitches=100,
-        skip_header_bytes=10,
-        glitch_size=256
-    )
-    glitcher4 = HexFucker(config4)
-    glitcher4.fuck_video(input_video, f"{base_name}_garbage.avi")
+    variants = [
+        # Demo 1: Whiteout every 5th frame
+        Variant(GlitchConfig(
+            patterns=[GLITCH_PATTERNS['whiteout']['pattern']],
+            target_strategy='every_nth',
+            target_value=5,
+            max_glitches=30,
+            skip_header_bytes=12,
+            glitch_size=256
+        ), f"{base_name}_whiteout.avi"),
+        # Demo 2: Checkerboard pulse on random frames
+        Variant(GlitchConfig(
+            patterns=[GLITCH_PATTERNS['checkerboard_flicker']['pattern']],
+            target_strategy='random',
+            target_value=25,  # 25% of frames
+            max_glitches=40,
+            skip_header_bytes=8,
+            glitch_size=256
+        ), f"{base_name}_checkerboard.avi"),
+        # Demo 3: Rainbow drift after halfway point
+        Variant(GlitchConfig(
+            patterns=[GLITCH_PATTERNS['rainbow_smear']['pattern']],
+            target_strategy='time_offset',
+            target_value=50,  # Start after frame 50
+            max_glitches=25,
+            skip_header_bytes=16,
+            glitch_size=256
+        ), f"{base_name}_rainbow.avi"),
+        # Demo 4: Garbage binary - heavy corruption
+        Variant(GlitchConfig(
+            patterns=[GLITCH_PATTERNS['static_grit']['pattern']],
+            target_strategy='every_nth',
+            target_value=3,  # Every 3rd frame
+            max_glitches=100,
+            skip_header_bytes=10,
+            glitch_size=256
+        ), f"{base_name}_garbage.avi"),
+    ]
+    names = ["Whiteout Flash", "Checkerboard Pulse", "Rainbow Drift", "Garbage Binary"]
+    print(f"Demos 1-{len(variants)}: rendering {len(variants)} variants in parallel")
+    for i, (name, result) in enumerate(zip(names, session.render_many(variants)), 1):
+        status = f"{result.glitches} hex fucks in {result.seconds:.2f}s" if result.success else f"failed: {result.error}"
+        print(f"Demo {i}: {name} -> {result.output_path} ({status})")
     
     # Demo 5: Mixed patterns - artistic effect
     print("\nDemo 5: Mixed Patterns")
@@ -84,7 +79,7 @@ def demo_glitch_variations(input_video: str):
         glitch_size=256
     )
     glitcher5 = HexFucker(config5)
-    glitcher5.fuck_video(input_video, f"{base_name}_mixed.avi")
+    glitcher5.fuck_video(input_video, f"{base_name}_mixed.avi", frame_index=session.frame_index)
     glitcher5.print_glitch_log()
     
     print("\nAll demo hex fucks completed!")
@@ -97,42 +92,13 @@ def demo_glitch_variations(input_video: str):
 
 def create_sample_avi():
     """
-    Create a minimal sample AVI file for testing (simplified structure)
-    This creates a very basic AVI file structure for demonstration
+    Create a small sample AVI file for testing (10 seconds of synthetic
+    MPEG-4-like frames with audio, see synth_avi.py)
     """
+    from synth_avi import write_synthetic_avi
     print("Creating sample AVI file for testing...")
-    
-    # Basic AVI file structure (simplified)
-    # This is just for demonstration - in real use, provide actual AVI files
-    avi_header = (
-        b'RIFF'               # RIFF header
-        b'\x00\x10\x00\x00'   # File size placeholder
-        b'AVI '               # AVI format
-        b'LIST'               # LIST chunk
-        b'\x00\x08\x00\x00'   # List size
-        b'hdrl'               # Header list
-        b'avih'               # AVI header
-        b'\x38\x00\x00\x00'   # Header size
-        b'\x00' * 56          # AVI header data (simplified)
-    )
-    
-    # Sample frame data chunks
-    frame_data = b''
-    for i in range(10):  # 10 sample frames
-        frame_chunk = (
-            b'00dc'               # Frame chunk ID
-            b'\x00\x04\x00\x00'   # Chunk size (1024 bytes)
-            b'\xFF\x00\x80\x40' * 256  # Sample frame data (1024 bytes)
-        )
-        frame_data += frame_chunk
-    
-    # Combine all parts
-    sample_avi = avi_header + frame_data
-    
-    with open('sample.avi', 'wb') as f:
-        f.write(sample_avi)
-    
-    print("Created sample.avi for testing")
+    summary = write_synthetic_avi('sample.avi', frames=250, gop=50)
+    print(f"Created sample.avi for testing ({summary['size']:,} bytes, {summary['frames']} frames)")
     return 'sample.avi'
 
 def main():
@@ -0,0 +1,116 @@
+import json
+import random
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+from avi_index import FrameIndex
+from glitch_log import GlitchLog
+from glitcher import HexFucker
+from planner import WritePlan
+from rng import derive_seed
+from stats import RunStats
+
+# Job settings a layer may set; output handling (auto_encode, output_mode) belongs to the whole stack
+LAYER_SETTINGS = ('pattern', 'strategy', 'value', 'max_glitches', 'intensity', 'seed', 'smear_mode', 'select',
+                  'smear_size', 'smear_drift', 'codec_aware')
+
+def load_layers(path: str, defaults: Dict) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Read an effect stack file: {"seed": optional, "layers": [...]} or a bare
+    list of layers. Each layer is an object of job settings (LAYER_SETTINGS,
+    with "mode": "smear" / "intensity" as shorthand for smear_mode) and an
+    optional "name", laid over defaults. Returns (layer settings, stack seed);
+    raises ValueError for bad files.
+    """
+    from batch import _build_config, _coerce
+    with open(path, 'r') as f:
+        spec = json.load(f)
+    seed = None
+    if isinstance(spec, dict):
+        seed = spec.get('seed')
+        spec = spec.get('layers')
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("An effect stack needs a non-empty list of layers")
+    layers = []
+    for i, row in enumerate(spec):
+        if not isinstance(row, dict):
+            raise ValueError(f"Layer {i + 1} is not an object")
+        row = dict(row)
+        name = str(row.pop('name', f"layer {i + 1}"))
+        mode = row.pop('mode', None)
+        if mode is not None:
+            if mode not in ('smear', 'intensity'):
+                raise ValueError(f"{name}: unknown mode '{mode}' (expected smear or intensity)")
+            row['smear_mode'] = mode == 'smear'
+        unknown = sorted(key for key in row if key.strip().replace('-', '_') not in LAYER_SETTINGS)
+        if unknown:
+            raise ValueError(f"{name}: unknown layer settings: {', '.join(unknown)}")
+        settings = dict(defaults)
+        settings.update(_coerce(row))
+        try:
+            _build_config(settings)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from None
+        settings['name'] = name
+        layers.append(settings)
+    return layers, None if seed is None else int(seed)
+
+class EffectStack(HexFucker):
+    """
+    Ordered glitch layers rendered in one pass over the file. Each layer
+    selects and plans its frames on its own (config, selection, intensity or
+    smear settings, seed); the plans are concatenated in layer order over one
+    shared pattern table and applied once, so where layers overlap the bytes of
+    the later layer win. Everything else (output modes, in-place patching,
+    patches, stats) is the plain HexFucker render.
+    """
+    def __init__(self, layers: List[Dict], seed: Optional[int] = None, output_mode: str = 'mmap',
+                 glitch_log: Optional[GlitchLog] = None, stats: Optional[RunStats] = None):
+        from batch import _build_config
+        stats = stats if stats is not None else RunStats()
+        self.layers: List[Tuple[str, HexFucker]] = []
+        self.pattern_bases: List[int] = []
+        patterns: List[bytes] = []
+        for settings in layers:
+            layer = HexFucker(_build_config(settings), smear_mode=settings.get('smear_mode', False), stats=stats)
+            self.layers.append((settings.get('name', f"layer {len(self.layers) + 1}"), layer))
+            self.pattern_bases.append(len(patterns))
+            patterns.extend(layer.config.patterns)
+        first = self.layers[0][1].config
+        config = replace(first, patterns=patterns, seed=seed,
+                         codec_aware=any(layer.config.codec_aware for _, layer in self.layers))
+        super().__init__(config, output_mode=output_mode, glitch_log=glitch_log, stats=stats)
+
+    def layer_seed(self, i: int, layer: HexFucker) -> int:
+        """A layer's own seed, else the stack seed for the first layer and a derived one for the rest"""
+        if layer.config.seed is not None:
+            return layer.config.seed
+        return self.run_seed if i == 0 else derive_seed(self.run_seed, 'layer', i)
+
+    def _fuck_data(self, data, index: FrameIndex) -> bool:
+        """Select and plan every layer, then apply the merged plan to data in one pass"""
+        chunks = index.chunks()
+        print(f"Found {len(chunks)} frame chunks ({index.source}{', cached' if index.cached else ''})")
+        if not chunks:
+            print("No frame chunks found. Is this a valid AVI file?")
+            return False
+        self.run_seed = self.config.seed if self.config.seed is not None else random.getrandbits(63)
+        stats = self.stats
+        stats.count('frames_total', len(chunks))
+        merged = WritePlan()
+        for i, (name, layer) in enumerate(self.layers):
+            layer.use_index(index)
+            layer.run_seed = self.layer_seed(i, layer)
+            with stats.stage('select'):
+                frames = layer.select_frames_to_glitch(len(chunks), data)
+            stats.count('frames_selected', len(frames))
+            with stats.stage('plan'):
+                plan = layer.plan_frames(index, frames, len(data))
+            base = self.pattern_bases[i]
+            for offset, size, stack, chunk_offset in plan:
+                merged.add(offset, size, tuple(base + p for p in stack), chunk_offset)
+            mode = 'smear' if layer.smear_mode else layer.config.intensity
+            print(f"[Layer {i + 1}: {name}] {mode}, {len(frames)} frames, {len(plan):,} writes planned")
+        with stats.stage('apply'):
+            glitches_applied = self.apply_plan(data, merged)
+        print(f"Applied {glitches_applied} hex fucks from {len(self.layers)} layers")
+        return True
@@ -1,9 +1,21 @@
 import subprocess
+import tempfile
+import threading
 import os
+from contextlib import contextmanager
 
-def run_ffmpeg_auto_encode(input_path, temp_path):
-    """Run FFmpeg to re-encode input_path to temp_path with smear-friendly settings."""
-    ffmpeg_cmd = [
+# Delivery codecs for the bake stage: FFmpeg output options per --bake-codec
+BAKE_CODECS = {
+    'h264': ["-c:v", "libx264", "-preset", "medium", "-crf", "18", "-pix_fmt", "yuv420p", "-c:a", "aac"],
+    'hevc': ["-c:v", "libx265", "-preset", "medium", "-crf", "20", "-pix_fmt", "yuv420p", "-c:a", "aac"],
+    'prores': ["-c:v", "prores_ks", "-profile:v", "3", "-pix_fmt", "yuv422p10le", "-c:a", "pcm_s16le"],
+    'ffv1': ["-c:v", "ffv1", "-level", "3", "-c:a", "flac"],
+}
+MAX_BAKE_LOG_LINES = 1000
+
+def auto_encode_cmd(input_path, output):
+    """FFmpeg command line re-encoding input_path to output with smear-friendly settings."""
+    return [
         "ffmpeg", "-y", "-i", input_path,
         "-c:v", "libxvid",
         "-bf", "2",
@@ -11,9 +23,77 @@ def run_ffmpeg_auto_encode(input_path, temp_path):
         "-keyint_min", "150",
         "-sc_threshold", "0",
         "-an",
-        temp_path
-    ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    ] + output
+
+def run_ffmpeg_auto_encode(input_path, temp_path):
+    """Run FFmpeg to re-encode input_path to temp_path with smear-friendly settings."""
+    subprocess.run(auto_encode_cmd(input_path, [temp_path]), check=True)
+
+@contextmanager
+def ffmpeg_auto_encode_stream(input_path):
+    """
+    Run the auto-encode with FFmpeg writing AVI to a pipe and yield the pipe.
+    An input_path of "-" lets FFmpeg read our own stdin.
+    Raises CalledProcessError on exit if FFmpeg failed.
+    """
+    cmd = auto_encode_cmd(input_path, ["-f", "avi", "pipe:1"])
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=None if input_path == '-' else subprocess.DEVNULL)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def bake_cmd(output_path, codec):
+    """FFmpeg command line decoding a video from stdin and encoding it to output_path with a delivery codec."""
+    return [
+        "ffmpeg", "-y", "-v", "error",
+        "-fflags", "+genpts",
+        "-i", "pipe:0",
+    ] + BAKE_CODECS[codec] + [output_path]
+
+class FFmpegBake:
+    """
+    FFmpeg encoding whatever is written to stdin into output_path with a
+    delivery codec, so glitching and the final encode overlap and the
+    glitched intermediate never reaches disk. A thread collects FFmpeg's
+    error output (mostly decode errors in glitched frames) while it runs.
+    """
+    def __init__(self, output_path, codec):
+        self.cmd = bake_cmd(output_path, codec)
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+        self.stdin = self.proc.stdin
+        self.errors = 0
+        self.log = []  # The first MAX_BAKE_LOG_LINES error lines
+        self._reader = threading.Thread(target=self._read_errors, daemon=True)
+        self._reader.start()
+
+    def _read_errors(self):
+        for line in self.proc.stderr:
+            self.errors += 1
+            if len(self.log) < MAX_BAKE_LOG_LINES:
+                self.log.append(line.decode('utf-8', 'replace').rstrip())
+
+    def finish(self):
+        """Close stdin and wait for FFmpeg; raises CalledProcessError if it failed."""
+        try:
+            self.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.proc.wait()
+        self._reader.join()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.cmd, stderr='\n'.join(self.log[-5:]))
+
+def make_temp_encode_path(near_path):
+    """Unique temp file for an encode, next to near_path so clones stay on one filesystem."""
+    fd, path = tempfile.mkstemp(suffix='.avi', prefix='hexfuck-encode-',
+                                dir=os.path.dirname(os.path.abspath(near_path)))
+    os.close(fd)
+    return path
 
 def cleanup_temp_file(path):
     """Delete a file if it exists."""
@@ -0,0 +1,93 @@
+import os
+import mmap
+import shutil
+import secrets
+from contextlib import contextmanager
+from typing import Tuple
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl: share extents between two files (btrfs, xfs, ...)
+
+def make_temp_file(directory: str, prefix: str) -> Tuple[int, str]:
+    """
+    tempfile.mkstemp for files that get os.replace()d into place: the file is
+    created with mode 0666 and the kernel applies the umask, so it ends up
+    with normal permissions instead of mkstemp's 0600. Returns (fd, path).
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    for _ in range(100):
+        path = os.path.join(directory, prefix + secrets.token_hex(8))
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free temporary file name in {directory}")
+
+def _try_reflink(src, dst) -> bool:
+    try:
+        import fcntl
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except (ImportError, OSError):
+        return False
+
+def _try_copy_file_range(src, dst, size: int) -> bool:
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            n = os.copy_file_range(src.fileno(), dst.fileno(), size - copied, copied, copied)
+            if n == 0:
+                break
+            copied += n
+    except OSError:
+        if copied:
+            raise
+        return False
+    return copied == size
+
+def clone_file(src_path: str, dst_path: str) -> str:
+    """
+    Copy src_path to dst_path with the cheapest mechanism available:
+    reflink, then kernel-side copy_file_range, then a plain chunked copy.
+    Returns the name of the method that was used.
+    """
+    size = os.path.getsize(src_path)
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        if _try_reflink(src, dst):
+            return 'reflink'
+        if _try_copy_file_range(src, dst, size):
+            return 'copy_file_range'
+        src.seek(0)
+        dst.seek(0)
+        dst.truncate()
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        return 'chunked copy'
+
+def same_file(path_a: str, path_b: str) -> bool:
+    try:
+        return os.path.samefile(path_a, path_b)
+    except OSError:
+        return False
+
+@contextmanager
+def open_patchable(path: str):
+    """Map path read/write so glitches can be patched in place; only touched pages are written back."""
+    with open(path, 'r+b') as f:
+        mm = mmap.mmap(f.fileno(), 0)
+        try:
+            yield mm
+            mm.flush()
+        finally:
+            mm.close()
+
+@contextmanager
+def open_private(path: str):
+    """Copy-on-write map of path: writes land in private memory and never reach the file"""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        try:
+            yield mm
+        finally:
+            mm.close()
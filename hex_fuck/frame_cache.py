@@ -0,0 +1,144 @@
+import os
+import json
+import struct
+import hashlib
+from array import array
+from typing import Optional
+from avi_index import FrameIndex, index_video
+from fileio import make_temp_file
+
+SIDECAR_SUFFIX = '.hfidx'
+CACHE_MAGIC = b'HFIDX\x00'
+CACHE_VERSION = 3
+FINGERPRINT_SAMPLE = 64 * 1024
+FALLBACK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hex_fucker', 'index')
+_COLUMNS = (('offsets', 'Q'), ('sizes', 'I'), ('flags', 'I'), ('stream_ids', 'H'))
+_BITSTREAM_COLUMNS = (('coded_starts', 'I'), ('coded_ends', 'I'), ('frame_types', 'B'))
+
+def fingerprint_file(path: str, size: Optional[int] = None) -> str:
+    """Cheap content fingerprint: hash of the size plus the head, middle and tail of the file"""
+    if size is None:
+        size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        for pos in (0, max(0, size // 2 - FINGERPRINT_SAMPLE // 2), max(0, size - FINGERPRINT_SAMPLE)):
+            f.seek(pos)
+            h.update(f.read(FINGERPRINT_SAMPLE))
+    return h.hexdigest()
+
+def sidecar_paths(path: str):
+    """Sidecar next to the video first, then a per-user cache for read-only locations"""
+    abs_path = os.path.abspath(path)
+    name = hashlib.blake2b(abs_path.encode(), digest_size=16).hexdigest() + SIDECAR_SUFFIX
+    return [abs_path + SIDECAR_SUFFIX, os.path.join(FALLBACK_CACHE_DIR, name)]
+
+def _cache_key(path: str) -> dict:
+    st = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+
+def _le(column: array) -> array:
+    if struct.pack('=I', 1) != struct.pack('<I', 1):
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def serialize_index(index: FrameIndex, key: dict) -> bytes:
+    bitstream = len(index) > 0 and index.has_bitstream_info
+    header = json.dumps({
+        'version': CACHE_VERSION,
+        'key': key,
+        'source': index.source,
+        'micro_sec_per_frame': index.micro_sec_per_frame,
+        'streams': {str(k): v for k, v in index.streams.items()},
+        'count': len(index),
+        'bitstream': bitstream,
+    }).encode()
+    columns = _COLUMNS + (_BITSTREAM_COLUMNS if bitstream else ())
+    parts = [CACHE_MAGIC, struct.pack('<I', len(header)), header]
+    parts.extend(_le(getattr(index, name)).tobytes() for name, _ in columns)
+    return b''.join(parts)
+
+def deserialize_index(raw: bytes, key: Optional[dict] = None) -> Optional[FrameIndex]:
+    """Decode a sidecar; returns None if it is malformed or was written for a different key"""
+    if not raw.startswith(CACHE_MAGIC) or len(raw) < len(CACHE_MAGIC) + 4:
+        return None
+    pos = len(CACHE_MAGIC)
+    header_len = struct.unpack('<I', raw[pos:pos + 4])[0]
+    pos += 4
+    try:
+        header = json.loads(raw[pos:pos + header_len])
+    except ValueError:
+        return None
+    pos += header_len
+    if header.get('version') != CACHE_VERSION:
+        return None
+    if key is not None and {k: header['key'].get(k) for k in key} != key:
+        return None
+    index = FrameIndex(header['source'])
+    index.micro_sec_per_frame = header['micro_sec_per_frame']
+    index.streams = {int(k): v for k, v in header['streams'].items()}
+    count = header['count']
+    for name, typecode in _COLUMNS + (_BITSTREAM_COLUMNS if header.get('bitstream') else ()):
+        column = array(typecode)
+        nbytes = count * column.itemsize
+        if pos + nbytes > len(raw):
+            return None
+        column.frombytes(raw[pos:pos + nbytes])
+        setattr(index, name, _le(column))
+        pos += nbytes
+    return index
+
+def _read_sidecar(key: dict) -> Optional[FrameIndex]:
+    for sidecar in sidecar_paths(key['path']):
+        try:
+            with open(sidecar, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            continue
+        index = deserialize_index(raw, key)
+        if index is not None:
+            return index
+    return None
+
+def _write_sidecar(index: FrameIndex, key: dict) -> Optional[str]:
+    raw = serialize_index(index, key)
+    for sidecar in sidecar_paths(key['path']):
+        directory = os.path.dirname(sidecar)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = make_temp_file(directory, '.hfidx-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, sidecar)
+            return sidecar
+        except OSError:
+            continue
+    return None
+
+def save_frame_index(path: str, index: FrameIndex) -> Optional[str]:
+    """Rewrite the sidecar of path, e.g. after adding bitstream info to its index"""
+    key = _cache_key(path)
+    key['fingerprint'] = fingerprint_file(path, key['size'])
+    return _write_sidecar(index, key)
+
+def load_frame_index(path: str, use_cache: bool = True) -> FrameIndex:
+    """
+    Return the FrameIndex for path, reusing the on-disk sidecar when the file's
+    path, size, mtime and content fingerprint still match.
+    A fresh index is built (and the sidecar rewritten) on any mismatch.
+    """
+    if not use_cache:
+        return index_video(path)
+    key = _cache_key(path)
+    key['fingerprint'] = fingerprint_file(path, key['size'])
+    index = _read_sidecar(key)
+    if index is not None:
+        index.cached = True
+        return index
+    index = index_video(path)
+    _write_sidecar(index, key)
+    return index
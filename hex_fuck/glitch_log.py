@@ -0,0 +1,178 @@
+import struct
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+BINARY_LOG_MAGIC = b'HFLOG\x00\x01\x00'
+_ENTRY_RECORD = struct.Struct('<cQIQH')   # b'E', offset, size, chunk offset, stack length (followed by u16 pattern indices)
+SINK_BUFFER_RECORDS = 4096
+
+class JsonlLogSink:
+    """Streams log entries as JSON lines, each with its pattern stack inline"""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, 'w')
+        self._buffer: List[str] = []
+
+    def write_glitch(self, offset: int, size: int, stack: Sequence[int], chunk_offset: int):
+        self._buffer.append(f'{{"offset": {offset}, "size": {size}, "patterns": [{", ".join(map(str, stack))}], '
+                            f'"chunk_offset": {chunk_offset}}}')
+        if len(self._buffer) >= SINK_BUFFER_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._f.write('\n'.join(self._buffer) + '\n')
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+class BinaryLogSink:
+    """Streams log entries as fixed-size little-endian records (see read_binary_log)"""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, 'wb')
+        self._f.write(BINARY_LOG_MAGIC)
+        self._buffer = bytearray()
+
+    def write_glitch(self, offset: int, size: int, stack: Sequence[int], chunk_offset: int):
+        self._buffer += _ENTRY_RECORD.pack(b'E', offset, size, chunk_offset, len(stack))
+        self._buffer += struct.pack(f'<{len(stack)}H', *stack)
+        if len(self._buffer) >= SINK_BUFFER_RECORDS * _ENTRY_RECORD.size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._f.write(self._buffer)
+            self._buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+def open_log_sink(path: str):
+    """JSONL sink for *.jsonl / *.json paths, binary sink otherwise"""
+    if path.endswith(('.jsonl', '.json')):
+        return JsonlLogSink(path)
+    return BinaryLogSink(path)
+
+def read_binary_log(path: str) -> Iterator[Dict]:
+    """Yield the glitch entries of a binary log as dicts (offset, size, patterns, chunk offset)"""
+    with open(path, 'rb') as f:
+        if f.read(len(BINARY_LOG_MAGIC)) != BINARY_LOG_MAGIC:
+            raise ValueError(f"'{path}' is not a hex fucker binary log")
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag != b'E':
+                raise ValueError(f"Corrupt record in '{path}'")
+            rest = f.read(_ENTRY_RECORD.size - 1)
+            if len(rest) < _ENTRY_RECORD.size - 1:
+                return
+            _, offset, size, chunk_offset, count = _ENTRY_RECORD.unpack(tag + rest)
+            raw = f.read(2 * count)
+            if len(raw) < 2 * count:
+                return
+            yield {'offset': offset, 'size': size, 'patterns': list(struct.unpack(f'<{count}H', raw)),
+                   'chunk_offset': chunk_offset}
+
+class GlitchLog:
+    """
+    Record of applied glitches stored as typed arrays (offset, size, chunk
+    offset, and each write's pattern stack as a slice of one flat array of
+    indices into GlitchConfig.patterns). Entries can be streamed to sinks as
+    they are added; with keep=False nothing per entry or chunk stays in
+    memory, only running statistics (touched chunks are then counted as
+    their offsets rise, which is exact for writes in file order).
+    """
+    def __init__(self, keep: bool = True, sinks: Optional[List] = None):
+        self.keep = keep
+        self.sinks = list(sinks or [])
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.chunk_offsets = array('Q')
+        self.stack_starts = array('Q')   # Entry i's stack is stack_patterns[start:start + length]
+        self.stack_lengths = array('B')
+        self.stack_patterns = array('H')
+        self.count = 0
+        self.total_bytes = 0
+        self.min_size = 0
+        self.max_size = 0
+        self._streamed_chunks = 0  # Chunks seen with keep=False, counted as chunk offsets rise
+        self._last_chunk = -1
+
+    def append(self, offset: int, size: int, stack: Tuple[int, ...], chunk_offset: int):
+        if self.keep:
+            self.offsets.append(offset)
+            self.sizes.append(size)
+            self.chunk_offsets.append(chunk_offset)
+            self.stack_starts.append(len(self.stack_patterns))
+            self.stack_lengths.append(len(stack))
+            self.stack_patterns.extend(stack)
+        for sink in self.sinks:
+            sink.write_glitch(offset, size, stack, chunk_offset)
+        self.min_size = size if self.count == 0 else min(self.min_size, size)
+        self.max_size = max(self.max_size, size)
+        self.count += 1
+        self.total_bytes += size
+        if not self.keep and chunk_offset > self._last_chunk:
+            self._streamed_chunks += 1
+            self._last_chunk = chunk_offset
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def stack(self, i: int) -> Tuple[int, ...]:
+        """Pattern stack of retained entry i"""
+        start = self.stack_starts[i]
+        return tuple(self.stack_patterns[start:start + self.stack_lengths[i]])
+
+    def stacks(self) -> Iterator[Tuple[int, ...]]:
+        """Pattern stack of every retained entry, in order"""
+        patterns = self.stack_patterns
+        for start, length in zip(self.stack_starts, self.stack_lengths):
+            yield tuple(patterns[start:start + length])
+
+    def entry(self, i: int) -> Dict:
+        return {
+            'offset': self.offsets[i],
+            'size': self.sizes[i],
+            'patterns': self.stack(i),
+            'chunk_offset': self.chunk_offsets[i],
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self.entry(i) for i in range(len(self.offsets)))
+
+    def select(self, chunk_offset: Optional[int] = None, min_size: int = 0) -> List[int]:
+        """Indices of retained entries matching the filters"""
+        return [i for i, (size, chunk) in enumerate(zip(self.sizes, self.chunk_offsets))
+                if size >= min_size and (chunk_offset is None or chunk == chunk_offset)]
+
+    def summary(self) -> Dict:
+        """Run statistics; stack usage (pattern_stacks, top_stacks) only when entries are kept"""
+        summary = {
+            'glitches': self.count,
+            'bytes_touched': self.total_bytes,
+            'chunks_touched': len(set(self.chunk_offsets)) if self.keep else self._streamed_chunks,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'mean_size': self.total_bytes / self.count if self.count else 0,
+            'pattern_stacks': None,
+            'top_stacks': [],
+        }
+        if self.keep:
+            uses = Counter(self.stacks())
+            summary['pattern_stacks'] = len(uses)
+            summary['top_stacks'] = [(count, stack) for stack, count in uses.most_common(5)]
+        return summary
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
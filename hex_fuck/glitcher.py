@@ -1,7 +1,21 @@
-import struct
+import os
+import mmap
 import random
-from typing import List, Tuple, Dict
+from bisect import bisect_left
+from typing import List, Tuple, Dict, Optional
 from dataclasses import dataclass
+from avi_index import CHUNK_HEADER_SIZE, FrameIndex, index_video
+from planner import WritePlan, plan_intensity_glitches, smear_position
+from glitch_log import GlitchLog
+from rng import frame_rng, stream
+from stats import RunStats
+from tiles import TileCache
+
+SMEAR_STEP_MIN = 4000
+SMEAR_STEP_MAX = 8000
+SMEAR_SKIP_FIRST = 2  # Skip the first targeted frames (likely I-frames)
+SMEAR_WRITE_SIZE = 1024
+SMEAR_HEADER_GUARD = 102400  # Smear writes never land in the first 100KB (headers)
 
 @dataclass
 class GlitchConfig:
@@ -13,167 +27,558 @@ class GlitchConfig:
     skip_header_bytes: int # Bytes to skip after chunk header (default 12)
     glitch_size: int       # Size of glitch to apply (default 16)
     intensity: str = 'medium'  # Intensity level: low, medium, high, extreme, fucked
+    seed: Optional[int] = None  # Run seed; each frame draws from its own stream derived from (seed, frame)
+    select: Optional[str] = None  # Frame predicates applied before the strategy (see selection.FrameSelection)
+    smear_size: int = SMEAR_WRITE_SIZE  # Bytes per smear write
+    smear_drift: Tuple[int, int] = (SMEAR_STEP_MIN, SMEAR_STEP_MAX)  # Drift added per targeted frame (min, max)
+    codec_aware: bool = False  # Keep writes inside each frame's coded payload (see bitstream.locate_payload)
+
+OUTPUT_MODES = ('mmap', 'memory')
+
+def tile_pattern(pattern: bytes, size: int) -> bytes:
+    """Repeat pattern until it covers exactly size bytes"""
+    if len(pattern) < size:
+        repeats = (size + len(pattern) - 1) // len(pattern)
+        return (pattern * repeats)[:size]
+    return pattern[:size]
+
+def parse_smear_drift(spec: str) -> Tuple[int, int]:
+    """'MIN:MAX' (or a single fixed step) in bytes per targeted frame"""
+    low, sep, high = spec.partition(':')
+    low = int(low)
+    high = int(high) if sep else low
+    if low < 0 or high < low:
+        raise ValueError(f"Invalid smear drift '{spec}' (expected MIN:MAX with 0 <= MIN <= MAX)")
+    return low, high
+
+def frame_data_end(index: FrameIndex, frame_idx: int, data_len: int) -> int:
+    """
+    End of the writable payload of a frame: its declared end, clamped to the file
+    and to the next indexed chunk so frames never overlap (which keeps per-frame
+    writes independent of processing order).
+    """
+    chunk_offset = index.offsets[frame_idx]
+    end = min(chunk_offset + index.header_size + index.sizes[frame_idx], data_len)
+    if frame_idx + 1 < len(index):
+        next_offset = index.offsets[frame_idx + 1]
+        if chunk_offset < next_offset < end:
+            end = next_offset
+    return end
 
 class HexFucker:
     """Main class for video hex fucking operations"""
-    def __init__(self, config: GlitchConfig, smear_mode: bool = False):
+    def __init__(self, config: GlitchConfig, smear_mode: bool = False, output_mode: str = 'mmap',
+                 glitch_log: Optional[GlitchLog] = None, workers: int = 1, stats: Optional[RunStats] = None):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode '{output_mode}' (expected one of: {', '.join(OUTPUT_MODES)})")
         self.config = config
-        self.glitch_log = []  # Track applied glitches for debugging
+        self.output_mode = output_mode
+        self.workers = max(1, workers)
+        self.run_seed = None  # Seed of the current run (config.seed, or drawn when unset)
+        self._output_path = None
+        self.glitch_log = glitch_log if glitch_log is not None else GlitchLog()  # Track applied glitches for debugging
+        self.stats = stats if stats is not None else RunStats()  # Stage timers and counters (--stats)
         from intensity import get_intensity_params
         self.intensity_params = get_intensity_params(config.intensity)
+        # Pattern tiles that write_plan fills overwrites from instead of joining and tiling per write
+        self.tiles = TileCache(config.patterns, max(self.intensity_params['overwrite_size_max'], config.smear_size))
         self.smear_mode = smear_mode
         self.smear_patterns = None  # Will be set per run
+        self.smear_pattern_ids = None  # Indices of smear_patterns in config.patterns
+        self.frame_index = None  # FrameIndex of the last parsed file
+        self.header_size = CHUNK_HEADER_SIZE  # Bytes from a frame's offset to its payload (0 for MP4 samples)
+        self.capture_originals = False  # Keep the bytes each write replaces (for revertible patches)
+        self.original_bytes = bytearray()
+
+    def index_frames(self, data) -> FrameIndex:
+        """
+        Parse the AVI or MP4/MOV structure of data (path, file object or buffer)
+        into a FrameIndex. The index is kept on self.frame_index for the render pass.
+        """
+        self.use_index(index_video(data))
+        return self.frame_index
+
+    def use_index(self, index: FrameIndex):
+        """Render against index (and its container's chunk header size)"""
+        self.frame_index = index
+        self.header_size = index.header_size
+
+    def load_index(self, input_path: str, frame_index: Optional[FrameIndex] = None,
+                   use_index_cache: bool = True) -> FrameIndex:
+        """
+        Render against frame_index, or the index of input_path from the sidecar
+        cache. Codec-aware runs add the bitstream columns on first use and save
+        them with the sidecar, so later runs skip the scan.
+        """
+        stats = self.stats
+        if frame_index is None:
+            from frame_cache import load_frame_index
+            with stats.stage('index'):
+                frame_index = load_frame_index(input_path, use_cache=use_index_cache)
+        if self.config.codec_aware and len(frame_index) and not frame_index.has_bitstream_info:
+            from bitstream import analyze_index
+            with stats.stage('index'):
+                with open(input_path, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        analyze_index(frame_index, data)
+                if use_index_cache:
+                    from frame_cache import save_frame_index
+                    save_frame_index(input_path, frame_index)
+        self.use_index(frame_index)
+        return frame_index
+
+    def coded_range(self, frame_idx: int) -> Optional[Tuple[int, int]]:
+        """Coded bytes of a frame relative to its payload when codec-aware, else None (whole payload)"""
+        if not self.config.codec_aware or self.frame_index is None or not self.frame_index.has_bitstream_info:
+            return None
+        return self.frame_index.coded_range(frame_idx)
+
+    def _coded_window(self, chunk_offset: int, data_start: int, data_end: int,
+                      coded: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+        """Narrow [data_start, data_end) to the coded range of the chunk at chunk_offset"""
+        if coded is None:
+            return data_start, data_end
+        payload = chunk_offset + self.header_size
+        return max(data_start, payload + coded[0]), min(data_end, payload + coded[1])
 
     def find_frame_chunks(self, data: bytes) -> List[Tuple[int, int]]:
         """
-        Find all '00dc' frame data chunks in AVI file
+        Find all video frame chunks ('##dc' / '##db') in AVI file
         Returns list of (offset, size) tuples
         """
-        chunks = []
-        pattern = b'00dc'
-        offset = 0
-        while True:
-            pos = data.find(pattern, offset)
-            if pos == -1:
-                break
-            if pos + 8 <= len(data):
-                try:
-                    chunk_size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
-                    chunks.append((pos, chunk_size))
-                except struct.error:
-                    pass
-            offset = pos + 1
-        return chunks
+        return self.index_frames(data).chunks()
 
-    def apply_intensity_glitches(self, data: bytearray, chunk_offset: int, chunk_size: int) -> int:
+    def plan_intensity_glitches(self, data_len: int, chunk_offset: int, chunk_size: int,
+                                plan: Optional[WritePlan] = None) -> WritePlan:
+        """Plan (but don't write) the intensity overwrites for one chunk"""
+        p = self.intensity_params
+        data_start = chunk_offset + self.header_size + p['skip_header_bytes']
+        data_end = min(chunk_offset + self.header_size + chunk_size, data_len)
+        return plan_intensity_glitches(p, len(self.config.patterns), data_start, data_end,
+                                       chunk_offset=chunk_offset, plan=plan)
+
+    def plan_frame(self, frame_idx: int, chunk_offset: int, data_end: int, plan: WritePlan,
+                   coded: Optional[Tuple[int, int]] = None) -> WritePlan:
+        """
+        Plan one frame's intensity overwrites from its own (run seed, frame)
+        random stream, inside the coded range (relative to the payload) if given.
+        """
         p = self.intensity_params
-        data_start = chunk_offset + 8 + p['skip_header_bytes']
-        data_end = chunk_offset + 8 + chunk_size
-        if data_start >= data_end or data_start >= len(data):
-            return 0
-        available_space = min(data_end - data_start, len(data) - data_start)
-        if available_space <= 0:
-            return 0
+        data_start, data_end = self._coded_window(chunk_offset, chunk_offset + self.header_size + p['skip_header_bytes'],
+                                                  data_end, coded)
+        if coded is not None and coded[1] <= coded[0]:
+            self.stats.count('frames_not_coded')
+            return plan
+        return plan_intensity_glitches(p, len(self.config.patterns), data_start, data_end,
+                                       chunk_offset=chunk_offset, rng=frame_rng(self.run_seed, frame_idx), plan=plan)
+
+    def write_plan(self, data: bytearray, plan: WritePlan) -> int:
+        """Write planned overwrites into data without logging; returns the number written"""
+        tiles = self.tiles
+        misses = tiles.misses
         glitches_applied = 0
-        pos = 0
-        used_offsets = set()
-        while pos < available_space:
-            spacing = random.randint(p['overwrite_spacing_min'], p['overwrite_spacing_max'])
-            chaos = random.randint(0, p['chaos_offset']) if p['chaos_offset'] > 0 else 0
-            offset = data_start + pos + chaos
-            if offset >= data_end:
-                break
-            overwrite_size = random.randint(p['overwrite_size_min'], p['overwrite_size_max'])
-            if offset + overwrite_size > data_end:
-                overwrite_size = data_end - offset
-            if overwrite_size <= 0:
-                break
-            stack_count = random.randint(p['pattern_stack_min'], p['pattern_stack_max'])
-            patterns = [random.choice(self.config.patterns) for _ in range(stack_count)]
-            pattern_bytes = b''.join(patterns)
-            if len(pattern_bytes) < overwrite_size:
-                repeats = (overwrite_size + len(pattern_bytes) - 1) // len(pattern_bytes)
-                pattern_bytes = (pattern_bytes * repeats)[:overwrite_size]
-            else:
-                pattern_bytes = pattern_bytes[:overwrite_size]
-            if not p['overlap']:
-                if any(o in used_offsets for o in range(offset, offset+overwrite_size)):
-                    pos += spacing
-                    continue
-                used_offsets.update(range(offset, offset+overwrite_size))
-            try:
-                data[offset:offset+overwrite_size] = pattern_bytes
-                self.glitch_log.append({
-                    'offset': offset,
-                    'size': overwrite_size,
-                    'pattern': pattern_bytes[:16].hex() + ("..." if len(pattern_bytes) > 16 else ""),
-                    'chunk_offset': chunk_offset
-                })
-                glitches_applied += 1
-            except (IndexError, ValueError):
+        with memoryview(data) as view:
+            limit = len(view)
+            for offset, size, stack, chunk_offset in plan:
+                end = offset + size
+                if end > limit:
+                    break
+                try:
+                    if self.capture_originals:
+                        self.original_bytes += data[offset:end]
+                    if len(stack) == 1:
+                        view[offset:end] = tiles.get(stack[0], size)
+                    else:
+                        tiles.fill(view, offset, end, stack)
+                    glitches_applied += 1
+                except (IndexError, ValueError):
+                    break
+        self.stats.count('pattern_tiles_built', tiles.misses - misses)
+        return glitches_applied
+
+    def log_plan(self, plan: WritePlan, count: int, base: int = 0):
+        """Record the first count writes of plan in the glitch log (base: file offset of plan offset 0)"""
+        log = self.glitch_log
+        for i, (offset, size, stack, chunk_offset) in enumerate(plan):
+            if i >= count:
                 break
-            pos += spacing
+            log.append(base + offset, size, stack, base + chunk_offset)
+
+    def count_plan(self, plan: WritePlan, applied: int):
+        """Add a plan's outcome to the run counters (writes after the first failure are skipped)"""
+        stats = self.stats
+        stats.count('glitches_planned', len(plan))
+        stats.count('glitches_applied', applied)
+        stats.count('glitches_skipped', len(plan) - applied)
+        stats.count('bytes_touched', sum(plan.sizes[:applied]))
+
+    def apply_plan(self, data: bytearray, plan: WritePlan) -> int:
+        """Write every planned overwrite into data and log it; returns the number applied"""
+        glitches_applied = self.write_plan(data, plan)
+        self.log_plan(plan, glitches_applied)
+        self.count_plan(plan, glitches_applied)
         return glitches_applied
 
-    def apply_smear_glitch(self, data: bytearray, chunk_offset: int, chunk_size: int, smear_offset: int, pattern: bytes) -> int:
-        file_offset = chunk_offset + 8 + smear_offset
-        if file_offset < 102400:
-            return 0
-        data_start = chunk_offset + 8
-        data_end = chunk_offset + 8 + chunk_size
-        if file_offset + 1024 > data_end:
-            return 0
-        if file_offset + 1024 > len(data):
-            return 0
-        try:
-            data[file_offset:file_offset+1024] = pattern[:1024]
-            self.glitch_log.append({
-                'offset': file_offset,
-                'size': 1024,
-                'pattern': pattern[:16].hex() + ("..." if len(pattern) > 16 else ""),
-                'chunk_offset': chunk_offset
-            })
-            return 1
-        except (IndexError, ValueError):
-            return 0
-
-    def select_frames_to_glitch(self, total_frames: int) -> List[int]:
+    def apply_intensity_glitches(self, data: bytearray, chunk_offset: int, chunk_size: int) -> int:
+        plan = self.plan_intensity_glitches(len(data), chunk_offset, chunk_size)
+        return self.apply_plan(data, plan)
+
+    def smear_drift(self, frame_idx: int) -> int:
+        """Drift one targeted frame adds to the smear offset, from its own random stream"""
+        low, high = self.config.smear_drift
+        return frame_rng(self.run_seed, frame_idx).randint(low, high)
+
+    def plan_smear_frame(self, slot: int, chunk_offset: int, data_end: int, smear_offset: int, plan: WritePlan,
+                         base: int = 0, coded: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        Plan one smear write smear_offset bytes into a chunk payload (or its
+        coded range), wrapped to land inside its valid window. base is the file
+        offset of plan offset 0 when the chunk is held on its own (streams, previews).
+        """
+        size = self.config.smear_size
+        data_start, data_end = self._coded_window(chunk_offset, chunk_offset + self.header_size, data_end, coded)
+        offset = smear_position(data_start, data_end, smear_offset, size, SMEAR_HEADER_GUARD - base)
+        if offset is None:
+            self.stats.count('smear_skipped_small_chunk')
+            return False
+        plan.add(offset, size, (self.smear_pattern_ids[slot],), chunk_offset)
+        return True
+
+    def plan_smear(self, index: FrameIndex, frames: List[int], data_len: int) -> WritePlan:
+        """Smear writes for every targeted frame, with the drift accumulated in one pass"""
+        plan = WritePlan()
+        smear_offset = 0
+        for i, frame_idx in enumerate(frames):
+            if i < SMEAR_SKIP_FIRST:
+                continue
+            smear_offset += self.smear_drift(frame_idx)
+            self.plan_smear_frame(i % len(self.smear_patterns), index.offsets[frame_idx],
+                                  frame_data_end(index, frame_idx, data_len), smear_offset, plan,
+                                  coded=self.coded_range(frame_idx))
+        return plan
+
+    def plan_frames(self, index: FrameIndex, frames: List[int], data_len: int) -> WritePlan:
+        """Plan the writes of the selected frames: smear writes in smear mode, intensity overwrites otherwise"""
+        if self.smear_mode:
+            self.choose_smear_patterns()
+            return self.plan_smear(index, frames, data_len)
+        plan = WritePlan()
+        for frame_idx in frames:
+            if frame_idx < len(index):
+                self.plan_frame(frame_idx, index.offsets[frame_idx], frame_data_end(index, frame_idx, data_len),
+                                plan, self.coded_range(frame_idx))
+        return plan
+
+    def glitch_frame_buffer(self, buf: bytearray, index: FrameIndex, frame_idx: int, offset: int, data_len: int,
+                            smear: Optional[Tuple[int, int]] = None) -> int:
+        """
+        Glitch buf, a copy of the bytes at offset in the source starting with
+        frame frame_idx's chunk, as the full render would glitch that frame;
+        smear is the frame's (pattern slot, smear offset) in smear mode.
+        Returns the number of writes applied.
+        """
+        data_end = frame_data_end(index, frame_idx, data_len) - offset
+        plan = WritePlan()
+        if self.smear_mode:
+            if smear is None:
+                return 0
+            slot, smear_offset = smear
+            self.plan_smear_frame(slot, 0, data_end, smear_offset, plan, base=offset,
+                                  coded=self.coded_range(frame_idx))
+        else:
+            self.plan_frame(frame_idx, 0, data_end, plan, self.coded_range(frame_idx))
+        applied = self.write_plan(buf, plan)
+        self.log_plan(plan, applied, base=offset)
+        self.count_plan(plan, applied)
+        return applied
+
+    def _rng(self, *keys):
+        """Named random stream of the current run; the global RNG when no seed is known"""
+        seed = self.run_seed if self.run_seed is not None else self.config.seed
+        if seed is None:
+            return random
+        return stream(seed, *keys)
+
+    def candidate_frames(self, total_frames: int, data=None):
+        """
+        Frames the strategy may pick from: every frame, or those passing config.select
+        (evaluated on self.frame_index; data lets keyframes be probed when the index has no flags)
+        """
+        if not self.config.select:
+            return range(total_frames)
+        from selection import FrameSelection
+        if self.frame_index is None:
+            raise ValueError("Frame predicates need the frame index of the file")
+        return FrameSelection(self.config.select).candidates(self.frame_index, data)
+
+    def select_frames_to_glitch(self, total_frames: int, data=None) -> List[int]:
         selected = []
+        candidates = self.candidate_frames(total_frames, data)
         if self.config.target_strategy == 'every_nth':
             n = max(1, self.config.target_value)
-            selected = list(range(0, total_frames, n))
+            selected = list(candidates[::n])
         elif self.config.target_strategy == 'random':
             percentage = max(0, min(100, self.config.target_value))
-            count = int(total_frames * percentage / 100)
-            selected = random.sample(range(total_frames), min(count, total_frames))
+            count = int(len(candidates) * percentage / 100)
+            selected = self._rng('select').sample(candidates, min(count, len(candidates)))
         elif self.config.target_strategy == 'time_offset':
             start_frame = max(0, min(total_frames - 1, self.config.target_value))
-            selected = list(range(start_frame, total_frames))
+            selected = list(candidates[bisect_left(candidates, start_frame):])
         if self.config.max_glitches > 0:
             selected = selected[:self.config.max_glitches]
         return sorted(selected)
 
-    def fuck_video(self, input_path: str, output_path: str) -> bool:
+    def fuck_video(self, input_path: str, output_path: Optional[str], frame_index: Optional[FrameIndex] = None,
+                   use_index_cache: bool = True) -> bool:
+        """
+        Glitch input_path into output_path.
+        With output_path=None nothing is written: the run happens on a private
+        copy-on-write map so the glitch log (and a patch built from it) can be kept.
+        frame_index lets a caller that already analysed the input skip indexing;
+        otherwise it is loaded from (or saved to) the sidecar index cache.
+        In 'mmap' output mode the input is cloned (reflink/copy_file_range where
+        available) and only the glitched regions are patched through an mmap, so
+        peak memory depends on the number of glitches rather than the file size.
+        'memory' mode loads the whole file into a bytearray and rewrites it.
+        """
+        created_output = False
+        stats = self.stats
         try:
-            with open(input_path, 'rb') as f:
-                data = bytearray(f.read())
-            print(f"Loaded video file: {len(data):,} bytes")
-            chunks = self.find_frame_chunks(data)
-            print(f"Found {len(chunks)} frame chunks")
-            if not chunks:
-                print("No frame chunks found. Is this a valid AVI file?")
-                return False
-            frames_to_glitch = self.select_frames_to_glitch(len(chunks))
-            print(f"Targeting {len(frames_to_glitch)} frames for hex fucking")
-            if self.smear_mode:
-                if len(self.config.patterns) <= 3:
-                    self.smear_patterns = self.config.patterns
-                else:
-                    self.smear_patterns = random.sample(self.config.patterns, k=random.randint(2, 3))
-                print(f"[Smear Mode] Using {len(self.smear_patterns)} stable patterns for this run.")
-                smear_offset = 0
-                smear_step_min = 4000
-                smear_step_max = 8000
-                smear_applied = 0
-                skip_first_n = 2
-                for i, frame_idx in enumerate(frames_to_glitch):
-                    if i < skip_first_n:
-                        continue
-                    if frame_idx < len(chunks):
-                        chunk_offset, chunk_size = chunks[frame_idx]
-                        smear_offset += random.randint(smear_step_min, smear_step_max)
-                        pattern = self.smear_patterns[i % len(self.smear_patterns)]
-                        smear_applied += self.apply_smear_glitch(data, chunk_offset, chunk_size, smear_offset, pattern)
-                print(f"[Smear Mode] Applied {smear_applied} smear hex fucks")
+            frame_index = self.load_index(input_path, frame_index, use_index_cache)
+            if output_path is None:
+                from fileio import open_private
+                with open_private(input_path) as data:
+                    print(f"Planning against video file (nothing is written): {len(data):,} bytes")
+                    stats.count('input_bytes', len(data))
+                    return self._fuck_data(data, frame_index)
+            if self.output_mode == 'memory':
+                with stats.stage('read'):
+                    with open(input_path, 'rb') as f:
+                        data = bytearray(f.read())
+                print(f"Loaded video file: {len(data):,} bytes")
+                stats.count('input_bytes', len(data))
+                if not self._fuck_data(data, frame_index):
+                    return False
+                with stats.stage('write'):
+                    with open(output_path, 'wb') as f:
+                        f.write(data)
+                stats.count('output_bytes', len(data))
             else:
+                from fileio import clone_file, open_patchable, same_file
+                if not os.path.exists(input_path):
+                    raise FileNotFoundError(input_path)
+                stats.count('input_bytes', os.path.getsize(input_path))
+                if same_file(input_path, output_path):
+                    print(f"Patching video file in place: {os.path.getsize(input_path):,} bytes")
+                else:
+                    with stats.stage('read'):
+                        method = clone_file(input_path, output_path)
+                    created_output = True
+                    print(f"Cloned video file ({method}): {os.path.getsize(output_path):,} bytes")
+                if os.path.getsize(output_path) == 0:
+                    print("No frame chunks found. Is this a valid AVI file?")
+                    return False
+                with open_patchable(output_path) as data:
+                    self._output_path = output_path
+                    if not self._fuck_data(data, frame_index):
+                        return False
+                    # Write back the dirty pages (open_patchable's own flush is then a no-op)
+                    with stats.stage('write'):
+                        data.flush()
+                stats.count('output_bytes', os.path.getsize(output_path))
+            created_output = False
+            print(f"Saved hex fucked video: {output_path}")
+            return True
+        except FileNotFoundError:
+            print(f"Input file not found: {input_path}")
+            return False
+        except PermissionError:
+            print(f"Permission denied accessing files")
+            return False
+        except Exception as e:
+            print(f"Error during hex fucking: {e}")
+            return False
+        finally:
+            self._output_path = None
+            stats.finish()
+            if created_output:
+                from ffmpeg_utils import cleanup_temp_file
+                cleanup_temp_file(output_path)
+
+    def _fuck_data(self, data, index: FrameIndex) -> bool:
+        """Select and glitch frames of data (a bytearray or writable mmap) in place"""
+        chunks = index.chunks()
+        print(f"Found {len(chunks)} frame chunks ({index.source}{', cached' if index.cached else ''})")
+        if not chunks:
+            print("No frame chunks found. Is this a valid AVI file?")
+            return False
+        self.run_seed = self.config.seed if self.config.seed is not None else random.getrandbits(63)
+        stats = self.stats
+        with stats.stage('select'):
+            frames_to_glitch = self.select_frames_to_glitch(len(chunks), data)
+        stats.count('frames_total', len(chunks))
+        stats.count('frames_selected', len(frames_to_glitch))
+        print(f"Targeting {len(frames_to_glitch)} frames for hex fucking")
+        if self.smear_mode:
+            self.choose_smear_patterns()
+            print(f"[Smear Mode] Using {len(self.smear_patterns)} stable patterns for this run.")
+            with stats.stage('plan'):
+                plan = self.plan_smear(index, frames_to_glitch, len(data))
+            with stats.stage('apply'):
+                smear_applied = self.apply_plan(data, plan)
+            print(f"[Smear Mode] Applied {smear_applied} smear hex fucks")
+        else:
+            frames = [(frame_idx, index.offsets[frame_idx], frame_data_end(index, frame_idx, len(data)),
+                       self.coded_range(frame_idx))
+                      for frame_idx in frames_to_glitch if frame_idx < len(chunks)]
+            if self.workers > 1 and self._output_path is not None and len(frames) > 1:
+                from parallel import glitch_frames_parallel
+                print(f"Glitching {len(frames)} frames on {self.workers} workers")
                 glitches_applied = 0
-                for frame_idx in frames_to_glitch:
-                    if frame_idx < len(chunks):
-                        chunk_offset, chunk_size = chunks[frame_idx]
-                        glitches_applied += self.apply_intensity_glitches(data, chunk_offset, chunk_size)
-                print(f"Applied {glitches_applied} hex fucks")
-            with open(output_path, 'wb') as f:
-                f.write(data)
+                # Workers plan and write their own frames, so both land in the apply stage
+                with stats.stage('apply'):
+                    for plan, applied, originals in glitch_frames_parallel(self, self._output_path, frames, self.workers):
+                        self.log_plan(plan, applied)
+                        self.count_plan(plan, applied)
+                        if self.capture_originals:
+                            self.original_bytes += originals
+                        glitches_applied += applied
+            else:
+                plan = WritePlan()
+                with stats.stage('plan'):
+                    for frame_idx, chunk_offset, data_end, coded in frames:
+                        self.plan_frame(frame_idx, chunk_offset, data_end, plan, coded)
+                with stats.stage('apply'):
+                    glitches_applied = self.apply_plan(data, plan)
+            print(f"Applied {glitches_applied} hex fucks")
+        return True
+
+    def choose_smear_patterns(self):
+        """Pick the 2-3 stable patterns reused by every smear write of this run"""
+        smear_rng = self._rng('smear')
+        if len(self.config.patterns) <= 3:
+            self.smear_pattern_ids = list(range(len(self.config.patterns)))
+        else:
+            self.smear_pattern_ids = smear_rng.sample(range(len(self.config.patterns)), k=smear_rng.randint(2, 3))
+        self.smear_patterns = [self.config.patterns[i] for i in self.smear_pattern_ids]
+
+    def fuck_stream(self, source, output) -> bool:
+        """
+        Glitch an AVI byte stream (e.g. a pipe) chunk by chunk into output,
+        a path or a binary file object such as sys.stdout.buffer.
+        Memory is bounded by the largest chunk; see stream.glitch_stream.
+        """
+        from stream import glitch_stream
+        name = output if isinstance(output, str) else getattr(output, 'name', None)
+        output_path = name if isinstance(name, str) else '<stream>'
+        try:
+            if isinstance(output, str):
+                with open(output, 'w+b') as out:
+                    result = glitch_stream(source, out, self)
+            else:
+                result = glitch_stream(source, output, self)
+                output.flush()
+            self.stats.finish()
+            self.frame_index = result.index
+        except PermissionError:
+            print(f"Permission denied accessing files")
+            return False
+        except Exception as e:
+            print(f"Error during hex fucking: {e}")
+            return False
+        if result.frames == 0:
+            print("No frame chunks found. Is this a valid AVI file?")
+            return False
+        print(f"Streamed {result.frames} frame chunks, targeted {result.selected}")
+        print(f"Applied {result.glitches} hex fucks")
+        print(f"Saved hex fucked video: {output_path}")
+        return True
+
+    def preview_video(self, input_path: str, output_path: str, start: float, end: Optional[float] = None,
+                      seconds: bool = False, frame_index: Optional[FrameIndex] = None,
+                      use_index_cache: bool = True) -> bool:
+        """
+        Render only frames [start, end) (seconds when seconds=True) into a small
+        standalone AVI; the frames get the same bytes as in a full render with
+        the same seed. See preview.render_preview.
+        """
+        from preview import render_preview, seconds_to_frames
+        try:
+            frame_index = self.load_index(input_path, frame_index, use_index_cache)
+            if len(frame_index) == 0:
+                print("No frame chunks found. Is this a valid AVI file?")
+                return False
+            if frame_index.header_size != CHUNK_HEADER_SIZE:
+                print("Previews are written as AVI and need an AVI input; render the full file instead")
+                return False
+            if seconds:
+                start, end = seconds_to_frames(frame_index, start, end)
+            first, end, glitches = render_preview(self, input_path, output_path, int(start),
+                                                  None if end is None else int(end), frame_index)
+            print(f"Previewing frames {max(first, int(start))}-{end - 1} of {len(frame_index)} "
+                  f"(decoding from keyframe {first})")
+            print(f"Applied {glitches} hex fucks")
+            print(f"Saved preview: {output_path}")
+            return True
+        except FileNotFoundError:
+            print(f"Input file not found: {input_path}")
+            return False
+        except PermissionError:
+            print(f"Permission denied accessing files")
+            return False
+        except Exception as e:
+            print(f"Error during hex fucking: {e}")
+            return False
+        finally:
+            self.stats.finish()
+
+    def bake_video(self, input_path: str, out, frame_index: Optional[FrameIndex] = None,
+                   use_index_cache: bool = True) -> bool:
+        """
+        Glitch input_path as fuck_video would, writing the result to out (the
+        stdin of an ffmpeg_utils.FFmpegBake) instead of a file.
+        See stream.render_to_stream.
+        """
+        from stream import render_to_stream
+        try:
+            frame_index = self.load_index(input_path, frame_index, use_index_cache)
+            print(f"Found {len(frame_index)} frame chunks ({frame_index.source}"
+                  f"{', cached' if frame_index.cached else ''})")
+            if len(frame_index) == 0:
+                print("No frame chunks found. Is this a valid AVI file?")
+                return False
+            selected, glitches = render_to_stream(self, input_path, out, frame_index)
+            print(f"Targeted {selected} frames")
+            print(f"Applied {glitches} hex fucks")
+            return True
+        except FileNotFoundError:
+            print(f"Input file not found: {input_path}")
+            return False
+        except PermissionError:
+            print(f"Permission denied accessing files")
+            return False
+        except Exception as e:
+            print(f"Error during hex fucking: {e}")
+            return False
+        finally:
+            self.stats.finish()
+
+    def update_video(self, input_path: str, output_path: str, start: int = 0, end: Optional[int] = None,
+                     frame_index: Optional[FrameIndex] = None, use_index_cache: bool = True) -> bool:
+        """
+        Re-render only the frames in [start, end) whose glitch settings changed
+        since output_path was last rendered this way, using the render cache
+        kept next to it. See render_cache.update_render.
+        """
+        from render_cache import update_render
+        try:
+            frame_index = self.load_index(input_path, frame_index, use_index_cache)
+            if len(frame_index) == 0:
+                print("No frame chunks found. Is this a valid AVI file?")
+                return False
+            checked, rewritten, glitches = update_render(self, input_path, output_path, frame_index, start, end)
+            print(f"Rewrote {rewritten} of {checked} frame chunks ({checked - rewritten} unchanged)")
+            print(f"Applied {glitches} hex fucks")
             print(f"Saved hex fucked video: {output_path}")
             return True
         except FileNotFoundError:
@@ -185,14 +590,40 @@ class HexFucker:
         except Exception as e:
             print(f"Error during hex fucking: {e}")
             return False
+        finally:
+            self.stats.finish()
+
+    def pattern_preview(self, stack: Tuple[int, ...], size: int = 16) -> str:
+        return tile_pattern(b''.join([self.config.patterns[i] for i in stack]), size).hex()
 
-    def print_glitch_log(self):
-        if not self.glitch_log:
+    def print_glitch_log(self, page: int = 1, page_size: int = 50, chunk_offset: Optional[int] = None,
+                         min_size: int = 0):
+        """Print log statistics and one page of (optionally filtered) entries"""
+        log = self.glitch_log
+        if not log:
             print("No hex fucks were applied.")
             return
-        print(f"\nHex Fuck Log ({len(self.glitch_log)} entries):")
+        summary = log.summary()
+        print(f"\nHex Fuck Log ({summary['glitches']:,} entries):")
+        print("-" * 60)
+        print(f"Bytes touched: {summary['bytes_touched']:,} across {summary['chunks_touched']:,} chunks")
+        print(f"Write size: min {summary['min_size']} / mean {summary['mean_size']:.0f} / max {summary['max_size']} bytes")
+        if not log.keep:
+            print("(entries were streamed to the log file and not kept in memory)")
+            return
+        print(f"Pattern stacks used: {summary['pattern_stacks']}")
+        matches = log.select(chunk_offset=chunk_offset, min_size=min_size)
+        if not matches:
+            print("No log entries match the filter.")
+            return
+        pages = max(1, (len(matches) + page_size - 1) // page_size) if page_size > 0 else 1
+        page = max(1, min(page, pages))
+        shown = matches[(page - 1) * page_size:page * page_size] if page_size > 0 else matches
         print("-" * 60)
-        for i, entry in enumerate(self.glitch_log, 1):
-            print(f"{i:3d}. Offset: 0x{entry['offset']:08x} | "
+        for i in shown:
+            entry = log.entry(i)
+            print(f"{i + 1:3d}. Offset: 0x{entry['offset']:08x} | "
                   f"Size: {entry['size']:2d} bytes | "
-                  f"Pattern: {entry['pattern'][:16]}...") 
\ No newline at end of file
+                  f"Pattern: {self.pattern_preview(entry['patterns'], 8)}...")
+        if len(shown) < len(matches):
+            print(f"Page {page}/{pages} of {len(matches):,} matching entries")
@@ -7,10 +7,18 @@ Targets AVI frame data chunks while preserving file structure integrity
 import os
 import sys
 import argparse
-from glitcher import HexFucker, GlitchConfig
+import subprocess
+from glitcher import HexFucker, GlitchConfig, SMEAR_STEP_MAX, SMEAR_STEP_MIN, SMEAR_WRITE_SIZE, parse_smear_drift
 from patterns import GLITCH_PATTERNS, list_available_patterns
 from intensity import get_intensity_params
-from ffmpeg_utils import run_ffmpeg_auto_encode, cleanup_temp_file
+from ffmpeg_utils import (BAKE_CODECS, FFmpegBake, run_ffmpeg_auto_encode, ffmpeg_auto_encode_stream,
+                          make_temp_encode_path, cleanup_temp_file)
+from frame_cache import load_frame_index
+from glitch_log import GlitchLog, open_log_sink
+from patch import GlitchPatch, apply_patch, revert_patch
+from stats import RunStats
+from preview import parse_range
+from selection import FrameSelection, SELECT_HELP
 
 # --- SMEAR MODE CONFIG ---
 smear_mode = False  # If true, applies smear-oriented corruption logic
@@ -18,12 +26,13 @@ smear_mode = False  # If true, applies smear-oriented corruption logic
 def main():
     global smear_mode
     parser = argparse.ArgumentParser(description='Hex Fucker - Corrupt AVI videos by fucking with hex data. Interactive mode is enabled by default when max-glitches is not specified.')
-    parser.add_argument('input', nargs='?', help='Input AVI file path')
-    parser.add_argument('output', nargs='?', help='Output file path')
+    parser.add_argument('input', nargs='?', help='Input AVI or MP4/MOV file path ("-" reads an AVI stream from stdin)')
+    parser.add_argument('output', nargs='?', help='Output file path ("-" writes the glitched stream to stdout)')
     parser.add_argument('--strategy', choices=['every_nth', 'random', 'time_offset'], 
                        default='every_nth', help='Frame targeting strategy')
     parser.add_argument('--value', type=int, default=10, 
                        help='Strategy value (N for every_nth, %% for random, offset for time_offset)')
+    parser.add_argument('--select', help=SELECT_HELP + '. The strategy then picks among the matching frames')
     parser.add_argument('--max-glitches', type=int, default=50, 
                        help='Maximum number of glitches to apply')
     parser.add_argument('--pattern', default='all', 
@@ -33,7 +42,11 @@ def main():
     parser.add_argument('--skip-bytes', type=int, default=12, 
                        help='Bytes to skip after chunk header')
     parser.add_argument('--log', action='store_true', 
-                       help='Print detailed glitch log')
+                       help='Print glitch log statistics and the first page of entries')
+    parser.add_argument('--log-page', type=int, default=1, help='Page of the glitch log to print with --log')
+    parser.add_argument('--log-page-size', type=int, default=50, help='Entries per glitch log page (0 = all)')
+    parser.add_argument('--log-chunk', type=lambda v: int(v, 0), help='Only print log entries for the chunk at this offset')
+    parser.add_argument('--log-file', help='Stream the glitch log to a file (.jsonl for JSON lines, anything else for binary)')
     parser.add_argument('--seed', type=int, help='Random seed for reproducible results')
     parser.add_argument('--list-patterns', action='store_true', 
                        help='List all available glitch patterns and exit')
@@ -44,30 +57,192 @@ def main():
     parser.add_argument('--intensity', choices=['low', 'medium', 'high', 'extreme', 'fucked'], default='medium',
                        help='Glitch intensity: low, medium, high, extreme, fucked (controls overwrite size, frequency, stacking, chaos)')
     parser.add_argument('--smear-mode', action='store_true', help='Enable smear mode for temporal drag/smear effects')
+    parser.add_argument('--smear-size', type=int, default=SMEAR_WRITE_SIZE,
+                       help=f'Bytes per smear write (default: {SMEAR_WRITE_SIZE})')
+    parser.add_argument('--smear-drift', metavar='MIN:MAX', default=f'{SMEAR_STEP_MIN}:{SMEAR_STEP_MAX}',
+                       help='Bytes the smear position drifts per targeted frame; it wraps inside each frame '
+                            f'(default: {SMEAR_STEP_MIN}:{SMEAR_STEP_MAX})')
+    parser.add_argument('--codec-aware', action='store_true',
+                       help='Keep glitches inside each frame\'s coded data: after the VOP header for MPEG-4 '
+                            'Part 2 (Xvid/DivX), after SOS for MJPEG. Skips not-coded frames; the scan is '
+                            'cached with the frame index')
+    parser.add_argument('--effects', metavar='PATH',
+                       help='Render an effect stack: a JSON list of layers, each with its own pattern, selection, '
+                            'intensity or smear settings (the options above are the defaults), planned separately '
+                            'and applied in one pass; later layers win where writes overlap')
     parser.add_argument('--auto-encode', action='store_true', help='Automatically re-encode input with FFmpeg for smear-friendly structure before hex editing')
+    parser.add_argument('--bake-codec', choices=sorted(BAKE_CODECS),
+                       help='Encode the glitched video straight into OUTPUT with this delivery codec, feeding FFmpeg '
+                            'while frames are glitched (the glitched AVI never reaches disk); FFmpeg decode errors '
+                            'are kept in the --stats report')
+    parser.add_argument('--save-patch', metavar='PATH',
+                       help='Save the glitch plan as a replayable patch file (kilobytes instead of a full copy)')
+    parser.add_argument('--patch-only', action='store_true',
+                       help='With --save-patch: plan the glitches without writing an output video')
+    parser.add_argument('--with-originals', action='store_true',
+                       help='Store the bytes each glitch replaces in the patch so it can be reverted')
+    parser.add_argument('--apply-patch', metavar='PATH',
+                       help='Replay a patch onto input, writing output (or patching input in place if no output is given)')
+    parser.add_argument('--revert-patch', metavar='PATH',
+                       help='Restore input in place from a patch saved with --with-originals')
+    parser.add_argument('--batch', metavar='SPEC',
+                       help='Batch mode: a directory, glob or CSV/JSON manifest (input, output, per-job settings)')
+    parser.add_argument('--out-dir', help='Output directory for --batch inputs without an explicit output')
+    parser.add_argument('--serve', nargs='?', const='127.0.0.1:8765', metavar='ADDRESS',
+                       help='Run as a render service on HOST:PORT (default 127.0.0.1:8765) or unix:PATH, '
+                            'keeping patterns and frame indexes loaded between jobs')
+    parser.add_argument('--jobs', type=int,
+                       help='Concurrent glitch jobs in --batch and --serve mode, scan processes for --rebuild-index '
+                            '(default: CPU count)')
+    parser.add_argument('--ffmpeg-jobs', type=int, default=1, help='Concurrent --auto-encode FFmpeg runs in --batch mode')
+    parser.add_argument('--rebuild-index', action='store_true',
+                       help='Scan a damaged or index-less AVI on every core and write a rebuilt idx1 into it '
+                            '(modifies the input: appends the idx1 and fixes the RIFF/movi sizes), then exit')
+    parser.add_argument('--no-index-cache', action='store_true',
+                       help='Do not read or write the .hfidx frame index sidecar next to the input')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Glitch frames on this many processes (mmap output mode); --seed output is identical for any worker count')
+    parser.add_argument('--preview-frames', metavar='A:B',
+                       help='Only render frames A to B-1 (plus the frames back to the previous keyframe) as a quick preview')
+    parser.add_argument('--preview-seconds', metavar='A:B',
+                       help='Like --preview-frames, with the window given in seconds')
+    parser.add_argument('--update', nargs='?', const=':', metavar='A:B',
+                       help='Only rewrite the frame chunks of an existing output whose settings changed since its '
+                            'last --update (optionally only frames A to B-1); keeps a .hfrc render cache next to output')
+    parser.add_argument('--stats', action='store_true',
+                       help='Print per-stage timings, glitch counters and peak memory after the run')
+    parser.add_argument('--stats-json', help='Write the run stats to this JSON file')
+    parser.add_argument('--output-mode', choices=['mmap', 'memory'], default='mmap',
+                       help='mmap: clone the input and patch only glitched regions (low memory); memory: load the whole file into RAM')
     
     args = parser.parse_args()
     if args.list_patterns:
         list_available_patterns()
         sys.exit(0)
-    if not args.input or not args.output:
+    if args.batch:
+        from batch import JOB_SETTINGS, run_batch
+        defaults = {key: getattr(args, key) for key in JOB_SETTINGS}
+        sys.exit(run_batch(args.batch, defaults, out_dir=args.out_dir, workers=args.jobs,
+                           ffmpeg_jobs=args.ffmpeg_jobs))
+    if args.serve:
+        from batch import JOB_SETTINGS
+        from service import serve
+        defaults = {key: getattr(args, key) for key in JOB_SETTINGS}
+        try:
+            sys.exit(serve(args.serve, defaults, workers=args.jobs))
+        except (OSError, ValueError) as e:
+            print(f"Could not start the render service: {e}")
+            sys.exit(1)
+    if args.apply_patch or args.revert_patch:
+        if not args.input:
+            parser.error("An input file is required with --apply-patch / --revert-patch")
+        try:
+            if args.apply_patch:
+                patch = apply_patch(args.apply_patch, args.input, args.output)
+                print(f"Applied {len(patch):,} patch writes to {args.output or args.input}")
+            else:
+                patch = revert_patch(args.revert_patch, args.input)
+                print(f"Reverted {len(patch):,} patch writes in {args.input}")
+        except (OSError, ValueError) as e:
+            print(f"Patch failed: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    if args.rebuild_index:
+        if not args.input or args.input == '-':
+            parser.error("An input file is required with --rebuild-index")
+        from recovery import rebuild_idx1
+        try:
+            entries = rebuild_idx1(args.input, workers=args.jobs)
+        except (OSError, ValueError) as e:
+            print(f"Index rebuild failed: {e}")
+            sys.exit(1)
+        print(f"Wrote a rebuilt idx1 with {entries:,} entries to {args.input}")
+        sys.exit(0)
+    if args.patch_only and not args.save_patch:
+        parser.error("--patch-only requires --save-patch")
+    if args.save_patch and args.auto_encode:
+        parser.error("--save-patch cannot be combined with --auto-encode (the encoded source is deleted after the run)")
+    if not args.input or (not args.output and not args.patch_only):
         parser.error("Input and output file paths are required when not using --list-patterns")
+    if args.select:
+        try:
+            FrameSelection(args.select)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        smear_drift = parse_smear_drift(args.smear_drift)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.smear_size < 1:
+        parser.error("--smear-size must be at least 1 byte")
+    # "-" for input or output runs the chunk-streaming pipeline instead of fuck_video
+    streaming = args.input == '-' or args.output == '-'
+    preview = args.preview_frames or args.preview_seconds
+    if preview:
+        if args.preview_frames and args.preview_seconds:
+            parser.error("Use either --preview-frames or --preview-seconds, not both")
+        if streaming or args.save_patch or args.patch_only:
+            parser.error("Previews need an input file and an output file and cannot be saved as patches")
+        try:
+            preview_start, preview_end = parse_range(preview)
+        except ValueError:
+            parser.error(f"Invalid preview range '{preview}' (expected A:B, A: or A)")
+    if args.update is not None:
+        if streaming or preview or args.save_patch or args.patch_only or args.auto_encode:
+            parser.error("--update needs the same input file and an output file each time; "
+                         "it cannot be combined with streaming, previews, patches or --auto-encode")
+        try:
+            update_start, update_end = parse_range(args.update)
+        except ValueError:
+            parser.error(f"Invalid update range '{args.update}' (expected A:B, A: or A)")
+    if streaming and args.save_patch:
+        parser.error("--save-patch needs an input file and an output file, not stdin/stdout")
+    if args.bake_codec and (args.output == '-' or preview or args.update is not None or args.save_patch
+                            or args.patch_only):
+        parser.error("--bake-codec writes an encoded file to OUTPUT; it cannot be combined with stdout output, "
+                     "previews, --update or patches")
+    effect_layers = None
+    if args.effects:
+        if streaming or preview or args.update is not None or args.bake_codec:
+            parser.error("--effects needs an input file and an output file; it cannot be combined with streaming, "
+                         "previews, --update or --bake-codec")
+        from effects import LAYER_SETTINGS, load_layers
+        try:
+            effect_layers, effects_seed = load_layers(
+                args.effects, {key: getattr(args, key) for key in LAYER_SETTINGS if key != 'seed'})
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid effect stack {args.effects}: {e}")
+    stream_out = None
+    if args.output == '-':
+        # The video goes to stdout, so every status message goes to stderr
+        stream_out = sys.stdout.buffer
+        sys.stdout = sys.stderr
     if args.seed:
         import random
         random.seed(args.seed)
         print(f"Using random seed: {args.seed}")
     if args.smear_mode:
         smear_mode = True
+    interactive_mode = (args.interactive or 
+                       (args.max_glitches == 50 and '--max-glitches' not in sys.argv)) and not args.no_interactive \
+                       and not streaming and not args.effects
     # FFmpeg Preprocessing Step (if --auto-encode)
+    # FFmpeg output is normally piped straight into the glitcher; interactive mode
+    # (needs the frame count up front) and --workers (needs a file to map) encode
+    # into a unique temp file instead
     input_file_for_hex = args.input
-    temp_encoded = "temp_encoded.avi"
-    if args.auto_encode:
+    temp_encoded = None
+    pipe_encode = args.auto_encode and (streaming or (not interactive_mode and args.workers <= 1 and not preview
+                                                      and not args.effects))
+    if args.auto_encode and not pipe_encode:
         print("[Auto-Encode] Re-encoding input with FFmpeg for smear-friendly structure...")
+        temp_encoded = make_temp_encode_path(args.output)
         try:
             run_ffmpeg_auto_encode(args.input, temp_encoded)
             input_file_for_hex = temp_encoded
         except Exception as e:
             print(f"[Auto-Encode] FFmpeg failed: {e}")
+            cleanup_temp_file(temp_encoded)
             sys.exit(1)
     # Select patterns
     if args.pattern == 'all':
@@ -94,20 +269,27 @@ def main():
         max_glitches=args.max_glitches,
         skip_header_bytes=intensity_params['skip_header_bytes'],
         glitch_size=intensity_params['overwrite_size_max'],
-        intensity=args.intensity
+        intensity=args.intensity,
+        seed=args.seed,
+        select=args.select,
+        smear_size=args.smear_size,
+        smear_drift=smear_drift,
+        codec_aware=args.codec_aware
     )
-    interactive_mode = (args.interactive or 
-                       (args.max_glitches == 50 and '--max-glitches' not in sys.argv)) and not args.no_interactive
+    # Temp encodes are deleted after the run, so caching their index is pointless
+    use_index_cache = not args.no_index_cache and not args.auto_encode
+    frame_index = None
+    stats = RunStats()
     if interactive_mode:
         print("Hex Fucker - Video Hex Corruption Tool")
         print("=" * 40)
         print("Analyzing video file...")
         try:
-            with open(args.input, 'rb') as f:
-                data = f.read()
+            with stats.stage('index'):
+                frame_index = load_frame_index(input_file_for_hex, use_cache=use_index_cache)
             temp_hex_fucker = HexFucker(config)
-            chunks = temp_hex_fucker.find_frame_chunks(data)
-            total_frames = len(chunks)
+            temp_hex_fucker.frame_index = frame_index
+            total_frames = len(frame_index)
             if total_frames == 0:
                 print("No frame chunks found. Is this a valid AVI file?")
                 sys.exit(1)
@@ -147,30 +329,107 @@ def main():
                     print("\nOperation cancelled.")
                     sys.exit(0)
         except FileNotFoundError:
-            print(f"Input file not found: {args.input}")
+            print(f"Input file not found: {input_file_for_hex}")
             sys.exit(1)
         except Exception as e:
             print(f"Error analyzing video: {e}")
             sys.exit(1)
-    hex_fucker = HexFucker(config, smear_mode=smear_mode)
+    glitch_log = GlitchLog(keep=args.log or args.save_patch or (not args.log_file and not streaming),
+                           sinks=[open_log_sink(args.log_file)] if args.log_file else None)
+    if effect_layers is not None:
+        from effects import EffectStack
+        hex_fucker = EffectStack(effect_layers, seed=args.seed if args.seed is not None else effects_seed,
+                                 output_mode=args.output_mode, glitch_log=glitch_log, stats=stats)
+        print(f"Using an effect stack of {len(effect_layers)} layers: {args.effects}")
+    else:
+        hex_fucker = HexFucker(config, smear_mode=smear_mode, output_mode=args.output_mode, glitch_log=glitch_log,
+                               workers=args.workers, stats=stats)
+    hex_fucker.capture_originals = args.with_originals
+    output_path = None if args.patch_only else args.output
     if not interactive_mode:
         print("Hex Fucker - Video Hex Corruption Tool")
         print("=" * 40)
-    success = hex_fucker.fuck_video(input_file_for_hex, args.output)
+    bake = None
+    sink = stream_out
+    if args.bake_codec:
+        print(f"[Bake] Encoding to {args.bake_codec} through FFmpeg while glitching: {output_path}")
+        try:
+            bake = FFmpegBake(output_path, args.bake_codec)
+        except OSError as e:
+            print(f"[Bake] Could not start FFmpeg: {e}")
+            sys.exit(1)
+        sink = bake.stdin
+    if pipe_encode:
+        print("[Auto-Encode] Streaming FFmpeg re-encode straight into the hex fucker...")
+        try:
+            with ffmpeg_auto_encode_stream(args.input) as encoded:
+                success = hex_fucker.fuck_stream(encoded, sink or output_path)
+        except Exception as e:
+            print(f"[Auto-Encode] FFmpeg failed: {e}")
+            if stream_out is None:
+                cleanup_temp_file(output_path)
+            success = False
+    elif streaming:
+        if args.input == '-':
+            success = hex_fucker.fuck_stream(sys.stdin.buffer, sink or output_path)
+        else:
+            try:
+                with open(args.input, 'rb') as source:
+                    success = hex_fucker.fuck_stream(source, sink or output_path)
+            except FileNotFoundError:
+                print(f"Input file not found: {args.input}")
+                success = False
+    elif preview:
+        success = hex_fucker.preview_video(input_file_for_hex, output_path, preview_start, preview_end,
+                                           seconds=bool(args.preview_seconds), frame_index=frame_index,
+                                           use_index_cache=use_index_cache)
+    elif args.update is not None:
+        success = hex_fucker.update_video(input_file_for_hex, output_path, int(update_start),
+                                          None if update_end is None else int(update_end),
+                                          frame_index=frame_index, use_index_cache=use_index_cache)
+    elif bake is not None:
+        success = hex_fucker.bake_video(input_file_for_hex, bake.stdin, frame_index=frame_index,
+                                        use_index_cache=use_index_cache)
+    else:
+        success = hex_fucker.fuck_video(input_file_for_hex, output_path, frame_index=frame_index,
+                                        use_index_cache=use_index_cache)
+    if bake is not None:
+        try:
+            bake.finish()
+            if success:
+                print(f"[Bake] Saved {args.bake_codec} video: {output_path}")
+        except subprocess.CalledProcessError as e:
+            print(f"[Bake] FFmpeg failed (exit code {e.returncode})" + (f":\n{e.stderr}" if e.stderr else ''))
+            success = False
+        if not success:
+            cleanup_temp_file(output_path)
+        stats.count('bake_ffmpeg_errors', bake.errors)
+        if bake.log:
+            stats.add_log('ffmpeg_bake', bake.log)
+            print(f"[Bake] FFmpeg reported {bake.errors:,} decode errors (see --stats for the log)")
+    glitch_log.close()
+    if args.save_patch and success:
+        patch = GlitchPatch.from_render(hex_fucker, input_file_for_hex, seed=args.seed, result_path=output_path)
+        patch.save(args.save_patch)
+        print(f"Saved patch with {len(patch):,} writes: {args.save_patch} ({os.path.getsize(args.save_patch):,} bytes)")
+    if args.stats:
+        stats.print_report()
+    if args.stats_json:
+        stats.save_json(args.stats_json)
     if args.log and success:
-        hex_fucker.print_glitch_log()
+        hex_fucker.print_glitch_log(page=args.log_page, page_size=args.log_page_size, chunk_offset=args.log_chunk)
     if success:
         print("\nHex fucking completed successfully!")
     else:
         print("\nHex fucking failed!")
-        if args.auto_encode:
+        if temp_encoded:
             cleanup_temp_file(temp_encoded)
         sys.exit(1)
-    if args.auto_encode:
+    if temp_encoded:
         if cleanup_temp_file(temp_encoded):
-            print("[Auto-Encode] Cleaned up temp_encoded.avi")
+            print(f"[Auto-Encode] Cleaned up {temp_encoded}")
         else:
-            print("[Auto-Encode] Warning: Could not delete temp_encoded.avi")
+            print(f"[Auto-Encode] Warning: Could not delete {temp_encoded}")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
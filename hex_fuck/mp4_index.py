@@ -0,0 +1,214 @@
+import sys
+import struct
+from array import array
+from typing import Dict, Iterator, Optional, Tuple
+from avi_index import AVIIF_KEYFRAME, FrameIndex, _Reader
+
+ISO_BMFF_BOXES = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid')
+
+def is_iso_bmff(head: bytes) -> bool:
+    """True when head (the first bytes of a file) starts with an ISO-BMFF (MP4/MOV) box"""
+    return len(head) >= 8 and head[4:8] in ISO_BMFF_BOXES
+
+def _be_array(typecode: str, raw: bytes) -> array:
+    table = array(typecode, raw)
+    if sys.byteorder == 'little':
+        table.byteswap()
+    return table
+
+def _boxes(data: bytes, pos: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, box end) of each box in data[pos:end]"""
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+def _children(data: bytes, pos: int, end: int) -> Dict[bytes, Tuple[int, int]]:
+    """First box of each type in data[pos:end] as type -> (payload start, box end)"""
+    found = {}
+    for kind, start, box_end in _boxes(data, pos, end):
+        found.setdefault(kind, (start, box_end))
+    return found
+
+def _read_moov(reader: _Reader) -> bytes:
+    """Walk the top-level boxes and return the moov payload"""
+    pos = 0
+    moov = None
+    while pos + 8 <= reader.size:
+        raw = reader.read_at(pos, 16)
+        size, kind = struct.unpack('>I4s', raw[:8])
+        header = 8
+        if size == 1 and len(raw) == 16:
+            size = struct.unpack('>Q', raw[8:16])[0]
+            header = 16
+        elif size == 0:
+            size = reader.size - pos
+        if size < header:
+            raise ValueError(f"Damaged MP4 box '{kind.decode('latin-1')}' at offset {pos}")
+        if kind == b'moov':
+            moov = reader.read_at(pos + header, size - header)
+        elif kind == b'moof':
+            raise ValueError("Fragmented MP4 (moof) is not supported; remux it to a regular MP4 first")
+        pos += size
+    if moov is None:
+        raise ValueError("No moov box found (is the file complete?)")
+    return moov
+
+def _stsz(data: bytes, start: int) -> array:
+    sample_size, count = struct.unpack_from('>II', data, start + 4)
+    if sample_size:
+        return array('I', [sample_size]) * count
+    return _be_array('I', data[start + 12:start + 12 + 4 * count])
+
+def _stz2(data: bytes, start: int) -> array:
+    field_size = data[start + 7]
+    count = struct.unpack_from('>I', data, start + 8)[0]
+    raw = data[start + 12:]
+    if field_size == 16:
+        return array('I', _be_array('H', raw[:2 * count]))
+    if field_size == 8:
+        return array('I', raw[:count])
+    if field_size == 4:
+        sizes = array('I')
+        for byte in raw[:(count + 1) // 2]:
+            sizes.append(byte >> 4)
+            sizes.append(byte & 0x0f)
+        return sizes[:count]
+    raise ValueError(f"Unsupported stz2 field size {field_size}")
+
+def _track_samples(moov: bytes, start: int, end: int, file_size: int) -> Optional[Dict]:
+    """Sample offsets, sizes and sync flags of a video trak, or None for other tracks"""
+    trak = _children(moov, start, end)
+    if b'mdia' not in trak:
+        return None
+    mdia = _children(moov, *trak[b'mdia'])
+    if b'hdlr' not in mdia or b'minf' not in mdia:
+        return None
+    hdlr = mdia[b'hdlr'][0]
+    if moov[hdlr + 8:hdlr + 12] != b'vide':
+        return None
+    timescale = 0
+    if b'mdhd' in mdia:
+        mdhd = mdia[b'mdhd'][0]
+        timescale = struct.unpack_from('>I', moov, mdhd + (20 if moov[mdhd] == 1 else 12))[0]
+    track_id = 0
+    if b'tkhd' in trak:
+        tkhd = trak[b'tkhd'][0]
+        track_id = struct.unpack_from('>I', moov, tkhd + (20 if moov[tkhd] == 1 else 12))[0]
+    minf = _children(moov, *mdia[b'minf'])
+    if b'stbl' not in minf:
+        return None
+    stbl = _children(moov, *minf[b'stbl'])
+    if b'stsz' in stbl:
+        sizes = _stsz(moov, stbl[b'stsz'][0])
+    elif b'stz2' in stbl:
+        sizes = _stz2(moov, stbl[b'stz2'][0])
+    else:
+        return None
+    if b'stco' in stbl:
+        at = stbl[b'stco'][0]
+        count = struct.unpack_from('>I', moov, at + 4)[0]
+        chunk_offsets = _be_array('I', moov[at + 8:at + 8 + 4 * count])
+    elif b'co64' in stbl:
+        at = stbl[b'co64'][0]
+        count = struct.unpack_from('>I', moov, at + 4)[0]
+        chunk_offsets = _be_array('Q', moov[at + 8:at + 8 + 8 * count])
+    else:
+        return None
+    if b'stsc' not in stbl:
+        return None
+    at = stbl[b'stsc'][0]
+    count = struct.unpack_from('>I', moov, at + 4)[0]
+    stsc = _be_array('I', moov[at + 8:at + 8 + 12 * count])
+    # Expand the sample-to-chunk runs into one file offset per sample
+    offsets = array('Q')
+    sample = 0
+    total = len(sizes)
+    for run in range(0, len(stsc), 3):
+        first_chunk, per_chunk = stsc[run], stsc[run + 1]
+        last_chunk = stsc[run + 3] - 1 if run + 3 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk - 1, min(last_chunk, len(chunk_offsets))):
+            pos = chunk_offsets[chunk]
+            for _ in range(min(per_chunk, total - sample)):
+                offsets.append(pos)
+                pos += sizes[sample]
+                sample += 1
+    # Without stss every sample is a sync sample
+    flags = array('I', [AVIIF_KEYFRAME]) * len(offsets)
+    if b'stss' in stbl:
+        at = stbl[b'stss'][0]
+        count = struct.unpack_from('>I', moov, at + 4)[0]
+        flags = array('I', bytes(4 * len(offsets)))
+        for number in _be_array('I', moov[at + 8:at + 8 + 4 * count]):
+            if 0 < number <= len(flags):
+                flags[number - 1] = AVIIF_KEYFRAME
+    duration = 0
+    if b'stts' in stbl:
+        at = stbl[b'stts'][0]
+        count = struct.unpack_from('>I', moov, at + 4)[0]
+        stts = _be_array('I', moov[at + 8:at + 8 + 8 * count])
+        duration = sum(stts[i] * stts[i + 1] for i in range(0, len(stts), 2))
+    stsd = stbl.get(b'stsd')
+    handler = moov[stsd[0] + 12:stsd[0] + 16].decode('latin-1') if stsd else ''
+    # Samples that start past the end of a truncated file cannot be patched
+    keep = len(offsets)
+    while keep and offsets[keep - 1] >= file_size:
+        keep -= 1
+    return {
+        'offsets': offsets[:keep],
+        'sizes': sizes[:keep],
+        'flags': flags[:keep],
+        'info': {
+            'type': 'vids',
+            'handler': handler,
+            # rate / scale is the frame rate, as for an AVI strh
+            'scale': duration,
+            'rate': timescale * len(offsets),
+            'start': 0,
+            'length': len(offsets),
+            'track_id': track_id,
+        },
+    }
+
+def index_mp4(source) -> FrameIndex:
+    """
+    Build the frame table of an MP4/MOV file from the sample tables of its
+    video tracks (stsz/stz2, stco/co64, stsc, stss, stts). offsets point
+    straight at the samples inside mdat (header_size 0), so the glitch engine
+    patches them in place and the container stays untouched.
+    source may be a path, a binary file object or a buffer.
+    """
+    reader = _Reader(source)
+    try:
+        moov = _read_moov(reader)
+        index = FrameIndex('stbl')
+        track = 0
+        for kind, start, end in _boxes(moov, 0, len(moov)):
+            if kind != b'trak':
+                continue
+            samples = _track_samples(moov, start, end, reader.size)
+            if samples is None:
+                continue
+            index.offsets.extend(samples['offsets'])
+            index.sizes.extend(samples['sizes'])
+            index.flags.extend(samples['flags'])
+            index.stream_ids.extend(array('H', [track]) * len(samples['offsets']))
+            index.streams[track] = samples['info']
+            track += 1
+        if track > 1:
+            index.sort()
+        fps = index.fps
+        index.micro_sec_per_frame = int(1000000 / fps) if fps else 0
+        return index
+    finally:
+        reader.close()
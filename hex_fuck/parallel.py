@@ -0,0 +1,50 @@
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+# Per-worker state, set once by _init_worker: (HexFucker, mmap, file)
+_worker = None
+
+def _init_worker(output_path: str, config, smear_mode: bool, run_seed: int, capture_originals: bool,
+                 header_size: int):
+    global _worker
+    from glitcher import HexFucker
+    f = open(output_path, 'r+b')
+    data = mmap.mmap(f.fileno(), 0)
+    hex_fucker = HexFucker(config, smear_mode=smear_mode)
+    hex_fucker.run_seed = run_seed
+    hex_fucker.capture_originals = capture_originals
+    hex_fucker.header_size = header_size
+    _worker = (hex_fucker, data, f)
+
+def _glitch_batch(frames: List[Tuple[int, int, int, Optional[Tuple[int, int]]]]):
+    """Plan and write a batch of (frame index, chunk offset, payload end, coded range) straight into the shared mapping"""
+    from planner import WritePlan
+    hex_fucker, data, _f = _worker
+    plan = WritePlan()
+    for frame_idx, chunk_offset, data_end, coded in frames:
+        hex_fucker.plan_frame(frame_idx, chunk_offset, data_end, plan, coded)
+    hex_fucker.original_bytes = bytearray()
+    applied = hex_fucker.write_plan(data, plan)
+    return plan, applied, bytes(hex_fucker.original_bytes)
+
+def glitch_frames_parallel(hex_fucker, output_path: str, frames: List[Tuple[int, int, int]], workers: int):
+    """
+    Split frames across a process pool; each worker maps output_path shared and
+    writes its frames directly. Yields (plan, applied, original bytes) per batch
+    in frame order so the caller can merge logs deterministically.
+    """
+    batch_count = min(len(frames), workers * 4)
+    if batch_count == 0:
+        return
+    size, extra = divmod(len(frames), batch_count)
+    batches = []
+    start = 0
+    for i in range(batch_count):
+        end = start + size + (1 if i < extra else 0)
+        batches.append(frames[start:end])
+        start = end
+    initargs = (output_path, hex_fucker.config, hex_fucker.smear_mode, hex_fucker.run_seed,
+                hex_fucker.capture_originals, hex_fucker.header_size)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.map(_glitch_batch, batches)
@@ -0,0 +1,172 @@
+import os
+import json
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+from frame_cache import fingerprint_file
+from tiles import TileCache
+
+PATCH_MAGIC = b'HFPATCH\x01'
+PATCH_VERSION = 1
+PATCH_SUFFIX = '.hfpatch'
+
+class PatchMismatchError(ValueError):
+    """The file a patch is applied to (or reverted from) is not the one it was made for"""
+
+class GlitchPatch:
+    """
+    A replayable glitch plan: the offset, size and pattern stack of every write,
+    the pattern bytes those stacks refer to, the seed and the source fingerprint.
+    With originals it also holds the bytes each write replaced, so it can be reverted.
+    """
+    def __init__(self, source_size: int, source_fingerprint: str, seed: Optional[int] = None):
+        self.source_size = source_size
+        self.source_fingerprint = source_fingerprint
+        self.result_fingerprint: Optional[str] = None
+        self.seed = seed
+        self.settings: Dict = {}
+        self.patterns: List[bytes] = []
+        self.stacks: List[Tuple[int, ...]] = []
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.pattern_ids = array('I')
+        self.originals: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @classmethod
+    def from_render(cls, hex_fucker, source_path: str, seed: Optional[int] = None,
+                    result_path: Optional[str] = None) -> 'GlitchPatch':
+        """Build a patch from a finished HexFucker run (its glitch log must be kept in memory)"""
+        log = hex_fucker.glitch_log
+        if not log.keep:
+            raise ValueError("Glitch log entries were not kept; cannot build a patch")
+        size = os.path.getsize(source_path)
+        patch = cls(size, fingerprint_file(source_path, size), seed if seed is not None else hex_fucker.run_seed)
+        # Intern the stacks of the log, then ship only the patterns they reference, renumbered densely
+        stack_ids: Dict[Tuple[int, ...], int] = {}
+        patch.pattern_ids = array('I', (stack_ids.setdefault(stack, len(stack_ids)) for stack in log.stacks()))
+        used = sorted(set(log.stack_patterns))
+        remap = {old: new for new, old in enumerate(used)}
+        patch.patterns = [bytes(hex_fucker.config.patterns[i]) for i in used]
+        patch.stacks = [tuple(remap[i] for i in stack) for stack in stack_ids]
+        patch.offsets = array('Q', log.offsets)
+        patch.sizes = array('I', log.sizes)
+        if hex_fucker.capture_originals:
+            patch.originals = bytes(hex_fucker.original_bytes)
+        config = hex_fucker.config
+        patch.settings = {
+            'intensity': config.intensity,
+            'target_strategy': config.target_strategy,
+            'target_value': config.target_value,
+            'max_glitches': config.max_glitches,
+            'select': config.select,
+            'smear_size': config.smear_size,
+            'smear_drift': list(config.smear_drift),
+            'codec_aware': config.codec_aware,
+            'smear_mode': hex_fucker.smear_mode,
+        }
+        if result_path is not None:
+            patch.result_fingerprint = fingerprint_file(result_path)
+        return patch
+
+    def save(self, path: str):
+        header = json.dumps({
+            'version': PATCH_VERSION,
+            'source': {'size': self.source_size, 'fingerprint': self.source_fingerprint},
+            'result_fingerprint': self.result_fingerprint,
+            'seed': self.seed,
+            'settings': self.settings,
+            'count': len(self),
+            'pattern_lengths': [len(p) for p in self.patterns],
+            'stacks': [list(stack) for stack in self.stacks],
+            'originals': None if self.originals is None else len(self.originals),
+        }).encode()
+        with open(path, 'wb') as f:
+            f.write(PATCH_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.writelines(self.patterns)
+            for column in (self.offsets, self.sizes, self.pattern_ids):
+                if struct.pack('=I', 1) != struct.pack('<I', 1):
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+            if self.originals is not None:
+                f.write(self.originals)
+
+    @classmethod
+    def load(cls, path: str) -> 'GlitchPatch':
+        with open(path, 'rb') as f:
+            if f.read(len(PATCH_MAGIC)) != PATCH_MAGIC:
+                raise ValueError(f"'{path}' is not a hex fucker patch file")
+            header_len = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_len))
+            if header['version'] != PATCH_VERSION:
+                raise ValueError(f"Unsupported patch version {header['version']}")
+            patch = cls(header['source']['size'], header['source']['fingerprint'], header['seed'])
+            patch.result_fingerprint = header['result_fingerprint']
+            patch.settings = header['settings']
+            patch.patterns = [f.read(n) for n in header['pattern_lengths']]
+            patch.stacks = [tuple(stack) for stack in header['stacks']]
+            count = header['count']
+            for name, typecode in (('offsets', 'Q'), ('sizes', 'I'), ('pattern_ids', 'I')):
+                column = array(typecode)
+                column.frombytes(f.read(count * column.itemsize))
+                if struct.pack('=I', 1) != struct.pack('<I', 1):
+                    column.byteswap()
+                setattr(patch, name, column)
+            if header['originals'] is not None:
+                patch.originals = f.read(header['originals'])
+        return patch
+
+    def check_source(self, path: str):
+        size = os.path.getsize(path)
+        if size != self.source_size or fingerprint_file(path, size) != self.source_fingerprint:
+            raise PatchMismatchError(f"'{path}' does not match the source this patch was made from")
+
+    def apply(self, path: str):
+        """Write the patch into path in place: one seek-and-write per entry, no RNG, no rescan"""
+        with open(path, 'r+b') as f:
+            fd = f.fileno()
+            tiles = TileCache(self.patterns)
+            for offset, size, pattern_id in zip(self.offsets, self.sizes, self.pattern_ids):
+                os.pwrite(fd, tiles.stacked(self.stacks[pattern_id], size), offset)
+
+    def revert(self, path: str):
+        """Restore the original bytes in place, undoing writes newest-first so overlaps unwind correctly"""
+        if self.originals is None:
+            raise ValueError("This patch was saved without original bytes and cannot be reverted")
+        ends = list(self.sizes)
+        for i in range(1, len(ends)):
+            ends[i] += ends[i - 1]
+        with open(path, 'r+b') as f:
+            fd = f.fileno()
+            for i in range(len(self.offsets) - 1, -1, -1):
+                start = ends[i] - self.sizes[i]
+                os.pwrite(fd, self.originals[start:ends[i]], self.offsets[i])
+
+def apply_patch(patch_path: str, source_path: str, output_path: Optional[str] = None, verify: bool = True) -> GlitchPatch:
+    """Materialize a patch: clone source_path to output_path (or patch it in place) and replay the writes"""
+    from fileio import clone_file, same_file
+    patch = GlitchPatch.load(patch_path)
+    if verify:
+        patch.check_source(source_path)
+    target = source_path
+    if output_path is not None and not same_file(source_path, output_path):
+        clone_file(source_path, output_path)
+        target = output_path
+    patch.apply(target)
+    return patch
+
+def revert_patch(patch_path: str, path: str, verify: bool = True) -> GlitchPatch:
+    """Undo a previously applied patch in place, restoring the original source bytes"""
+    patch = GlitchPatch.load(patch_path)
+    if verify and patch.result_fingerprint is not None:
+        if fingerprint_file(path) != patch.result_fingerprint:
+            raise PatchMismatchError(f"'{path}' is not the file this patch produced")
+    patch.revert(path)
+    if verify:
+        patch.check_source(path)
+    return patch
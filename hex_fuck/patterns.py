@@ -1,7 +1,22 @@
+import os
 import json
-from typing import Dict
+import mmap
+import struct
+import hashlib
+from collections.abc import Mapping
+from typing import Dict, List, Optional
+from fileio import make_temp_file
 
-def load_glitch_patterns(json_file: str = 'glitch_patterns_256.json') -> Dict[str, Dict]:
+DEFAULT_PATTERN_FILE = 'glitch_patterns_256.json'
+BANK_SUFFIX = '.hfbank'
+BANK_MAGIC = b'HFBANK\x00\x01'
+_BANK_HEADER = struct.Struct('<8sQQI')  # magic, source size, source mtime_ns, table length
+FALLBACK_BANK_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hex_fucker', 'patterns')
+
+def _parse_hex_pattern(hex_pattern) -> bytes:
+    return bytes.fromhex(''.join(hex_byte.zfill(2) for hex_byte in hex_pattern))
+
+def load_glitch_patterns(json_file: str = DEFAULT_PATTERN_FILE) -> Dict[str, Dict]:
     """
     Load glitch patterns from JSON file
     Returns dictionary with pattern name as key and pattern info as value
@@ -14,7 +29,7 @@ def load_glitch_patterns(json_file: str = 'glitch_patterns_256.json') -> Dict[st
             name = pattern_data['name']
             description = pattern_data['description']
             hex_pattern = pattern_data['pattern']
-            byte_pattern = bytes([int(hex_byte, 16) for hex_byte in hex_pattern])
+            byte_pattern = _parse_hex_pattern(hex_pattern)
             patterns_dict[name] = {
                 'description': description,
                 'pattern': byte_pattern
@@ -51,7 +66,152 @@ def get_fallback_patterns() -> Dict[str, Dict]:
         }
     }
 
-GLITCH_PATTERNS = load_glitch_patterns()
+def compile_pattern_bank(json_file: str, bank_file: str) -> str:
+    """
+    Compile a JSON pattern file into a binary bank: a fixed header, a JSON
+    name/description/offset table and one packed blob of all pattern bytes.
+    The header records the JSON size and mtime so stale banks are rebuilt.
+    """
+    st = os.stat(json_file)
+    with open(json_file, 'r') as f:
+        patterns_list = json.load(f)
+    table = []
+    blobs = []
+    offset = 0
+    for pattern_data in patterns_list:
+        byte_pattern = _parse_hex_pattern(pattern_data['pattern'])
+        table.append([pattern_data['name'], pattern_data['description'], offset, len(byte_pattern)])
+        blobs.append(byte_pattern)
+        offset += len(byte_pattern)
+    table_bytes = json.dumps(table).encode()
+    directory = os.path.dirname(os.path.abspath(bank_file))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = make_temp_file(directory, '.hfbank-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_BANK_HEADER.pack(BANK_MAGIC, st.st_size, st.st_mtime_ns, len(table_bytes)))
+            f.write(table_bytes)
+            f.writelines(blobs)
+        os.replace(tmp_path, bank_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return bank_file
+
+def _bank_candidates(json_file: str) -> List[str]:
+    abs_json = os.path.abspath(json_file)
+    name = hashlib.blake2b(abs_json.encode(), digest_size=16).hexdigest() + BANK_SUFFIX
+    return [os.path.splitext(abs_json)[0] + BANK_SUFFIX, os.path.join(FALLBACK_BANK_DIR, name)]
+
+def _bank_is_fresh(bank_file: str, json_st: os.stat_result) -> bool:
+    try:
+        with open(bank_file, 'rb') as f:
+            header = f.read(_BANK_HEADER.size)
+    except OSError:
+        return False
+    if len(header) != _BANK_HEADER.size:
+        return False
+    magic, size, mtime_ns, _table_len = _BANK_HEADER.unpack(header)
+    return magic == BANK_MAGIC and size == json_st.st_size and mtime_ns == json_st.st_mtime_ns
+
+def find_or_build_bank(json_file: str) -> Optional[str]:
+    """Return a fresh compiled bank for json_file, building it on first use; None if nothing is writable"""
+    json_st = os.stat(json_file)
+    candidates = _bank_candidates(json_file)
+    for bank_file in candidates:
+        if _bank_is_fresh(bank_file, json_st):
+            return bank_file
+    for bank_file in candidates:
+        try:
+            return compile_pattern_bank(json_file, bank_file)
+        except OSError:
+            continue
+    return None
+
+class PatternBank(Mapping):
+    """
+    Read-only {name: {'description', 'pattern'}} mapping backed by a compiled bank.
+    Nothing is read until the first access; pattern bytes are then sliced out of
+    an mmap of the bank on demand, so startup cost does not grow with the library.
+    """
+    def __init__(self, json_file: Optional[str] = None):
+        self.json_file = json_file
+        self._table = None
+        self._blob = None
+        self._blob_start = 0
+        self._cache = {}
+
+    def _default_json_file(self) -> str:
+        if os.path.exists(DEFAULT_PATTERN_FILE):
+            return DEFAULT_PATTERN_FILE
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_PATTERN_FILE)
+
+    def _load(self):
+        if self._table is not None:
+            return
+        json_file = self.json_file or self._default_json_file()
+        try:
+            bank_file = find_or_build_bank(json_file)
+        except FileNotFoundError:
+            print(f"Pattern file '{json_file}' not found. Using fallback patterns.")
+            self._use_dict(get_fallback_patterns())
+            return
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"Error loading patterns from '{json_file}': {e}")
+            print("Using fallback patterns.")
+            self._use_dict(get_fallback_patterns())
+            return
+        if bank_file is None:
+            # Nowhere to write a bank: fall back to parsing the JSON directly
+            self._use_dict(load_glitch_patterns(json_file))
+            return
+        with open(bank_file, 'rb') as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _magic, _size, _mtime, table_len = _BANK_HEADER.unpack(blob[:_BANK_HEADER.size])
+        table = json.loads(blob[_BANK_HEADER.size:_BANK_HEADER.size + table_len])
+        self._blob = blob
+        self._blob_start = _BANK_HEADER.size + table_len
+        self._table = {name: (description, offset, length) for name, description, offset, length in table}
+
+    def _use_dict(self, patterns_dict: Dict[str, Dict]):
+        self._table = {name: None for name in patterns_dict}
+        self._cache = dict(patterns_dict)
+
+    def __getitem__(self, name: str) -> Dict:
+        self._load()
+        info = self._cache.get(name)
+        if info is None:
+            description, offset, length = self._table[name]
+            start = self._blob_start + offset
+            info = {'description': description, 'pattern': self._blob[start:start + length]}
+            self._cache[name] = info
+        return info
+
+    def __iter__(self):
+        self._load()
+        return iter(self._table)
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._table)
+
+    def __contains__(self, name) -> bool:
+        self._load()
+        return name in self._table
+
+GLITCH_PATTERNS = PatternBank()
+
+def resolve_patterns(spec: str) -> List[bytes]:
+    """Pattern bytes for 'all' or a comma-separated list of names; raises KeyError for unknown names"""
+    if spec == 'all':
+        return [pattern_info['pattern'] for pattern_info in GLITCH_PATTERNS.values()]
+    patterns = []
+    for name in (name.strip() for name in spec.split(',')):
+        if name not in GLITCH_PATTERNS:
+            raise KeyError(name)
+        patterns.append(GLITCH_PATTERNS[name]['pattern'])
+    return patterns
 
 def list_available_patterns():
     """Display all available glitch patterns with descriptions"""
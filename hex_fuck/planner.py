@@ -0,0 +1,118 @@
+import random
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class WritePlan:
+    """
+    Struct-of-arrays list of planned overwrites.
+    stacks[i] is the tuple of pattern indices joined (then tiled) for write i.
+    """
+    def __init__(self):
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.chunk_offsets = array('Q')
+        self.stacks: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, Tuple[int, ...], int]]:
+        return zip(self.offsets, self.sizes, self.stacks, self.chunk_offsets)
+
+    def add(self, offset: int, size: int, stack: Tuple[int, ...], chunk_offset: int):
+        self.offsets.append(offset)
+        self.sizes.append(size)
+        self.stacks.append(stack)
+        self.chunk_offsets.append(chunk_offset)
+
+    def extend(self, other: 'WritePlan'):
+        self.offsets.extend(other.offsets)
+        self.sizes.extend(other.sizes)
+        self.stacks.extend(other.stacks)
+        self.chunk_offsets.extend(other.chunk_offsets)
+
+    @property
+    def bytes_touched(self) -> int:
+        return sum(self.sizes)
+
+class _IntervalSet:
+    """Disjoint half-open intervals kept in sorted parallel lists"""
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def add_if_free(self, start: int, end: int) -> bool:
+        i = bisect_right(self.starts, start)
+        if i > 0 and self.ends[i - 1] > start:
+            return False
+        if i < len(self.starts) and self.starts[i] < end:
+            return False
+        # Sites arrive in (almost) increasing order, so this is nearly always an append
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        return True
+
+def _uniform(rng, low: int, high: int, k: int) -> List[int]:
+    """k draws of randint(low, high) in one call"""
+    if low == high:
+        return [low] * k
+    return rng.choices(range(low, high + 1), k=k)
+
+def plan_intensity_glitches(params: Dict, pattern_count: int, data_start: int, data_end: int,
+                            chunk_offset: int = 0, rng=random, plan: WritePlan = None) -> WritePlan:
+    """
+    Plan the overwrites for one chunk payload [data_start, data_end).
+    Spacings, chaos offsets, sizes and pattern stacks for every site are drawn
+    in batches up front; overlap rejection uses an interval set instead of
+    tracking individual byte offsets. Distributions match the per-site loop
+    driven by intensity.get_intensity_params.
+    """
+    if plan is None:
+        plan = WritePlan()
+    available_space = data_end - data_start
+    if available_space <= 0 or pattern_count <= 0:
+        return plan
+    p = params
+    # Every site (written or rejected) advances pos by at least spacing_min
+    max_sites = available_space // max(1, p['overwrite_spacing_min']) + 1
+    positions = list(accumulate(_uniform(rng, p['overwrite_spacing_min'], p['overwrite_spacing_max'], max_sites), initial=0))
+    site_count = bisect_right(positions, available_space - 1)
+    if site_count == 0:
+        return plan
+    if p['chaos_offset'] > 0:
+        chaos = _uniform(rng, 0, p['chaos_offset'], site_count)
+    else:
+        chaos = [0] * site_count
+    sizes = _uniform(rng, p['overwrite_size_min'], p['overwrite_size_max'], site_count)
+    stack_counts = _uniform(rng, p['pattern_stack_min'], p['pattern_stack_max'], site_count)
+    choices = rng.choices(range(pattern_count), k=sum(stack_counts))
+    used = None if p['overlap'] else _IntervalSet()
+    cursor = 0
+    for pos, chaos_i, size, stack_count in zip(positions, chaos, sizes, stack_counts):
+        stack = tuple(choices[cursor:cursor + stack_count])
+        cursor += stack_count
+        offset = data_start + pos + chaos_i
+        if offset >= data_end:
+            break
+        if offset + size > data_end:
+            size = data_end - offset
+        if used is not None and not used.add_if_free(offset, offset + size):
+            continue
+        plan.add(offset, size, stack, chunk_offset)
+    return plan
+
+def smear_position(data_start: int, data_end: int, smear_offset: int, size: int, guard: int = 0) -> Optional[int]:
+    """
+    Offset of a size-byte smear write smear_offset bytes into the payload
+    [data_start, data_end). Offsets outside the valid window (from the payload
+    start or guard, whichever is later, to the last start that still ends by
+    data_end) wrap around inside it, so a drift that outgrows the chunk keeps
+    cycling through it. None when the chunk is too small for a write.
+    """
+    low = max(data_start, guard)
+    high = data_end - size
+    if high < low:
+        return None
+    return low + (data_start + smear_offset - low) % (high - low + 1)
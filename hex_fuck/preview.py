@@ -0,0 +1,173 @@
+import math
+import mmap
+import random
+import struct
+from typing import List, Optional, Tuple
+from avi_index import AVIIF_KEYFRAME, FrameIndex, VIDEO_CHUNK_TYPES
+
+def parse_range(spec: str) -> Tuple[float, Optional[float]]:
+    """'A:B' (B exclusive), 'A:' (to the end) or 'A' (a single unit)"""
+    start, sep, end = spec.partition(':')
+    start = float(start) if start else 0.0
+    if not sep:
+        return start, start + 1
+    return start, float(end) if end else None
+
+def seconds_to_frames(index: FrameIndex, start: float, end: Optional[float]) -> Tuple[int, Optional[int]]:
+    """Frames [start, end) covering the time span: the frame showing at start up to the one showing before end"""
+    fps = index.fps
+    # Rounded first so float noise (1.2 * 25 = 30.000000000000004) does not cross a frame boundary
+    first = math.floor(round(start * fps, 6))
+    return first, None if end is None else math.ceil(round(end * fps, 6))
+
+def _is_keyframe(index: FrameIndex, data, i: int) -> bool:
+    if index.has_keyframe_flags:
+        return index.is_keyframe(i)
+    from bitstream import HEADER_WINDOW, guess_keyframe
+    offset = index.offsets[i]
+    return guess_keyframe(data[offset:offset + 4], data[offset + 8:offset + 8 + HEADER_WINDOW])
+
+def preroll_start(index: FrameIndex, data, start: int) -> int:
+    """The keyframe at or before start (decoding the window needs everything from there on)"""
+    for i in range(start, -1, -1):
+        if _is_keyframe(index, data, i):
+            return i
+    return 0
+
+def _patch_hdrl(hdrl: bytearray, frames: int):
+    """
+    Fix frame counts in a copied hdrl and blank out OpenDML super indexes,
+    which point into the source file.
+    """
+    def walk(pos: int, end: int):
+        while pos + 8 <= end:
+            fcc = bytes(hdrl[pos:pos + 4])
+            size = struct.unpack_from('<I', hdrl, pos + 4)[0]
+            if fcc == b'LIST':
+                walk(pos + 12, min(pos + 8 + size, end))
+            elif fcc == b'avih' and size >= 20:
+                struct.pack_into('<I', hdrl, pos + 8 + 16, frames)
+            elif fcc == b'strh' and size >= 36 and hdrl[pos + 8:pos + 12] == b'vids':
+                struct.pack_into('<II', hdrl, pos + 8 + 28, 0, frames)
+            elif fcc == b'dmlh' and size >= 4:
+                struct.pack_into('<I', hdrl, pos + 8, frames)
+            elif fcc == b'indx':
+                hdrl[pos:pos + 4] = b'JUNK'
+            pos += 8 + size + (size & 1)
+    walk(12, len(hdrl))
+
+def _read_hdrl(data) -> bytearray:
+    pos = 12
+    while pos + 12 <= len(data):
+        fcc = data[pos:pos + 4]
+        size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+        if fcc == b'LIST' and data[pos + 8:pos + 12] == b'hdrl':
+            return bytearray(data[pos:pos + 8 + size])
+        if fcc == b'LIST' and data[pos + 8:pos + 12] == b'movi':
+            break
+        pos += 8 + size + (size & 1)
+    raise ValueError("No hdrl header list found")
+
+def _span_chunks(data, index: FrameIndex, first: int, last: int) -> List[Tuple[int, bytes, int, Optional[int]]]:
+    """
+    (offset, ckid, size, frame number or None) for every stream chunk between
+    the first and last selected frames, so interleaved audio comes along.
+    Falls back to the indexed video chunks alone when the span cannot be walked.
+    """
+    from stream import iter_riff_chunks
+    frames = {index.offsets[i]: i for i in range(first, last + 1)}
+    span_start = index.offsets[first]
+    span_end = index.offsets[last] + 8 + index.sizes[last]
+    chunks = []
+    data.seek(span_start)
+    for token in iter_riff_chunks(data):
+        offset = span_start + token.offset
+        if offset >= span_end:
+            break
+        if token.kind != 'chunk' or token.truncated or not token.fcc[:2].isdigit():
+            continue
+        chunks.append((offset, token.fcc, token.size, frames.get(offset)))
+    if sum(1 for chunk in chunks if chunk[3] is not None) != len(frames):
+        chunks = [(index.offsets[i], bytes(data[index.offsets[i]:index.offsets[i] + 4]), index.sizes[i], i)
+                  for i in range(first, last + 1)]
+    return chunks
+
+def render_preview(hex_fucker, input_path: str, output_path: str, start: int, end: Optional[int],
+                   index: FrameIndex) -> Tuple[int, int, int]:
+    """
+    Write frames [start, end) of input_path, preceded by the frames back to
+    the previous keyframe, as a standalone AVI with a rebuilt idx1. Frames are
+    selected and glitched exactly as a full render with the same seed would
+    (same selection, per-frame random streams and absolute-offset guards), so
+    their bytes match that render. Returns (first frame, end frame, glitches);
+    raises ValueError when [start, end) is empty or outside the index.
+    """
+    from glitcher import SMEAR_SKIP_FIRST
+    stats = hex_fucker.stats
+    total = len(index)
+    end = total if end is None else end
+    if start < 0 or end > total:
+        raise ValueError(f"Preview frames {start}-{end - 1} are outside the video (frames 0-{total - 1})")
+    if start >= end:
+        raise ValueError(f"Empty preview range: frame {start} to before frame {end}")
+    config = hex_fucker.config
+    hex_fucker.run_seed = config.seed if config.seed is not None else random.getrandbits(63)
+    with open(input_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with stats.stage('select'):
+            selected = hex_fucker.select_frames_to_glitch(total, data)
+        first = preroll_start(index, data, start)
+        with stats.stage('read'):
+            chunks = _span_chunks(data, index, first, end - 1)
+        stats.count('frames_total', end - first)
+        # Per-frame (slot, smear offset) for the selected frames in the preview
+        order = {frame_idx: i for i, frame_idx in enumerate(selected)}
+        smear = {}
+        if hex_fucker.smear_mode:
+            hex_fucker.choose_smear_patterns()
+            smear_offset = 0
+            for i, frame_idx in enumerate(selected):
+                if frame_idx >= end:
+                    break
+                if i < SMEAR_SKIP_FIRST:
+                    continue
+                smear_offset += hex_fucker.smear_drift(frame_idx)
+                if frame_idx >= first:
+                    smear[frame_idx] = (i % len(hex_fucker.smear_patterns), smear_offset)
+        hdrl = _read_hdrl(data)
+        _patch_hdrl(hdrl, end - first)
+        glitches = 0
+        idx1 = bytearray()
+        with open(output_path, 'w+b') as out:
+            out.write(b'RIFF' + bytes(4) + b'AVI ')
+            out.write(hdrl)
+            movi_start = out.tell()
+            out.write(b'LIST' + bytes(4) + b'movi')
+            for offset, ckid, size, frame_idx in chunks:
+                buf = bytearray(data[offset:offset + 8 + size + (size & 1)])
+                flags = AVIIF_KEYFRAME
+                if frame_idx is not None:
+                    flags = AVIIF_KEYFRAME if _is_keyframe(index, data, frame_idx) else 0
+                    if frame_idx in order:
+                        stats.count('frames_selected')
+                        with stats.stage('apply'):
+                            glitches += hex_fucker.glitch_frame_buffer(buf, index, frame_idx, offset, len(data),
+                                                                       smear.get(frame_idx))
+                elif ckid[2:] in VIDEO_CHUNK_TYPES:
+                    flags = 0
+                idx1 += struct.pack('<4sIII', ckid, flags, out.tell() - movi_start - 8, size)
+                with stats.stage('write'):
+                    out.write(buf)
+            movi_end = out.tell()
+            out.write(b'idx1' + struct.pack('<I', len(idx1)))
+            out.write(idx1)
+            file_end = out.tell()
+            out.seek(movi_start + 4)
+            out.write(struct.pack('<I', movi_end - movi_start - 8))
+            out.seek(4)
+            out.write(struct.pack('<I', file_end - 8))
+        stats.count('output_bytes', file_end)
+    finally:
+        data.close()
+    return first, end, glitches
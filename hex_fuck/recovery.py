@@ -0,0 +1,172 @@
+import os
+import mmap
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Tuple
+from avi_index import (AVIIF_KEYFRAME, FrameIndex, VIDEO_CHUNK_TYPES, _MOVI_CHUNK_RE, _Reader, _is_video_ckid,
+                       _next_chunk, _read_layout, _stream_id)
+
+SEGMENT_SIZE = 32 * 1024 * 1024
+SEGMENT_OVERLAP = 7  # A chunk header straddling a segment boundary is still found by the segment it starts in
+
+def _find_candidates(data, start: int, end: int) -> Tuple[array, array, bytes]:
+    """(offsets, declared sizes, fourccs) of every chunk-header-looking match starting in data[start:end]"""
+    offsets, sizes, fccs = array('Q'), array('I'), bytearray()
+    limit = min(end + SEGMENT_OVERLAP, len(data))
+    for match in _MOVI_CHUNK_RE.finditer(data, start, limit):
+        at = match.start()
+        if at >= end:
+            break
+        if at + 8 > len(data):
+            continue
+        offsets.append(at)
+        sizes.append(struct.unpack_from('<I', data, at + 4)[0])
+        fccs += data[at:at + 4]
+    return offsets, sizes, bytes(fccs)
+
+def _scan_segment(path: str, start: int, end: int) -> Tuple[bytes, bytes, bytes]:
+    """Worker: candidates of one segment of the file at path, as raw columns"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets, sizes, fccs = _find_candidates(data, start, end)
+    return offsets.tobytes(), sizes.tobytes(), fccs
+
+def scan_candidates(data, start: int, end: int, path: Optional[str] = None,
+                    workers: Optional[int] = None) -> Tuple[array, array, bytes]:
+    """
+    Candidate chunk headers in data[start:end], in file order. With a path the
+    range is cut into overlapping segments that a process pool scans over its
+    own mappings of the file; otherwise (or for a single segment) it is scanned here.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    bounds = list(range(start, end, SEGMENT_SIZE)) + [end]
+    segments = list(zip(bounds, bounds[1:]))
+    if path is None or workers == 1 or len(segments) <= 1:
+        return _find_candidates(data, start, end)
+    offsets, sizes, fccs = array('Q'), array('I'), bytearray()
+    with ProcessPoolExecutor(max_workers=min(workers, len(segments))) as pool:
+        for raw_offsets, raw_sizes, raw_fccs in pool.map(_scan_segment, [path] * len(segments),
+                                                         *zip(*segments)):
+            offsets.frombytes(raw_offsets)
+            sizes.frombytes(raw_sizes)
+            fccs += raw_fccs
+    return offsets, sizes, bytes(fccs)
+
+def _link(offset: int, size: int, fcc: bytes) -> Tuple[int, int]:
+    """Where the chunk after a candidate starts: padded and unpadded (LIST bodies are descended into)"""
+    if fcc == b'LIST':
+        return offset + 12, offset + 12
+    return _next_chunk(offset, size), offset + 8 + size
+
+def validate_chain(offsets: array, sizes: array, fccs: bytes) -> List[int]:
+    """
+    Positions (into offsets) of the candidates that belong to a chunk chain:
+    the declared size of the chunk leads to another candidate, or the chunk
+    is where another candidate leads (the last chunk before damage, an index
+    or the end of the file). Candidates inside the payload of an accepted
+    chunk are dropped, so chunk ids that occur in frame data do not split frames.
+    """
+    positions: Set[int] = set(offsets)
+    forward = bytearray(len(offsets))
+    linked: Set[int] = set()
+    for i, offset in enumerate(offsets):
+        for following in _link(offset, sizes[i], fccs[4 * i:4 * i + 4]):
+            if following in positions:
+                forward[i] = 1
+                linked.add(following)
+                break
+    accepted = []
+    covered = 0
+    for i, offset in enumerate(offsets):
+        if not (forward[i] or offset in linked) or offset < covered:
+            continue
+        accepted.append(i)
+        covered = _link(offset, sizes[i], fccs[4 * i:4 * i + 4])[1]
+    return accepted
+
+def scan_chunks(source, index: FrameIndex, video_ids=None, workers: Optional[int] = None):
+    """
+    Recovery fallback for AVIs without a usable index: append the video chunks
+    of source (a path or a buffer) that chain-validate to index, in file order.
+    Paths are scanned on workers processes (default: every core).
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        _append_video(index, video_ids, *scan_candidates(source, 0, len(source)))
+        return
+    path = os.fspath(source)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            _append_video(index, video_ids, *scan_candidates(data, 0, len(data), path, workers))
+
+def _append_video(index: FrameIndex, video_ids, offsets: array, sizes: array, fccs: bytes):
+    for i in validate_chain(offsets, sizes, fccs):
+        fcc = fccs[4 * i:4 * i + 4]
+        if _is_video_ckid(fcc) and (video_ids is None or _stream_id(fcc) in video_ids):
+            index.append(offsets[i], sizes[i], 0, _stream_id(fcc))
+
+def _top_level_reaches(data, pos: int, end: int) -> bool:
+    """True if the top-level chunks from pos chain exactly to end"""
+    while pos < end:
+        if pos + 8 > end:
+            return False
+        pos = _next_chunk(pos, struct.unpack_from('<I', data, pos + 4)[0])
+    return pos in (end, end + 1)
+
+def rebuild_idx1(path: str, workers: Optional[int] = None) -> int:
+    """
+    Scan the movi list of a single-segment AVI at path and write a rebuilt
+    idx1 into the file, so later runs index it without scanning. The idx1 is
+    appended at the end; only the RIFF and movi sizes are patched (the movi
+    list is extended over a damaged tail) and an existing idx1 is renamed to
+    JUNK. Returns the number of entries written; raises ValueError for files
+    that cannot be rebuilt this way.
+    """
+    from bitstream import HEADER_WINDOW, guess_keyframe
+    reader = _Reader(path)
+    try:
+        layout = _read_layout(reader)
+    finally:
+        reader.close()
+    if layout is None:
+        raise ValueError("Not a RIFF AVI file (the header is missing or damaged)")
+    if not layout.movi_lists:
+        raise ValueError("No movi list found")
+    if len(layout.movi_lists) > 1:
+        raise ValueError("OpenDML (multi-segment) AVIs keep their index in indx/ix## chunks; not rebuilding idx1")
+    movi_start, movi_end = layout.movi_lists[0]
+    with open(path, 'r+b') as f:
+        size = os.fstat(f.fileno()).st_size
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # The movi list must end where the top-level walk can see the new idx1; a list that
+            # runs past the end or into garbage is extended over the damaged tail and scanned with it
+            extend_movi = movi_end >= size or not _top_level_reaches(data, movi_end, size)
+            scan_end = size if extend_movi else movi_end
+            offsets, sizes, fccs = scan_candidates(data, movi_start + 4, scan_end, path, workers)
+            entries = bytearray()
+            for i in validate_chain(offsets, sizes, fccs):
+                fcc = fccs[4 * i:4 * i + 4]
+                if not fcc[:2].isdigit():
+                    continue
+                payload = offsets[i] + 8
+                keyframe = fcc[2:] not in VIDEO_CHUNK_TYPES or guess_keyframe(fcc, data[payload:payload + HEADER_WINDOW])
+                entries += struct.pack('<4sIII', fcc, AVIIF_KEYFRAME if keyframe else 0,
+                                       offsets[i] - movi_start, sizes[i])
+            if not entries:
+                raise ValueError("No stream chunks found in the movi list")
+            old_idx1 = layout.idx1[0] - 8 if layout.idx1 is not None else None
+            padded_end = size + (size & 1)
+        if old_idx1 is not None:
+            f.seek(old_idx1)
+            f.write(b'JUNK')
+        if extend_movi:
+            f.seek(movi_start - 4)
+            f.write(struct.pack('<I', padded_end - movi_start))
+        f.seek(size)
+        f.write(b'\x00' * (padded_end - size) + b'idx1' + struct.pack('<I', len(entries)) + entries)
+        new_end = f.tell()
+        f.seek(4)
+        f.write(struct.pack('<I', new_end - 8))
+    return len(entries) // 16
@@ -0,0 +1,301 @@
+import os
+import json
+import mmap
+import random
+import struct
+import hashlib
+from array import array
+from typing import Dict, Optional, Tuple
+from avi_index import FrameIndex
+from fileio import make_temp_file
+from frame_cache import _le, fingerprint_file
+from planner import WritePlan
+
+CACHE_SUFFIX = '.hfrc'
+CACHE_MAGIC = b'HFRC\x00'
+CACHE_VERSION = 1
+KEY_SIZE = 16
+CLEAN_KEY = bytes(KEY_SIZE)  # The chunk holds the untouched source bytes
+CHUNK_SAMPLE = 256
+MAX_STORED_WRITES = 4 * 1024 * 1024
+
+def cache_path(output_path: str) -> str:
+    return output_path + CACHE_SUFFIX
+
+def _digest(*parts: bytes) -> bytes:
+    h = hashlib.blake2b(digest_size=KEY_SIZE)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+def chunk_fingerprint(data, chunk_offset: int, data_end: int) -> bytes:
+    """Digest of the chunk header and the head and tail of its payload"""
+    head = data[chunk_offset:min(chunk_offset + 8 + CHUNK_SAMPLE, data_end)]
+    tail = data[max(chunk_offset + 8, data_end - CHUNK_SAMPLE):data_end]
+    return _digest(head, tail)
+
+def params_digest(hex_fucker) -> bytes:
+    """Digest of every setting that shapes a frame's writes, other than its seed and position"""
+    from glitcher import SMEAR_HEADER_GUARD
+    config = hex_fucker.config
+    patterns = [hashlib.blake2b(bytes(pattern), digest_size=8).hexdigest() for pattern in config.patterns]
+    if hex_fucker.smear_mode:
+        params = {'mode': 'smear', 'size': config.smear_size, 'guard': SMEAR_HEADER_GUARD}
+    else:
+        params = {'mode': 'intensity', 'params': hex_fucker.intensity_params}
+    params['codec_aware'] = config.codec_aware
+    return _digest(json.dumps([params, patterns], sort_keys=True).encode())
+
+class RenderCache:
+    """
+    What every frame chunk of a rendered output currently holds: one key per
+    frame (CLEAN_KEY for source bytes, otherwise a digest of the chunk
+    fingerprint, the effective parameters and the frame's seed or smear
+    position), plus a content-addressed store of the chunk-relative write plan
+    behind each key, so settings that come back are replayed without planning.
+    """
+    def __init__(self, count: int, source_fingerprint: str, run_seed: Optional[int] = None):
+        self.keys = bytearray(count * KEY_SIZE)
+        self.source_fingerprint = source_fingerprint
+        self.run_seed = run_seed
+        self.store: Dict[bytes, WritePlan] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys) // KEY_SIZE
+
+    def key(self, frame_idx: int) -> bytes:
+        return bytes(self.keys[frame_idx * KEY_SIZE:(frame_idx + 1) * KEY_SIZE])
+
+    def set_key(self, frame_idx: int, key: bytes):
+        self.keys[frame_idx * KEY_SIZE:(frame_idx + 1) * KEY_SIZE] = key
+
+    def remember(self, key: bytes, plan: WritePlan, chunk_offset: int):
+        relative = WritePlan()
+        for offset, size, stack, _ in plan:
+            relative.add(offset - chunk_offset, size, stack, 0)
+        self.store[key] = relative
+
+    def recall(self, key: bytes, chunk_offset: int) -> Optional[WritePlan]:
+        relative = self.store.get(key)
+        if relative is None:
+            return None
+        plan = WritePlan()
+        for offset, size, stack, _ in relative:
+            plan.add(chunk_offset + offset, size, stack, chunk_offset)
+        return plan
+
+    def _prune(self):
+        """Drop the oldest plans no frame refers to once the store holds too many writes"""
+        total = sum(len(plan) for plan in self.store.values())
+        if total <= MAX_STORED_WRITES:
+            return
+        live = {self.key(i) for i in range(len(self))}
+        for key in list(self.store):
+            if total <= MAX_STORED_WRITES:
+                break
+            if key not in live:
+                total -= len(self.store.pop(key))
+
+    def serialize(self, output_key: dict) -> bytes:
+        self._prune()
+        stored = list(self.store.items())
+        counts = array('I', (len(plan) for _, plan in stored))
+        offsets, sizes, stack_lens, stack_ids = array('I'), array('I'), array('B'), array('H')
+        for _, plan in stored:
+            offsets.fromlist(plan.offsets.tolist())
+            sizes.extend(plan.sizes)
+            for stack in plan.stacks:
+                stack_lens.append(len(stack))
+                stack_ids.extend(stack)
+        header = json.dumps({
+            'version': CACHE_VERSION,
+            'source_fingerprint': self.source_fingerprint,
+            'output': output_key,
+            'run_seed': self.run_seed,
+            'count': len(self),
+            'stored': len(stored),
+            'writes': len(offsets),
+            'stack_ids': len(stack_ids),
+        }).encode()
+        parts = [CACHE_MAGIC, struct.pack('<I', len(header)), header, bytes(self.keys)]
+        parts.extend(key for key, _ in stored)
+        parts.extend(_le(column).tobytes() for column in (counts, offsets, sizes, stack_lens, stack_ids))
+        return b''.join(parts)
+
+    @classmethod
+    def deserialize(cls, raw: bytes, source_fingerprint: str, output_key: dict) -> Optional['RenderCache']:
+        """Decode a cache; None if it is malformed or belongs to another source or output state"""
+        if not raw.startswith(CACHE_MAGIC) or len(raw) < len(CACHE_MAGIC) + 4:
+            return None
+        pos = len(CACHE_MAGIC)
+        header_len = struct.unpack('<I', raw[pos:pos + 4])[0]
+        pos += 4
+        try:
+            header = json.loads(raw[pos:pos + header_len])
+        except ValueError:
+            return None
+        pos += header_len
+        if (header.get('version') != CACHE_VERSION or header.get('source_fingerprint') != source_fingerprint
+                or header.get('output') != output_key):
+            return None
+        cache = cls(header['count'], source_fingerprint, header['run_seed'])
+        nbytes = len(cache.keys) + header['stored'] * KEY_SIZE
+        if pos + nbytes > len(raw):
+            return None
+        cache.keys[:] = raw[pos:pos + len(cache.keys)]
+        pos += len(cache.keys)
+        keys = [raw[pos + i * KEY_SIZE:pos + (i + 1) * KEY_SIZE] for i in range(header['stored'])]
+        pos += header['stored'] * KEY_SIZE
+        arrays = []
+        for typecode, count in (('I', header['stored']), ('I', header['writes']), ('I', header['writes']),
+                                ('B', header['writes']), ('H', header['stack_ids'])):
+            column = array(typecode)
+            end = pos + count * column.itemsize
+            if end > len(raw):
+                return None
+            column.frombytes(raw[pos:end])
+            arrays.append(_le(column))
+            pos = end
+        counts, offsets, sizes, stack_lens, stack_ids = arrays
+        write = stack_pos = 0
+        for key, count in zip(keys, counts):
+            plan = WritePlan()
+            for i in range(write, write + count):
+                stack_len = stack_lens[i]
+                plan.add(offsets[i], sizes[i], tuple(stack_ids[stack_pos:stack_pos + stack_len]), 0)
+                stack_pos += stack_len
+            write += count
+            cache.store[key] = plan
+        return cache
+
+    @classmethod
+    def load(cls, output_path: str, source_fingerprint: str, count: int) -> Optional['RenderCache']:
+        try:
+            with open(cache_path(output_path), 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        cache = cls.deserialize(raw, source_fingerprint, _output_key(output_path))
+        if cache is None or len(cache) != count:
+            return None
+        return cache
+
+    def save(self, output_path: str):
+        path = cache_path(output_path)
+        raw = self.serialize(_output_key(output_path))
+        fd, tmp_path = make_temp_file(os.path.dirname(os.path.abspath(path)), '.hfrc-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+
+def _output_key(output_path: str) -> dict:
+    """The output as the cache last left it; any other change to the file invalidates the cache"""
+    st = os.stat(output_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def update_render(hex_fucker, input_path: str, output_path: str, index: FrameIndex,
+                  start: int = 0, end: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    Bring output_path up to date with the current settings for frames
+    [start, end), rewriting only the chunks whose key changed since the
+    output's render cache was written. Changed chunks get their source bytes
+    back and then the new writes, which match what a full render with the same
+    seed would write. Without a valid cache (or output) every frame is
+    rendered from a fresh clone of the source. Returns (frames checked,
+    frames rewritten, glitches).
+    """
+    from fileio import clone_file, open_patchable
+    from glitcher import SMEAR_SKIP_FIRST, frame_data_end
+    stats = hex_fucker.stats
+    config = hex_fucker.config
+    total = len(index)
+    source_fingerprint = fingerprint_file(input_path)
+    cache = RenderCache.load(output_path, source_fingerprint, total) if os.path.exists(output_path) else None
+    if cache is None:
+        print("No render cache for this output; rendering every frame")
+        with stats.stage('read'):
+            clone_file(input_path, output_path)
+        cache = RenderCache(total, source_fingerprint)
+        start, end = 0, total
+    end = total if end is None else max(0, min(end, total))
+    start = max(0, min(start, end))
+    # Keep the cached seed unless one was given, so unchanged settings keep their keys
+    if config.seed is not None:
+        hex_fucker.run_seed = config.seed
+    elif cache.run_seed is not None:
+        hex_fucker.run_seed = cache.run_seed
+    else:
+        hex_fucker.run_seed = random.getrandbits(63)
+    cache.run_seed = hex_fucker.run_seed
+    params = params_digest(hex_fucker)
+    with open(input_path, 'rb') as f:
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    rewritten = glitches = 0
+    try:
+        with stats.stage('select'):
+            selected = hex_fucker.select_frames_to_glitch(total, source)
+        # Per-frame slot and smear offset, as HexFucker.plan_smear accumulates them
+        smear = {}
+        if hex_fucker.smear_mode:
+            hex_fucker.choose_smear_patterns()
+            smear_offset = 0
+            for i, frame_idx in enumerate(selected):
+                if frame_idx >= end:
+                    break
+                if i < SMEAR_SKIP_FIRST:
+                    continue
+                smear_offset += hex_fucker.smear_drift(frame_idx)
+                if frame_idx >= start:
+                    smear[frame_idx] = (i % len(hex_fucker.smear_patterns), smear_offset)
+            targets = smear
+        else:
+            targets = set(selected)
+        stats.count('frames_total', end - start)
+        with open_patchable(output_path) as data:
+            for frame_idx in range(start, end):
+                chunk_offset = index.offsets[frame_idx]
+                data_end = frame_data_end(index, frame_idx, len(source))
+                key = CLEAN_KEY
+                coded = hex_fucker.coded_range(frame_idx)
+                if frame_idx in targets:
+                    if hex_fucker.smear_mode:
+                        slot, smear_offset = smear[frame_idx]
+                        seed = struct.pack('<QQH', smear_offset, chunk_offset, hex_fucker.smear_pattern_ids[slot])
+                    else:
+                        seed = struct.pack('<QQQ', hex_fucker.run_seed, frame_idx, data_end - chunk_offset)
+                    if coded is not None:
+                        seed += struct.pack('<II', *coded)
+                    key = _digest(params, chunk_fingerprint(source, chunk_offset, data_end), seed)
+                if key == cache.key(frame_idx):
+                    stats.count('frames_reused')
+                    continue
+                with stats.stage('write'):
+                    data_start = chunk_offset + index.header_size
+                    data[data_start:data_end] = source[data_start:data_end]
+                rewritten += 1
+                cache.set_key(frame_idx, key)
+                if key == CLEAN_KEY:
+                    stats.count('frames_restored')
+                    continue
+                stats.count('frames_selected')
+                plan = cache.recall(key, chunk_offset)
+                if plan is None:
+                    with stats.stage('plan'):
+                        plan = WritePlan()
+                        if hex_fucker.smear_mode:
+                            hex_fucker.plan_smear_frame(slot, chunk_offset, data_end, smear_offset, plan,
+                                                        coded=coded)
+                        else:
+                            hex_fucker.plan_frame(frame_idx, chunk_offset, data_end, plan, coded)
+                    cache.remember(key, plan, chunk_offset)
+                else:
+                    stats.count('plans_reused')
+                with stats.stage('apply'):
+                    glitches += hex_fucker.apply_plan(data, plan)
+            with stats.stage('write'):
+                data.flush()
+    finally:
+        source.close()
+    cache.save(output_path)
+    stats.count('frames_rewritten', rewritten)
+    return end - start, rewritten, glitches
@@ -0,0 +1,18 @@
+import random
+import hashlib
+
+def derive_seed(seed: int, *keys) -> int:
+    """
+    Counter-style seed derivation: hash (seed, *keys) into an independent 64-bit seed.
+    Streams derived for different keys never depend on how many numbers another stream drew.
+    """
+    h = hashlib.blake2b(repr((seed,) + keys).encode(), digest_size=8)
+    return int.from_bytes(h.digest(), 'little')
+
+def stream(seed: int, *keys) -> random.Random:
+    """Independent random.Random for (seed, *keys)"""
+    return random.Random(derive_seed(seed, *keys))
+
+def frame_rng(seed: int, frame_idx: int) -> random.Random:
+    """RNG for one frame: identical whichever worker (or order) processes the frame"""
+    return stream(seed, 'frame', frame_idx)
@@ -0,0 +1,227 @@
+import sys
+from array import array
+from itertools import compress
+from typing import Dict, List, Optional, Tuple
+from avi_index import AVIIF_KEYFRAME, FrameIndex
+
+SELECT_HELP = ('Comma-separated frame predicates, all of which must hold: keyframes, delta '
+               '(alias pframes, skip-keyframes), stream=N, seconds=A:B, frames=A:B, largest=P%% or N, '
+               'smallest=P%% or N, min-size=BYTES, max-size=BYTES, type=I|P|B|S|N (VOP coding types, '
+               'e.g. type=PB)')
+
+_KEYFRAME_TABLE = bytes(1 if b & AVIIF_KEYFRAME else 0 for b in range(256))
+_NOT_TABLE = bytes([1, 0]) + bytes(254)
+_ALIASES = {'key': 'keyframes', 'pframes': 'delta', 'skip-keyframes': 'delta', 'p-frames': 'delta'}
+_RANK_PREDICATES = ('largest', 'smallest')
+_FRAME_TYPES = 'IPBSN'
+
+def _low_bytes(column: array) -> bytes:
+    """Lowest byte of every element of an integer array, as one bytes object (no per-element Python)"""
+    raw = column.tobytes()
+    size = column.itemsize
+    return raw[0::size] if sys.byteorder == 'little' else raw[size - 1::size]
+
+def _and(a: bytes, b: bytes) -> bytes:
+    """Elementwise AND of two 0/1 masks of equal length"""
+    return (int.from_bytes(a, 'little') & int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+def _range_mask(n: int, start: int, end: int) -> bytes:
+    start, end = max(0, min(start, n)), max(0, min(end, n))
+    end = max(start, end)
+    return bytes(start) + b'\x01' * (end - start) + bytes(n - end)
+
+def _parse_span(value: str) -> Tuple[float, Optional[float]]:
+    start, _, end = value.partition(':')
+    return float(start) if start else 0.0, float(end) if end else None
+
+def _parse_count(value: str, n: int) -> int:
+    if value.endswith('%'):
+        return int(round(n * float(value[:-1]) / 100))
+    return int(value)
+
+def _check_value(name: str, value: str):
+    """Raise ValueError unless value parses the way mask() and accepts() will read it"""
+    if name in ('seconds', 'frames'):
+        start, end = _parse_span(value)
+        if name == 'frames' and (start != int(start) or (end is not None and end != int(end))):
+            raise ValueError
+        if start < 0 or (end is not None and end < start):
+            raise ValueError
+    elif name in _RANK_PREDICATES:
+        if _parse_count(value, 100) < 0 or (value.endswith('%') and float(value[:-1]) > 100):
+            raise ValueError
+    elif name == 'stream':
+        if not 0 <= int(value) <= 99:  # AVI stream ids are two decimal digits
+            raise ValueError
+    elif name in ('min-size', 'max-size'):
+        if int(value) < 0:
+            raise ValueError
+
+class FrameSelection:
+    """
+    Predicates over per-frame index metadata (keyframe flag, stream id,
+    chunk size, timestamp), parsed from a spec such as "delta,seconds=12:30"
+    or "largest=5%". mask() evaluates them over a whole FrameIndex with bulk
+    bytes/int operations, so even millions of frames take milliseconds.
+    """
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.predicates: List[Tuple[str, Optional[str]]] = []
+        for term in spec.split(','):
+            term = term.strip()
+            if not term:
+                continue
+            name, _, value = term.partition('=')
+            name = _ALIASES.get(name.strip().lower(), name.strip().lower())
+            if name not in ('keyframes', 'delta', 'stream', 'seconds', 'frames', 'largest', 'smallest',
+                            'min-size', 'max-size', 'type'):
+                raise ValueError(f"Unknown frame predicate '{term}'")
+            if name not in ('keyframes', 'delta') and not value:
+                raise ValueError(f"Frame predicate '{name}' needs a value ({name}=...)")
+            value = value.strip()
+            if name == 'type':
+                value = value.upper()
+                if any(letter not in _FRAME_TYPES for letter in value):
+                    raise ValueError(f"Unknown frame type in '{term}' (expected letters from {_FRAME_TYPES})")
+            elif value:
+                try:
+                    _check_value(name, value)
+                except (ValueError, OverflowError):
+                    raise ValueError(f"Invalid value in frame predicate '{term}'") from None
+            self.predicates.append((name, value or None))
+        self._stream_frames: Dict[int, int] = {}  # Frames seen per stream by accepts()
+
+    def __bool__(self) -> bool:
+        return bool(self.predicates)
+
+    @property
+    def needs_keyframes(self) -> bool:
+        return any(name in ('keyframes', 'delta') for name, _ in self.predicates)
+
+    @property
+    def needs_frame_types(self) -> bool:
+        return any(name == 'type' for name, _ in self.predicates)
+
+    @property
+    def needs_ranking(self) -> bool:
+        """Rank predicates compare against every frame and cannot be decided one frame at a time"""
+        return any(name in _RANK_PREDICATES for name, _ in self.predicates)
+
+    def _keyframe_mask(self, index: FrameIndex, data) -> bytes:
+        if index.has_keyframe_flags:
+            return _low_bytes(index.flags).translate(_KEYFRAME_TABLE)
+        if data is None:
+            raise ValueError("Keyframe predicates need an idx1/OpenDML index or the file data to probe")
+        from bitstream import HEADER_WINDOW, guess_keyframe
+        return bytes(guess_keyframe(data[offset:offset + 4], data[offset + 8:offset + 8 + HEADER_WINDOW])
+                     for offset in index.offsets)
+
+    def _type_mask(self, index: FrameIndex, data, types: str) -> bytes:
+        if not index.has_bitstream_info:
+            if data is None:
+                raise ValueError("Frame type predicates need the file data to scan")
+            from bitstream import analyze_index
+            analyze_index(index, data)
+        table = bytearray(256)
+        for letter in types:
+            table[ord(letter)] = 1
+        return index.frame_types.tobytes().translate(bytes(table))
+
+    def _time_mask(self, index: FrameIndex, start: float, end: Optional[float]) -> bytes:
+        fps = index.fps
+        first = int(start * fps)
+        last = len(index) if end is None else int(round(end * fps))
+        ids = set(index.stream_ids)
+        if len(ids) <= 1:
+            return _range_mask(len(index), first, last)
+        # Several video streams: timestamps count frames within each stream
+        seen = dict.fromkeys(ids, 0)
+        mask = bytearray(len(index))
+        for i, stream_id in enumerate(index.stream_ids):
+            mask[i] = first <= seen[stream_id] < last
+            seen[stream_id] += 1
+        return bytes(mask)
+
+    def _rank_mask(self, index: FrameIndex, count: int, largest: bool) -> bytes:
+        n = len(index)
+        count = max(0, min(count, n))
+        if count == 0:
+            return bytes(n)
+        if count == n:
+            return b'\x01' * n
+        # Exactly count frames: those beyond the cutoff size, then ties at the cutoff in frame order
+        ordered = sorted(index.sizes)
+        threshold = ordered[n - count] if largest else ordered[count - 1]
+        mask = bytearray(map(threshold.__lt__ if largest else threshold.__gt__, index.sizes))
+        ties = bytes(map(threshold.__eq__, index.sizes))
+        pos = -1
+        for _ in range(count - mask.count(1)):
+            pos = ties.find(1, pos + 1)
+            mask[pos] = 1
+        return bytes(mask)
+
+    def mask(self, index: FrameIndex, data=None) -> bytes:
+        """One byte per frame: 1 where every predicate holds"""
+        n = len(index)
+        result = b'\x01' * n
+        for name, value in self.predicates:
+            if name in ('keyframes', 'delta'):
+                part = self._keyframe_mask(index, data)
+                if name == 'delta':
+                    part = part.translate(_NOT_TABLE)
+            elif name == 'stream':
+                table = bytearray(256)
+                table[int(value)] = 1
+                part = _low_bytes(index.stream_ids).translate(bytes(table))
+            elif name == 'seconds':
+                part = self._time_mask(index, *_parse_span(value))
+            elif name == 'frames':
+                start, end = _parse_span(value)
+                part = _range_mask(n, int(start), n if end is None else int(end))
+            elif name in _RANK_PREDICATES:
+                part = self._rank_mask(index, _parse_count(value, n), name == 'largest')
+            elif name == 'type':
+                part = self._type_mask(index, data, value)
+            elif name == 'min-size':
+                part = bytes(map(int(value).__le__, index.sizes))
+            else:
+                part = bytes(map(int(value).__ge__, index.sizes))
+            result = _and(result, part)
+        return result
+
+    def candidates(self, index: FrameIndex, data=None) -> List[int]:
+        """Frame numbers that pass every predicate, in order"""
+        return list(compress(range(len(index)), self.mask(index, data)))
+
+    def accepts(self, frame_idx: int, size: int, keyframe: bool, stream_id: int, fps: float,
+                frame_type: Optional[int] = None) -> bool:
+        """
+        Decide one frame as it streams past (rank predicates are not available here).
+        Call it for every frame in order: seconds= counts frames per stream, as mask() does.
+        """
+        stream_frame = self._stream_frames.get(stream_id, 0)
+        self._stream_frames[stream_id] = stream_frame + 1
+        for name, value in self.predicates:
+            if name == 'keyframes' and not keyframe:
+                return False
+            if name == 'delta' and keyframe:
+                return False
+            if name == 'stream' and stream_id != int(value):
+                return False
+            if name == 'seconds':
+                start, end = _parse_span(value)
+                if stream_frame < int(start * fps) or (end is not None and stream_frame >= int(round(end * fps))):
+                    return False
+            if name == 'frames':
+                start, end = _parse_span(value)
+                if frame_idx < int(start) or (end is not None and frame_idx >= int(end)):
+                    return False
+            if name == 'min-size' and size < int(value):
+                return False
+            if name == 'max-size' and size > int(value):
+                return False
+            if name == 'type' and (frame_type is None or chr(frame_type) not in value):
+                return False
+            if name in _RANK_PREDICATES:
+                raise ValueError(f"'{name}' needs the whole frame index and cannot be used on a stream")
+        return True
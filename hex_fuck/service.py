@@ -0,0 +1,292 @@
+import os
+import json
+import stat
+import time
+import signal
+import socket
+import threading
+import socketserver
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+INDEX_CACHE_SIZE = 32
+MAX_FINISHED_JOBS = 1000
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# Per-worker state, set once by _init_worker
+_progress = None
+_indexes: 'OrderedDict[tuple, object]' = OrderedDict()
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+    # Load the pattern bank once per worker rather than once per job
+    from patterns import GLITCH_PATTERNS
+    len(GLITCH_PATTERNS)
+
+def _cached_index(path: str):
+    """
+    (FrameIndex of path, whether it was warm) from this worker's LRU, keyed by
+    path, size and mtime. Misses go through the sidecar index cache.
+    """
+    from frame_cache import load_frame_index
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    index = _indexes.get(key)
+    if index is not None:
+        _indexes.move_to_end(key)
+        return index, True
+    index = load_frame_index(path)
+    _indexes[key] = index
+    if len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index, False
+
+def _run_job(job_id: int, input_path: str, output_path: str, settings: Dict) -> Dict:
+    from batch import run_glitch_job
+    progress = _progress
+    progress.put((job_id, 'running', None, 0))
+    counts: Dict[str, int] = {}
+
+    def hook(event: str, name: str, value):
+        # Counters can tick per frame; send them with the next stage event instead
+        if event == 'count':
+            counts[name] = counts.get(name, 0) + value
+            return
+        progress.put((job_id, event, name, dict(counts)))
+        counts.clear()
+
+    try:
+        index, warm = _cached_index(input_path)
+    except OSError as e:
+        return {'ok': False, 'glitches': 0, 'error': str(e)}
+    result = run_glitch_job(input_path, output_path, settings, frame_index=index, hooks=[hook])
+    result['index_warm'] = warm
+    return result
+
+class RenderService:
+    """
+    Job table in front of a process pool. Each worker keeps the pattern bank
+    and an LRU of recently used frame indexes loaded, so repeated jobs on the
+    same sources only pay for the glitch writes. Workers report stage changes
+    and counters through a queue that a thread folds into the job table.
+    """
+    def __init__(self, defaults: Dict, workers: Optional[int] = None):
+        self.defaults = defaults
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.jobs: 'OrderedDict[int, Dict]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.started = time.time()
+        self.progress = multiprocessing.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.progress,))
+        self._reader = threading.Thread(target=self._read_progress, daemon=True)
+        self._reader.start()
+
+    def submit(self, request: Dict) -> Dict:
+        """Queue a render job from a request dict (input, output and job settings); raises ValueError"""
+        from batch import _build_config, _coerce
+        if not isinstance(request, dict) or not request.get('input') or not request.get('output'):
+            raise ValueError("A job needs 'input' and 'output' paths")
+        nested = request.get('settings', {})
+        if not isinstance(nested, dict):
+            raise ValueError("'settings' must be an object")
+        # Settings may sit at the top level of the job body or in 'settings' (which wins)
+        fields = {key: value for key, value in request.items() if key not in ('input', 'output', 'settings')}
+        fields.update(nested)
+        settings = dict(self.defaults)
+        settings.update(_coerce(fields))
+        if settings.get('auto_encode'):
+            raise ValueError("auto_encode is not supported by the service; submit the encoded file instead")
+        _build_config(settings)  # Reject bad settings now rather than in a worker
+        with self.lock:
+            job_id = self.next_id
+            self.next_id += 1
+            job = {
+                'id': job_id,
+                'input': request['input'],
+                'output': request['output'],
+                'status': 'queued',
+                'stage': None,
+                'counters': {},
+                'submitted': time.time(),
+                'started': None,
+                'finished': None,
+                'result': None,
+            }
+            self.jobs[job_id] = job
+            self._trim()
+        future = self.pool.submit(_run_job, job_id, request['input'], request['output'], settings)
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return dict(job)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished'] is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _finish(self, job_id: int, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'ok': False, 'glitches': 0, 'error': f"Worker failed: {e}"}
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job['status'] = 'done' if result.get('ok') else 'failed'
+            job['finished'] = time.time()
+            job['stage'] = None
+            job['result'] = result
+        print(f"[job {job_id}] {job['status']}: {result.get('glitches', 0):,} glitches"
+              f" in {result.get('seconds', 0.0):.2f}s" + (f" ({result['error']})" if result.get('error') else ''))
+
+    def _read_progress(self):
+        while True:
+            try:
+                job_id, event, name, counts = self.progress.get()
+            except (EOFError, OSError):
+                return
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                # The last events of a job can arrive after its result; they only add counters
+                if job['finished'] is None:
+                    if event == 'running':
+                        job['status'] = 'running'
+                        job['started'] = time.time()
+                    elif event == 'start':
+                        job['stage'] = name
+                for key, value in (counts or {}).items():
+                    job['counters'][key] = job['counters'].get(key, 0) + value
+
+    def job(self, job_id: int) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def status(self) -> Dict:
+        with self.lock:
+            counts = {state: 0 for state in ('queued', 'running', 'done', 'failed')}
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return {'workers': self.workers, 'uptime_seconds': time.time() - self.started, 'jobs': counts}
+
+    def list_jobs(self) -> Dict:
+        with self.lock:
+            return {'jobs': json.loads(json.dumps(list(self.jobs.values())))}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.progress.close()
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    POST /jobs       submit {"input", "output", "settings": {...}} -> the queued job
+    GET  /jobs       every job in the table
+    GET  /jobs/<id>  status, current stage, counters and result of one job
+    GET  /status     worker count, uptime and jobs per state
+    """
+    service: RenderService = None
+
+    def _send(self, code: int, body: Dict):
+        raw = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/status':
+            self._send(200, self.service.status())
+        elif path == '/jobs':
+            self._send(200, self.service.list_jobs())
+        elif path.startswith('/jobs/') and path[6:].isdigit():
+            job = self.service.job(int(path[6:]))
+            if job is None:
+                self._send(404, {'error': f"No job {path[6:]}"})
+            else:
+                self._send(200, job)
+        else:
+            self._send(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send(404, {'error': f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send(413, {'error': 'Request too large'})
+            return
+        try:
+            job = self.service.submit(json.loads(self.rfile.read(length) or b'{}'))
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+            return
+        self._send(202, job)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no host/port
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format: str, *args):
+        pass
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def parse_address(address: str):
+    """'HOST:PORT' or ':PORT' for TCP; 'unix:PATH' or anything with a '/' for a Unix socket"""
+    if address.startswith('unix:'):
+        return address[5:]
+    if '/' in address:
+        return address
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(address: str, defaults: Dict, workers: Optional[int] = None) -> int:
+    """Run the render service until interrupted"""
+    target = parse_address(address)
+    service = RenderService(defaults, workers)
+    handler = type('Handler', (_Handler,), {'service': service})
+    if isinstance(target, str):
+        if os.path.exists(target):
+            # Only replace a stale socket, never a regular file
+            if not stat.S_ISSOCK(os.stat(target).st_mode):
+                print(f"{target} exists and is not a socket")
+                return 1
+            with socket.socket(socket.AF_UNIX) as probe:
+                if not probe.connect_ex(target):
+                    print(f"Another service is listening on {target}")
+                    return 1
+            os.unlink(target)
+        server = _UnixHTTPServer(target, handler)
+        where = f"unix:{target}"
+    else:
+        server = ThreadingHTTPServer(target, handler)
+        where = f"http://{target[0]}:{server.server_address[1]}"
+    print(f"Hex Fucker render service on {where} ({service.workers} workers)")
+    print("POST /jobs, GET /jobs, GET /jobs/<id>, GET /status; Ctrl+C to stop")
+    # Service managers stop daemons with SIGTERM; shut down as for Ctrl+C
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping render service...")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if isinstance(target, str) and os.path.exists(target):
+            os.unlink(target)
+    return 0
@@ -0,0 +1,98 @@
+import io
+import os
+import time
+import random
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from glitcher import GlitchConfig, HexFucker
+from avi_index import FrameIndex
+from frame_cache import load_frame_index, serialize_index, deserialize_index
+
+@dataclass
+class Variant:
+    """One output to render from a session's source"""
+    config: GlitchConfig
+    output_path: str
+    smear_mode: bool = False
+    seed: Optional[int] = None
+
+@dataclass
+class RenderResult:
+    output_path: str
+    success: bool
+    glitches: int = 0
+    seconds: float = 0.0
+    messages: str = ''
+    error: Optional[str] = None
+    stats: Optional[Dict] = None  # RunStats.as_dict() of the render
+
+# Per-worker state, set once by _init_worker
+_worker_source = None
+_worker_index = None
+
+def _init_worker(source_path: str, index_bytes: bytes):
+    global _worker_source, _worker_index
+    _worker_source = source_path
+    _worker_index = deserialize_index(index_bytes)
+
+def _render_variant(source_path: str, index: FrameIndex, variant: Variant) -> RenderResult:
+    start = time.perf_counter()
+    if variant.seed is not None:
+        random.seed(variant.seed)
+    else:
+        # Forked workers inherit the parent's RNG state; reseed so variants differ
+        random.seed()
+    messages = io.StringIO()
+    hex_fucker = HexFucker(variant.config, smear_mode=variant.smear_mode)
+    try:
+        with redirect_stdout(messages):
+            success = hex_fucker.fuck_video(source_path, variant.output_path, frame_index=index)
+        error = None if success else messages.getvalue().strip().splitlines()[-1:]
+        error = error[0] if error else None
+    except Exception as e:
+        success, error = False, str(e)
+    return RenderResult(
+        output_path=variant.output_path,
+        success=success,
+        glitches=len(hex_fucker.glitch_log),
+        seconds=time.perf_counter() - start,
+        messages=messages.getvalue(),
+        error=error,
+        stats=hex_fucker.stats.as_dict(),
+    )
+
+def _render_in_worker(variant: Variant) -> RenderResult:
+    return _render_variant(_worker_source, _worker_index, variant)
+
+class GlitchSession:
+    """
+    Read and index a source once, then render any number of variants from it.
+    Each variant is a kernel-side clone of the source patched through an mmap,
+    so the source itself is only ever read through the shared page cache.
+    """
+    def __init__(self, source_path: str, frame_index: Optional[FrameIndex] = None, use_index_cache: bool = True):
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(source_path)
+        self.source_path = source_path
+        self.frame_index = frame_index if frame_index is not None else load_frame_index(source_path, use_cache=use_index_cache)
+
+    def render(self, variant: Variant) -> RenderResult:
+        return _render_variant(self.source_path, self.frame_index, variant)
+
+    def render_many(self, variants: List[Variant], workers: Optional[int] = None) -> List[RenderResult]:
+        """
+        Render variants on a process pool (one worker per core by default).
+        Each worker receives the frame index once at start-up; results come back
+        in the order of variants.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(variants)))
+        if workers == 1:
+            return [self.render(variant) for variant in variants]
+        index_bytes = serialize_index(self.frame_index, {})
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.source_path, index_bytes)) as pool:
+            return list(pool.map(_render_in_worker, variants))
@@ -0,0 +1,110 @@
+import sys
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ('read', 'index', 'select', 'plan', 'apply', 'write')
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, or None where it cannot be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class RunStats:
+    """
+    Stage timers and counters for one render.
+    Stages are coarse (a handful of calls per run), so timing them is free;
+    counters are plain dict increments. Hooks are called as
+    hook(event, name, value) with event 'start' (value 0), 'end' (value =
+    seconds spent in that stage call) or 'count' (value = increment), e.g.
+    to forward metrics to a job dashboard while a render is running.
+    """
+    def __init__(self, hooks: Optional[List[Callable]] = None):
+        self.timings: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.counters: Dict[str, int] = {}
+        self.hooks: List[Callable] = list(hooks or [])
+        self.logs: Dict[str, List[str]] = {}  # Captured tool output, e.g. FFmpeg decode errors while baking
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add_hook(self, hook: Callable):
+        self.hooks.append(hook)
+
+    def _notify(self, event: str, name: str, value: float):
+        for hook in self.hooks:
+            hook(event, name, value)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block and add it to stage name"""
+        if self.hooks:
+            self._notify('start', name, 0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        if self.hooks:
+            self._notify('end', name, seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        if self.hooks:
+            self._notify('count', name, n)
+
+    def add_log(self, name: str, lines: List[str]):
+        self.logs.setdefault(name, []).extend(lines)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def total_seconds(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def as_dict(self) -> Dict:
+        return {
+            'total_seconds': self.total_seconds,
+            'stages': dict(self.timings),
+            'counters': dict(sorted(self.counters.items())),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'logs': dict(self.logs),
+        }
+
+    def save_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def print_report(self):
+        total = self.total_seconds
+        print(f"\nRun Stats ({total:.3f}s total):")
+        print("-" * 60)
+        for name, seconds in self.timings.items():
+            share = seconds / total if total else 0.0
+            print(f"{name:<10} {seconds:>9.3f}s {share:>6.1%}")
+        if self.counters:
+            print("-" * 60)
+            for name, value in sorted(self.counters.items()):
+                print(f"{name:<36} {value:>16,}")
+        peak = peak_rss_bytes()
+        if peak is not None:
+            print("-" * 60)
+            print(f"{'peak_rss':<36} {peak / (1024 * 1024):>14,.1f}MB")
+        for name, lines in self.logs.items():
+            print("-" * 60)
+            print(f"{name} ({len(lines):,} lines{', last 10' if len(lines) > 10 else ''}):")
+            for line in lines[-10:]:
+                print(f"  {line}")
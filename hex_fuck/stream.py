@@ -0,0 +1,412 @@
+import mmap
+import time
+import random
+import struct
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+from avi_index import AVIIF_KEYFRAME, FrameIndex, VIDEO_CHUNK_TYPES
+from bitstream import Mpeg4State, guess_keyframe, locate_payload
+from planner import WritePlan
+from rng import stream
+
+# Chunks larger than this are copied through in pieces instead of being buffered
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+COPY_BLOCK_SIZE = 1024 * 1024
+# Size ffmpeg leaves in RIFF/LIST headers it cannot seek back to fill in
+UNKNOWN_SIZE = 0xFFFFFFFF
+
+class RiffChunk:
+    """
+    One token of a sequential RIFF stream.
+    kind is 'list' (RIFF/LIST header plus its form type, children follow),
+    'chunk' (a leaf chunk with its payload and pad byte) or 'data' (a piece
+    of an oversized chunk's payload that is copied through unbuffered).
+    """
+    __slots__ = ('kind', 'fcc', 'size', 'offset', 'header', 'payload', 'list_type', 'truncated')
+
+    def __init__(self, kind: str, fcc: bytes, size: int, offset: int, header: bytes, payload=b'',
+                 list_type: Optional[bytes] = None, truncated: bool = False):
+        self.kind = kind
+        self.fcc = fcc
+        self.size = size
+        self.offset = offset
+        self.header = header
+        self.payload = payload
+        self.list_type = list_type
+        self.truncated = truncated
+
+    def __len__(self) -> int:
+        return len(self.header) + len(self.payload)
+
+def _read_exact(source, n: int) -> bytes:
+    """Read n bytes from a pipe, looping over short reads; fewer only at EOF"""
+    data = source.read(n)
+    if data is None:
+        data = b''
+    if len(data) >= n or not data:
+        return data
+    parts = [data]
+    got = len(data)
+    while got < n:
+        more = source.read(n - got)
+        if not more:
+            break
+        parts.append(more)
+        got += len(more)
+    return b''.join(parts)
+
+def iter_riff_chunks(source, max_chunk_size: int = MAX_CHUNK_SIZE) -> Iterator[RiffChunk]:
+    """
+    Tokenize a RIFF byte stream front to back without seeking.
+    Container sizes are never trusted (a piped ffmpeg leaves them unset), so
+    lists are reported as headers and their children as the following tokens.
+    A stream that ends mid-chunk yields the partial chunk with truncated=True.
+    """
+    pos = 0
+    while True:
+        header = _read_exact(source, 8)
+        if len(header) < 8:
+            if header:
+                yield RiffChunk('chunk', header[:4], 0, pos, header, truncated=True)
+            return
+        fcc = header[:4]
+        size = struct.unpack('<I', header[4:])[0]
+        if fcc in (b'RIFF', b'LIST'):
+            list_type = _read_exact(source, 4)
+            yield RiffChunk('list', fcc, size, pos, header + list_type, list_type=list_type,
+                            truncated=len(list_type) < 4)
+            pos += 8 + len(list_type)
+            continue
+        padded = size + (size & 1)
+        if padded > max_chunk_size:
+            yield RiffChunk('chunk', fcc, size, pos, header, truncated=True)
+            pos += 8
+            remaining = padded
+            while remaining > 0:
+                piece = _read_exact(source, min(COPY_BLOCK_SIZE, remaining))
+                if not piece:
+                    return
+                yield RiffChunk('data', fcc, size, pos, b'', piece)
+                pos += len(piece)
+                remaining -= len(piece)
+            continue
+        payload = _read_exact(source, padded)
+        yield RiffChunk('chunk', fcc, size, pos, header, payload, truncated=len(payload) < size)
+        pos += 8 + len(payload)
+
+class StreamSelector:
+    """
+    Frame selection that decides frame by frame, without knowing the frame count.
+    every_nth and time_offset pick the same frames as HexFucker.select_frames_to_glitch;
+    random picks each frame independently with probability target_value percent.
+    """
+    def __init__(self, config, run_seed: int):
+        self.config = config
+        self.run_seed = run_seed
+        self.selected = 0
+        self.candidates = 0
+        self.selection = None
+        if config.select:
+            from selection import FrameSelection
+            self.selection = FrameSelection(config.select)
+            if self.selection.needs_ranking:
+                raise ValueError("largest/smallest frame predicates need the whole file, not a stream")
+
+    def take(self, frame_idx: int, chunk: Optional[RiffChunk] = None, fps: float = 25.0,
+             frame_type: Optional[int] = None) -> bool:
+        config = self.config
+        if config.max_glitches > 0 and self.selected >= config.max_glitches:
+            return False
+        if self.selection:
+            keyframe = self.selection.needs_keyframes and guess_keyframe(chunk.fcc, chunk.payload)
+            if not self.selection.accepts(frame_idx, chunk.size, keyframe, int(chunk.fcc[:2]), fps, frame_type):
+                return False
+        candidate = self.candidates
+        self.candidates += 1
+        if config.target_strategy == 'every_nth':
+            # With predicates this counts candidate frames, as in select_frames_to_glitch
+            hit = candidate % max(1, config.target_value) == 0
+        elif config.target_strategy == 'random':
+            percentage = max(0, min(100, config.target_value))
+            hit = stream(self.run_seed, 'select', frame_idx).random() * 100 < percentage
+        elif config.target_strategy == 'time_offset':
+            hit = frame_idx >= max(0, config.target_value)
+        else:
+            hit = False
+        if hit:
+            self.selected += 1
+        return hit
+
+@dataclass
+class StreamResult:
+    frames: int = 0
+    selected: int = 0
+    glitches: int = 0
+    bytes_written: int = 0
+    index: FrameIndex = field(default_factory=lambda: FrameIndex('walk'))
+
+def glitch_chunks(chunks: Iterator[RiffChunk], hex_fucker, result: StreamResult) -> Iterator[RiffChunk]:
+    """
+    Glitch video chunks of a token stream as they pass, with the same per-frame
+    random streams as a file render, so every_nth/time_offset output matches
+    HexFucker.fuck_video byte for byte.
+    """
+    from glitcher import SMEAR_SKIP_FIRST
+    config = hex_fucker.config
+    stats = hex_fucker.stats
+    hex_fucker.run_seed = config.seed if config.seed is not None else random.getrandbits(63)
+    selector = StreamSelector(config, hex_fucker.run_seed)
+    if hex_fucker.smear_mode:
+        hex_fucker.choose_smear_patterns()
+        print(f"[Smear Mode] Using {len(hex_fucker.smear_patterns)} stable patterns for this run.")
+    smear_offset = 0
+    # Codec-aware runs (and type= predicates) locate every frame's coded bytes, with one VOL state per stream
+    locate = config.codec_aware or (selector.selection is not None and selector.selection.needs_frame_types)
+    states = {}
+    video_ids: List[int] = []
+    stream_count = 0
+    fps = 25.0
+    in_movi = False
+    for chunk in chunks:
+        if chunk.kind == 'list':
+            if chunk.list_type == b'movi':
+                in_movi = True
+            yield chunk
+            continue
+        if chunk.kind != 'chunk':
+            yield chunk
+            continue
+        fcc = chunk.fcc
+        if fcc == b'strh':
+            if chunk.payload[:4] == b'vids':
+                if not video_ids and len(chunk.payload) >= 28:
+                    scale, rate = struct.unpack('<II', chunk.payload[20:28])
+                    if scale and rate:
+                        fps = rate / scale
+                video_ids.append(stream_count)
+            stream_count += 1
+        elif fcc == b'idx1':
+            in_movi = False
+        is_video = (in_movi and fcc[:2].isdigit() and fcc[2:] in VIDEO_CHUNK_TYPES
+                    and (not video_ids or int(fcc[:2]) in video_ids))
+        if is_video:
+            frame_idx = result.frames
+            result.frames += 1
+            coded = frame_type = None
+            if locate and not chunk.truncated:
+                state = states.setdefault(fcc[:2], Mpeg4State())
+                coded_start, coded_end, frame_type = locate_payload(chunk.payload, 0, chunk.size, state)
+                if config.codec_aware:
+                    coded = (coded_start, coded_end)
+            if not chunk.truncated and selector.take(frame_idx, chunk, fps, frame_type):
+                data = bytearray(chunk.header)
+                data += chunk.payload
+                data_end = 8 + chunk.size
+                start = time.perf_counter()
+                plan = WritePlan()
+                if hex_fucker.smear_mode:
+                    if selector.selected > SMEAR_SKIP_FIRST:
+                        smear_offset += hex_fucker.smear_drift(frame_idx)
+                        slot = (selector.selected - 1) % len(hex_fucker.smear_patterns)
+                        hex_fucker.plan_smear_frame(slot, 0, data_end, smear_offset, plan, base=chunk.offset,
+                                                    coded=coded)
+                else:
+                    hex_fucker.plan_frame(frame_idx, 0, data_end, plan, coded)
+                planned = time.perf_counter()
+                stats.add_time('plan', planned - start)
+                start = planned
+                applied = hex_fucker.write_plan(data, plan)
+                hex_fucker.log_plan(plan, applied, base=chunk.offset)
+                hex_fucker.count_plan(plan, applied)
+                result.glitches += applied
+                stats.add_time('apply', time.perf_counter() - start)
+                chunk.header = bytes(data[:8])
+                chunk.payload = data[8:]
+        yield chunk
+    result.selected = selector.selected
+    stats.count('frames_total', result.frames)
+    stats.count('frames_selected', result.selected)
+
+class AviStreamWriter:
+    """
+    Write a token stream back out. Positions of the headers a piped ffmpeg
+    cannot fill in are remembered; on a seekable output finish() patches the
+    RIFF/movi sizes and frame counts and appends an idx1 rebuilt from the
+    chunks that went past, so the result is an ordinary indexed AVI.
+    On a pipe nothing is remembered per chunk, so memory stays flat however
+    long the stream runs.
+    """
+    def __init__(self, out, result: StreamResult):
+        self.out = out
+        self.result = result
+        self.riffs: List[Tuple[int, int]] = []   # (offset, declared size)
+        self.movi: Optional[Tuple[int, int]] = None
+        self.movi_end: Optional[int] = None
+        self.has_idx1 = False
+        self.avih_offset: Optional[int] = None
+        self.strh_offsets: List[int] = []
+        self.video_ids: List[int] = []
+        seekable = getattr(out, 'seekable', None)
+        self.seekable = bool(seekable is not None and seekable())
+        self.idx1 = bytearray() if self.seekable else None  # packed idx1 entries
+        self.frames = 0
+        self.pos = 0
+
+    def write(self, chunk: RiffChunk):
+        if chunk.kind == 'list':
+            if chunk.fcc == b'RIFF':
+                self.riffs.append((chunk.offset, chunk.size))
+            elif chunk.list_type == b'movi' and self.movi is None:
+                self.movi = (chunk.offset, chunk.size)
+        elif chunk.kind == 'chunk':
+            self._note_chunk(chunk)
+        self.out.write(chunk.header)
+        self.out.write(chunk.payload)
+        self.pos += len(chunk)
+
+    def _note_chunk(self, chunk: RiffChunk):
+        fcc = chunk.fcc
+        if fcc == b'avih':
+            self.avih_offset = chunk.offset
+        elif fcc == b'strh':
+            if chunk.payload[:4] == b'vids':
+                self.video_ids.append(len(self.strh_offsets))
+            self.strh_offsets.append(chunk.offset)
+        elif fcc == b'idx1':
+            self.has_idx1 = True
+            if self.movi_end is None:
+                self.movi_end = chunk.offset
+        elif self.idx1 is not None and self.movi is not None and self.movi_end is None \
+                and len(self.riffs) == 1 and fcc[:2].isdigit() and not chunk.truncated:
+            is_video = fcc[2:] in VIDEO_CHUNK_TYPES
+            flags = AVIIF_KEYFRAME if not is_video or guess_keyframe(fcc, chunk.payload) else 0
+            self.idx1 += struct.pack('<4sIII', fcc, flags, chunk.offset - self.movi[0] - 8, chunk.size)
+            if is_video:
+                self.frames += 1
+                self.result.index.append(chunk.offset, chunk.size, flags, int(fcc[:2]))
+
+    def finish(self):
+        self.result.bytes_written = self.pos
+        if not self.seekable or not self.riffs or self.movi is None:
+            return
+        if len(self.riffs) > 1:
+            # Multi-segment (OpenDML) input came from a seekable source with its sizes intact
+            return
+        end = self.pos
+        if self.movi_end is None:
+            self.movi_end = end
+        if not self.has_idx1 and self.idx1:
+            self.out.write(b'idx1' + struct.pack('<I', len(self.idx1)))
+            self.out.write(self.idx1)
+            end += 8 + len(self.idx1)
+            self.result.index.source = 'idx1'
+        self._fix_size(self.riffs[0], end)
+        self._fix_size(self.movi, self.movi_end)
+        if self.avih_offset is not None:
+            self._fill_zero_u32(self.avih_offset + 8 + 16, self.frames)
+        for i in self.video_ids:
+            self._fill_zero_u32(self.strh_offsets[i] + 8 + 32, self.frames)
+        self.out.seek(end)
+        self.result.bytes_written = end
+
+    def _fix_size(self, header: Tuple[int, int], end: int):
+        offset, declared = header
+        actual = end - offset - 8
+        if declared in (0, UNKNOWN_SIZE) or declared > actual:
+            self.out.seek(offset + 4)
+            self.out.write(struct.pack('<I', actual))
+
+    def _fill_zero_u32(self, offset: int, value: int):
+        """Fill in a frame count the encoder left at zero (needs an output opened for reading too)"""
+        if not self.out.readable():
+            return
+        self.out.seek(offset)
+        if self.out.read(4) == b'\x00\x00\x00\x00':
+            self.out.seek(offset)
+            self.out.write(struct.pack('<I', value))
+
+def glitch_stream(source, out, hex_fucker) -> StreamResult:
+    """
+    Read an AVI from source (any binary file object, typically a pipe), glitch
+    it chunk by chunk and write it to out. Reading, glitching and writing are
+    chained generators, so only the chunk in flight is held in memory.
+    """
+    result = StreamResult()
+    stats = hex_fucker.stats
+    writer = AviStreamWriter(out, result)
+    chunks = glitch_chunks(iter_riff_chunks(source), hex_fucker, result)
+    # Pulling a chunk covers reading it and glitching it; the glitch stage times its own part
+    pulled = written = 0.0
+    glitch_before = stats.timings['plan'] + stats.timings['apply']
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        ready = time.perf_counter()
+        pulled += ready - start
+        if chunk is None:
+            break
+        writer.write(chunk)
+        written += time.perf_counter() - ready
+    start = time.perf_counter()
+    writer.finish()
+    written += time.perf_counter() - start
+    stats.add_time('read', pulled - (stats.timings['plan'] + stats.timings['apply'] - glitch_before))
+    stats.add_time('write', written)
+    stats.count('input_bytes', writer.pos)
+    stats.count('output_bytes', result.bytes_written)
+    return result
+
+def render_to_stream(hex_fucker, input_path: str, out, index: FrameIndex) -> Tuple[int, int]:
+    """
+    Write input_path to out (a pipe, e.g. FFmpeg's stdin) in file order with
+    every selected frame glitched exactly as fuck_video would glitch it, so
+    the stream carries the bytes of a full render without it reaching disk.
+    Selection and seeds come from the whole index, as in a file render.
+    Returns (frames selected, glitches).
+    """
+    from glitcher import SMEAR_SKIP_FIRST, frame_data_end
+    stats = hex_fucker.stats
+    config = hex_fucker.config
+    hex_fucker.run_seed = config.seed if config.seed is not None else random.getrandbits(63)
+    with open(input_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    glitches = 0
+    try:
+        with stats.stage('select'):
+            selected = hex_fucker.select_frames_to_glitch(len(index), data)
+        stats.count('frames_total', len(index))
+        stats.count('frames_selected', len(selected))
+        smear = {}
+        if hex_fucker.smear_mode:
+            hex_fucker.choose_smear_patterns()
+            smear_offset = 0
+            for i, frame_idx in enumerate(selected):
+                if i < SMEAR_SKIP_FIRST:
+                    continue
+                smear_offset += hex_fucker.smear_drift(frame_idx)
+                smear[frame_idx] = (i % len(hex_fucker.smear_patterns), smear_offset)
+        pos = 0
+        for frame_idx in sorted(selected, key=index.offsets.__getitem__):
+            offset = index.offsets[frame_idx]
+            end = frame_data_end(index, frame_idx, len(data))
+            if offset < pos or end <= offset:
+                continue
+            with stats.stage('write'):
+                out.write(view[pos:offset])
+            buf = bytearray(view[offset:end])
+            with stats.stage('apply'):
+                glitches += hex_fucker.glitch_frame_buffer(buf, index, frame_idx, offset, len(data),
+                                                           smear.get(frame_idx))
+            with stats.stage('write'):
+                out.write(buf)
+            pos = end
+        with stats.stage('write'):
+            out.write(view[pos:])
+            out.flush()
+        stats.count('input_bytes', len(data))
+        stats.count('output_bytes', len(data))
+    finally:
+        view.release()
+        data.close()
+    return len(selected), glitches
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Synthetic AVI generator for benchmarks and demos.
+Writes well-formed files (hdrl, movi, idx1 and optionally OpenDML AVIX
+segments with indx/ix## indexes) of any size, streamed to disk so memory
+does not grow with the output.
+"""
+
+import sys
+import math
+import random
+import struct
+import argparse
+from typing import Dict, List, Optional
+
+VOP_START = b'\x00\x00\x01\xb6'
+VOP_CODING_TYPES = {'I': 0, 'P': 1, 'B': 2}
+# Mean chunk size of each frame type relative to a P-frame
+FRAME_TYPE_WEIGHTS = {'I': 6.0, 'P': 1.0, 'B': 0.45}
+NOISE_BLOCK_SIZE = 4 * 1024 * 1024
+RIFF_SEGMENT_SIZE = 1024 * 1024 * 1024
+SUPER_INDEX_ENTRY = struct.Struct('<QII')
+AVIIF_KEYFRAME = 0x10
+
+def _chunk_header(fcc: bytes, size: int) -> bytes:
+    return fcc + struct.pack('<I', size)
+
+def _gop_types(gop: int, bframes: int) -> List[str]:
+    """Display-order frame types of one GOP, e.g. I B B P B B P ..."""
+    types = ['I']
+    while len(types) < gop:
+        types.extend(['B'] * bframes + ['P'])
+    return types[:gop]
+
+class _Stream:
+    """Per-stream bookkeeping for the OpenDML indexes"""
+    def __init__(self, ckid: bytes):
+        self.ckid = ckid
+        self.super_entries: List[tuple] = []  # (ix## chunk offset, chunk size, entries) per segment
+        self.indx_offset = 0                  # offset of the indx payload from the hdrl LIST
+
+class SyntheticAviWriter:
+    """
+    Streams an AVI to path. Frame sizes follow an I/P/B GOP pattern with
+    log-normal noise scaled to bitrate_kbps; video payloads start with an
+    MPEG-4 VOP header carrying the frame's coding type.
+    """
+    def __init__(self, path: str, frames: int, fps: int = 25, width: int = 640, height: int = 360,
+                 bitrate_kbps: int = 2500, gop: int = 250, bframes: int = 2, audio: bool = True,
+                 odml: bool = False, riff_size: int = RIFF_SEGMENT_SIZE, seed: int = 0):
+        self.path = path
+        self.frames = frames
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.gop_types = _gop_types(max(1, gop), max(0, bframes))
+        self.audio = audio
+        self.odml = odml
+        self.riff_size = riff_size
+        self.rng = random.Random(seed)
+        self.noise = self.rng.randbytes(NOISE_BLOCK_SIZE)
+        mean_weight = sum(FRAME_TYPE_WEIGHTS[t] for t in self.gop_types) / len(self.gop_types)
+        self.p_frame_size = bitrate_kbps * 1000 / 8 / fps / mean_weight
+        self.audio_size = 44100 * 2 * 2 // fps
+        self.streams = [_Stream(b'00dc')] + ([_Stream(b'01wb')] if audio else [])
+        self.segments = 0
+
+    def estimate_size(self) -> int:
+        frame_bytes = self.p_frame_size * sum(FRAME_TYPE_WEIGHTS[t] for t in self.gop_types) / len(self.gop_types)
+        per_frame = frame_bytes + 9 + (self.audio_size + 8 + 16 if self.audio else 0) + 16
+        return int(self.frames * per_frame) + 4096
+
+    def _frame_size(self, frame_type: str) -> int:
+        mean = self.p_frame_size * FRAME_TYPE_WEIGHTS[frame_type]
+        # Log-normal around the mean (mu chosen so the expectation is mean)
+        sigma = 0.35
+        size = int(self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma))
+        return max(64, min(size, NOISE_BLOCK_SIZE - 16))
+
+    def _payload(self, size: int, frame_type: Optional[str]) -> bytes:
+        start = self.rng.randrange(0, NOISE_BLOCK_SIZE - size)
+        if frame_type is None:
+            return self.noise[start:start + size]
+        vop = VOP_START + bytes([(VOP_CODING_TYPES[frame_type] << 6) | (self.noise[start] & 0x3f)])
+        return vop + self.noise[start + len(vop):start + size]
+
+    def _headers(self, max_segments: int) -> bytes:
+        usec = 1000000 // self.fps
+        avih = struct.pack('<10I', usec, 0, 0, AVIIF_KEYFRAME | 0x100, self.frames, 0, len(self.streams),
+                           0, self.width, self.height) + bytes(16)
+        strh_v = struct.pack('<4s4sIHHIIIIIIIIhhhh', b'vids', b'XVID', 0, 0, 0, 0, 1, self.fps, 0, self.frames,
+                             0, 0xFFFFFFFF, 0, 0, 0, self.width, self.height)
+        strf_v = struct.pack('<IiiHH4sIiiII', 40, self.width, self.height, 1, 24, b'XVID',
+                             self.width * self.height * 3, 0, 0, 0, 0)
+        strls = [(strh_v, strf_v)]
+        if self.audio:
+            strh_a = struct.pack('<4s4sIHHIIIIIIIIhhhh', b'auds', bytes(4), 0, 0, 0, 0, 1, 44100, 0,
+                                 44100 * self.frames // self.fps, 0, 0xFFFFFFFF, 4, 0, 0, 0, 0)
+            strf_a = struct.pack('<HHIIHHH', 1, 2, 44100, 44100 * 4, 4, 16, 0)
+            strls.append((strh_a, strf_a))
+        body = bytearray(b'hdrl' + _chunk_header(b'avih', len(avih)) + avih)
+        for stream, (strh, strf) in zip(self.streams, strls):
+            strl = bytearray(b'strl' + _chunk_header(b'strh', len(strh)) + strh + _chunk_header(b'strf', len(strf)) + strf)
+            if self.odml:
+                # Super index with room for every segment; entries are filled in by _write_super_indexes()
+                indx_size = 24 + SUPER_INDEX_ENTRY.size * max_segments
+                stream.indx_offset = 8 + len(body) + 8 + len(strl) + 8
+                strl += _chunk_header(b'indx', indx_size)
+                strl += struct.pack('<HBBI4s', 4, 0, 0, 0, stream.ckid) + bytes(indx_size - 12)
+            body += _chunk_header(b'LIST', len(strl)) + strl
+        if self.odml:
+            dmlh = struct.pack('<I', self.frames) + bytes(244)
+            body += _chunk_header(b'LIST', 4 + 8 + len(dmlh)) + b'odml' + _chunk_header(b'dmlh', len(dmlh)) + dmlh
+        return _chunk_header(b'LIST', len(body)) + bytes(body)
+
+    def write(self) -> Dict:
+        """Write the file; returns a summary dict (size, frames, segments, keyframes)"""
+        max_segments = max(1, self.estimate_size() // self.riff_size + 2) if self.odml else 1
+        idx1 = bytearray()
+        keyframes = 0
+        with open(self.path, 'w+b') as f:
+            riff_start = 0
+            f.write(b'RIFF' + bytes(4) + b'AVI ')
+            hdrl_offset = f.tell()
+            f.write(self._headers(max_segments))
+            movi_start = f.tell()
+            f.write(b'LIST' + bytes(4) + b'movi')
+            segment_entries = [[] for _ in self.streams]
+            for i in range(self.frames):
+                if self.odml and f.tell() - riff_start > self.riff_size:
+                    self._end_segment(f, riff_start, movi_start, segment_entries, idx1)
+                    idx1 = None
+                    riff_start = f.tell()
+                    f.write(b'RIFF' + bytes(4) + b'AVIX')
+                    movi_start = f.tell()
+                    f.write(b'LIST' + bytes(4) + b'movi')
+                    segment_entries = [[] for _ in self.streams]
+                frame_type = self.gop_types[i % len(self.gop_types)]
+                keyframes += frame_type == 'I'
+                chunks = [(0, self._payload(self._frame_size(frame_type), frame_type), frame_type == 'I')]
+                if self.audio:
+                    chunks.append((1, self._payload(self.audio_size, None), True))
+                for stream_no, payload, key in chunks:
+                    offset = f.tell()
+                    f.write(_chunk_header(self.streams[stream_no].ckid, len(payload)))
+                    f.write(payload)
+                    if len(payload) & 1:
+                        f.write(b'\x00')
+                    segment_entries[stream_no].append((offset + 8, len(payload), key))
+                    if idx1 is not None:
+                        idx1 += struct.pack('<4sIII', self.streams[stream_no].ckid, AVIIF_KEYFRAME if key else 0,
+                                            offset - movi_start - 8, len(payload))
+            self._end_segment(f, riff_start, movi_start, segment_entries, idx1)
+            if self.odml:
+                self._write_super_indexes(f, hdrl_offset)
+            size = f.tell()
+        return {'path': self.path, 'size': size, 'frames': self.frames, 'keyframes': keyframes,
+                'segments': self.segments, 'audio': self.audio, 'odml': self.odml}
+
+    def _end_segment(self, f, riff_start: int, movi_start: int, segment_entries, idx1: Optional[bytearray]):
+        if self.odml:
+            for stream, entries in zip(self.streams, segment_entries):
+                if not entries:
+                    continue
+                body = bytearray(struct.pack('<HBBI4sQI', 2, 0, 1, len(entries), stream.ckid, movi_start, 0))
+                for payload_offset, size, key in entries:
+                    body += struct.pack('<II', payload_offset - movi_start, size if key else size | 0x80000000)
+                ix_offset = f.tell()
+                f.write(_chunk_header(b'ix' + stream.ckid[:2], len(body)))
+                f.write(body)
+                stream.super_entries.append((ix_offset, len(body) + 8, len(entries)))
+        end = f.tell()
+        f.seek(movi_start + 4)
+        f.write(struct.pack('<I', end - movi_start - 8))
+        f.seek(end)
+        if idx1 is not None:
+            f.write(_chunk_header(b'idx1', len(idx1)))
+            f.write(idx1)
+        end = f.tell()
+        f.seek(riff_start + 4)
+        f.write(struct.pack('<I', end - riff_start - 8))
+        f.seek(end)
+        self.segments += 1
+
+    def _write_super_indexes(self, f, hdrl_offset: int):
+        end = f.tell()
+        for stream in self.streams:
+            f.seek(hdrl_offset + stream.indx_offset)
+            f.write(struct.pack('<HBBI4s', 4, 0, 0, len(stream.super_entries), stream.ckid) + bytes(12))
+            for entry in stream.super_entries:
+                f.write(SUPER_INDEX_ENTRY.pack(*entry))
+        f.seek(end)
+
+def write_synthetic_avi(path: str, frames: Optional[int] = None, size_mb: Optional[float] = None, **options) -> Dict:
+    """
+    Write a synthetic AVI with either a frame count or an approximate size in MB
+    (options are passed to SyntheticAviWriter). OpenDML is switched on
+    automatically when the file would not fit a single 1 GB RIFF.
+    """
+    if frames is None:
+        probe = SyntheticAviWriter(path, 1, **options)
+        per_frame = probe.estimate_size() - 4096
+        frames = max(1, int((size_mb or 16) * 1024 * 1024 / per_frame))
+    writer = SyntheticAviWriter(path, frames, **options)
+    if not writer.odml and writer.estimate_size() > writer.riff_size:
+        writer.odml = True
+    return writer.write()
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic AVI for benchmarking')
+    parser.add_argument('output', help='Output AVI path')
+    parser.add_argument('--frames', type=int, help='Number of video frames')
+    parser.add_argument('--size-mb', type=float, default=16, help='Approximate file size when --frames is not given')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--bitrate', type=int, default=2500, help='Video bitrate in kbit/s (sets the chunk sizes)')
+    parser.add_argument('--gop', type=int, default=250, help='Frames per keyframe interval')
+    parser.add_argument('--bframes', type=int, default=2)
+    parser.add_argument('--no-audio', action='store_true')
+    parser.add_argument('--odml', action='store_true', help='Write OpenDML indexes (and AVIX segments past --riff-mb)')
+    parser.add_argument('--riff-mb', type=int, default=RIFF_SEGMENT_SIZE // (1024 * 1024), help='OpenDML segment size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    summary = write_synthetic_avi(args.output, frames=args.frames, size_mb=args.size_mb, fps=args.fps,
+                                  bitrate_kbps=args.bitrate, gop=args.gop, bframes=args.bframes,
+                                  audio=not args.no_audio, odml=args.odml, riff_size=args.riff_mb * 1024 * 1024,
+                                  seed=args.seed)
+    print(f"Wrote {summary['path']}: {summary['size']:,} bytes, {summary['frames']:,} frames "
+          f"({summary['keyframes']:,} keyframes), {summary['segments']} RIFF segment(s)")
+
+if __name__ == '__main__':
+    sys.exit(main())
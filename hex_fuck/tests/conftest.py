@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+# The modules import each other flat (from glitcher import ...), as when run from hex_fuck/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from glitcher import GlitchConfig
+from patterns import resolve_patterns
+from synth_avi import SyntheticAviWriter
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.fixture
+def avi(tmp_path) -> str:
+    """A small single-stream AVI with an idx1 (60 frames, a keyframe every 12)"""
+    path = str(tmp_path / 'input.avi')
+    SyntheticAviWriter(path, 60, width=160, height=120, bitrate_kbps=800, gop=12, audio=False, seed=1).write()
+    return path
+
+@pytest.fixture
+def make_config():
+    """GlitchConfig factory with fixed defaults: every third frame, high intensity, seed 7"""
+    def make(**overrides) -> GlitchConfig:
+        settings = dict(patterns=resolve_patterns('all'), target_strategy='every_nth', target_value=3,
+                        max_glitches=0, skip_header_bytes=12, glitch_size=256, intensity='high', seed=7)
+        settings.update(overrides)
+        return GlitchConfig(**settings)
+    return make
@@ -0,0 +1,43 @@
+import pytest
+from avi_index import index_avi
+from conftest import read_bytes
+from selection import FrameSelection
+from synth_avi import SyntheticAviWriter
+
+@pytest.fixture
+def odml_avi(tmp_path) -> str:
+    """120 frames in six RIFF segments with an OpenDML super index and an idx1 for the first segment"""
+    path = str(tmp_path / 'odml.avi')
+    SyntheticAviWriter(path, 120, width=160, height=120, bitrate_kbps=800, gop=12, audio=False, odml=True,
+                       riff_size=100_000, seed=1).write()
+    return path
+
+def test_single_segment_avi_uses_idx1(avi):
+    index = index_avi(avi)
+
+    assert index.source == 'idx1'
+    assert len(index) == 60
+    assert [i for i in range(60) if index.is_keyframe(i)] == [0, 12, 24, 36, 48]
+
+def test_odml_avi_uses_super_index(odml_avi):
+    index = index_avi(odml_avi)
+
+    assert index.source == 'indx'
+    assert len(index) == 120
+    assert sum(index.is_keyframe(i) for i in range(120)) == 10
+
+def test_walked_avix_frames_do_not_claim_keyframe_flags(tmp_path, odml_avi):
+    path = str(tmp_path / 'no_indx.avi')
+    with open(path, 'wb') as f:
+        f.write(read_bytes(odml_avi).replace(b'indx', b'JUNK'))
+    reference = index_avi(odml_avi)
+
+    index = index_avi(path)
+
+    assert index.source == 'idx1+walk'
+    assert not index.has_keyframe_flags
+    assert list(index.offsets) == list(reference.offsets)
+    # Keyframe predicates probe the frames instead of trusting flags the walk never set
+    data = read_bytes(path)
+    assert (FrameSelection('keyframes').candidates(index, data)
+            == [i for i in range(120) if reference.is_keyframe(i)])
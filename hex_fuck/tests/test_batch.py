@@ -0,0 +1,60 @@
+import json
+import pytest
+from batch import load_jobs
+
+DEFAULTS = {'pattern': 'all', 'strategy': 'every_nth', 'value': 3, 'max_glitches': 0, 'intensity': 'medium'}
+
+def _touch(path):
+    path.write_bytes(b'RIFF')
+    return str(path)
+
+def test_directory_batch_skips_previous_outputs(tmp_path):
+    source = _touch(tmp_path / 'take.avi')
+    _touch(tmp_path / 'clip.mp4')
+    _touch(tmp_path / 'take_glitched.avi')
+    _touch(tmp_path / 'notes.txt')
+
+    jobs = load_jobs(str(tmp_path), DEFAULTS)
+
+    assert [job['input'] for job in jobs] == [str(tmp_path / 'clip.mp4'), source]
+    assert jobs[1]['output'] == str(tmp_path / 'take_glitched.avi')
+
+def test_glob_batch_skips_previous_outputs(tmp_path):
+    _touch(tmp_path / 'a.avi')
+    _touch(tmp_path / 'a_glitched.avi')
+
+    jobs = load_jobs(str(tmp_path / '*.avi'), DEFAULTS)
+
+    assert [job['input'] for job in jobs] == [str(tmp_path / 'a.avi')]
+
+def test_manifest_settings_override_defaults(tmp_path):
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps([{'input': 'a.avi', 'output': 'out.avi', 'seed': '5', 'smear-mode': 'yes'}]))
+
+    job, = load_jobs(str(manifest), DEFAULTS)
+
+    assert job['input'] == str(tmp_path / 'a.avi')
+    assert job['output'] == str(tmp_path / 'out.avi')
+    assert job['settings']['seed'] == 5
+    assert job['settings']['smear_mode'] is True
+    assert job['settings']['intensity'] == 'medium'
+
+@pytest.mark.parametrize('rows, message', [
+    ([{'input': 'a.avi', 'colour': 'red'}], 'Unknown job settings: colour'),
+    ([{'output': 'b.avi'}], "no 'input'"),
+    ([{'input': 'a.avi', 'seed': 'x'}], 'Manifest row 1'),
+    ({'input': 'a.avi'}, 'must be a list'),
+])
+def test_bad_manifests_raise_value_error(tmp_path, rows, message):
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps(rows))
+
+    with pytest.raises(ValueError, match=message):
+        load_jobs(str(manifest), DEFAULTS)
+
+def test_csv_row_longer_than_header_is_rejected(tmp_path):
+    manifest = tmp_path / 'jobs.csv'
+    manifest.write_text('input,seed\na.avi,3,9\n')
+
+    with pytest.raises(ValueError, match='more fields than the header'):
+        load_jobs(str(manifest), DEFAULTS)
@@ -0,0 +1,41 @@
+import os
+from frame_cache import load_frame_index, sidecar_paths
+
+def test_sidecar_is_written_and_reused(avi):
+    first = load_frame_index(avi)
+    second = load_frame_index(avi)
+
+    assert not first.cached
+    assert os.path.exists(sidecar_paths(avi)[0])
+    assert second.cached
+    assert list(second.offsets) == list(first.offsets)
+
+def test_sidecar_invalidated_when_size_changes(avi):
+    load_frame_index(avi)
+    with open(avi, 'ab') as f:
+        f.write(b'JUNK' + bytes(12))
+
+    assert not load_frame_index(avi).cached
+    assert load_frame_index(avi).cached
+
+def test_sidecar_invalidated_when_mtime_changes(avi):
+    load_frame_index(avi)
+    st = os.stat(avi)
+    os.utime(avi, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+
+    assert not load_frame_index(avi).cached
+    assert load_frame_index(avi).cached
+
+def test_use_cache_false_ignores_sidecar(avi):
+    load_frame_index(avi)
+
+    assert not load_frame_index(avi, use_cache=False).cached
+
+def test_sidecar_gets_normal_file_permissions(avi):
+    old_umask = os.umask(0o027)
+    try:
+        load_frame_index(avi)
+    finally:
+        os.umask(old_umask)
+
+    assert os.stat(sidecar_paths(avi)[0]).st_mode & 0o777 == 0o640
@@ -0,0 +1,69 @@
+import json
+import pytest
+from glitch_log import GlitchLog, open_log_sink, read_binary_log
+
+ENTRIES = [(100, 16, (3,), 90), (140, 32, (1, 2), 90), (500, 8, (3,), 480), (700, 64, (0, 5, 5), 690)]
+
+def _fill(log: GlitchLog) -> GlitchLog:
+    for entry in ENTRIES:
+        log.append(*entry)
+    log.close()
+    return log
+
+def _as_dicts():
+    return [{'offset': offset, 'size': size, 'patterns': list(stack), 'chunk_offset': chunk}
+            for offset, size, stack, chunk in ENTRIES]
+
+def test_kept_entries_and_stacks():
+    log = _fill(GlitchLog())
+
+    assert len(log) == 4
+    assert list(log.stacks()) == [stack for _, _, stack, _ in ENTRIES]
+    assert log.entry(3) == {'offset': 700, 'size': 64, 'patterns': (0, 5, 5), 'chunk_offset': 690}
+    assert log.select(chunk_offset=90) == [0, 1]
+    assert log.select(min_size=32) == [1, 3]
+
+def test_summary_counts_stack_usage():
+    summary = _fill(GlitchLog()).summary()
+
+    assert summary['glitches'] == 4
+    assert summary['bytes_touched'] == 120
+    assert summary['chunks_touched'] == 3
+    assert summary['pattern_stacks'] == 3
+    assert summary['top_stacks'][0] == (2, (3,))
+
+@pytest.mark.parametrize('name', ['log.bin', 'log.jsonl'])
+def test_sinks_write_every_entry_with_its_stack(tmp_path, name):
+    path = str(tmp_path / name)
+
+    log = _fill(GlitchLog(keep=False, sinks=[open_log_sink(path)]))
+
+    if name.endswith('.jsonl'):
+        with open(path) as f:
+            written = [json.loads(line) for line in f]
+    else:
+        written = list(read_binary_log(path))
+    assert written == _as_dicts()
+    assert len(log) == 4
+    assert len(log.offsets) == 0 and len(log.stack_patterns) == 0
+
+def test_streamed_log_counts_chunks_without_keeping_them():
+    log = _fill(GlitchLog(keep=False))
+
+    assert log.summary()['chunks_touched'] == 3
+    assert log.summary()['pattern_stacks'] is None
+
+def test_truncated_binary_log_stops_at_last_whole_entry(tmp_path):
+    path = str(tmp_path / 'log.bin')
+    _fill(GlitchLog(keep=False, sinks=[open_log_sink(path)]))
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 3)
+
+    assert list(read_binary_log(path)) == _as_dicts()[:3]
+
+def test_binary_log_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a log')
+
+    with pytest.raises(ValueError):
+        list(read_binary_log(str(path)))
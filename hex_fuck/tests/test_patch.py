@@ -0,0 +1,69 @@
+import shutil
+import pytest
+from conftest import read_bytes
+from glitcher import HexFucker
+from patch import GlitchPatch, PatchMismatchError, apply_patch, revert_patch
+
+def _render_with_patch(tmp_path, avi, config, with_originals=True):
+    output = str(tmp_path / 'output.avi')
+    patch_path = str(tmp_path / 'render.hfpatch')
+    hex_fucker = HexFucker(config)
+    hex_fucker.capture_originals = with_originals
+    assert hex_fucker.fuck_video(avi, output)
+    GlitchPatch.from_render(hex_fucker, avi, result_path=output).save(patch_path)
+    return output, patch_path
+
+def test_apply_patch_reproduces_render(tmp_path, avi, make_config):
+    output, patch_path = _render_with_patch(tmp_path, avi, make_config(intensity='extreme'))
+    replayed = str(tmp_path / 'replayed.avi')
+
+    apply_patch(patch_path, avi, replayed)
+
+    assert read_bytes(replayed) == read_bytes(output)
+
+def test_revert_patch_restores_source(tmp_path, avi, make_config):
+    output, patch_path = _render_with_patch(tmp_path, avi, make_config(intensity='fucked'))
+    source = read_bytes(avi)
+
+    revert_patch(patch_path, output)
+
+    assert read_bytes(output) == source
+
+def test_apply_in_place_then_revert_round_trips(tmp_path, avi, make_config):
+    _, patch_path = _render_with_patch(tmp_path, avi, make_config())
+    target = str(tmp_path / 'copy.avi')
+    shutil.copyfile(avi, target)
+
+    apply_patch(patch_path, target)
+    assert read_bytes(target) != read_bytes(avi)
+    revert_patch(patch_path, target)
+
+    assert read_bytes(target) == read_bytes(avi)
+
+def test_patch_save_load_keeps_writes(tmp_path, avi, make_config):
+    _, patch_path = _render_with_patch(tmp_path, avi, make_config(intensity='extreme'))
+    hex_fucker = HexFucker(make_config(intensity='extreme'))
+    hex_fucker.fuck_video(avi, str(tmp_path / 'again.avi'))
+    patch = GlitchPatch.load(patch_path)
+
+    assert len(patch) == len(hex_fucker.glitch_log)
+    assert list(patch.offsets) == list(hex_fucker.glitch_log.offsets)
+    assert patch.seed == 7
+
+def test_patch_rejects_other_source(tmp_path, avi, make_config):
+    _, patch_path = _render_with_patch(tmp_path, avi, make_config())
+    other = str(tmp_path / 'other.avi')
+    with open(avi, 'rb') as f:
+        data = bytearray(f.read())
+    data[-1] ^= 0xff
+    with open(other, 'wb') as f:
+        f.write(data)
+
+    with pytest.raises(PatchMismatchError):
+        apply_patch(patch_path, other, str(tmp_path / 'out.avi'))
+
+def test_revert_needs_originals(tmp_path, avi, make_config):
+    output, patch_path = _render_with_patch(tmp_path, avi, make_config(), with_originals=False)
+
+    with pytest.raises(ValueError):
+        revert_patch(patch_path, output)
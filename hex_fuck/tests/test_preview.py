@@ -0,0 +1,38 @@
+import pytest
+from avi_index import index_video
+from conftest import read_bytes
+from glitcher import HexFucker
+from preview import parse_range, render_preview, seconds_to_frames
+
+def test_parse_range():
+    assert parse_range('10:20') == (10, 20)
+    assert parse_range('10:') == (10, None)
+    assert parse_range('7') == (7, 8)
+
+def test_seconds_round_out_to_whole_frames(avi):
+    index = index_video(avi)  # 25 fps
+
+    assert seconds_to_frames(index, 1.0, 1.2) == (25, 30)
+    assert seconds_to_frames(index, 0.5, 0.5) == (12, 13)
+    assert seconds_to_frames(index, 0.02, 0.9) == (0, 23)
+    assert seconds_to_frames(index, 2, None) == (50, None)
+
+@pytest.mark.parametrize('start, end', [(5, 5), (9, 3), (0, 0), (-1, 10), (50, 61), (60, None)])
+def test_bad_windows_are_rejected(tmp_path, avi, make_config, start, end):
+    with pytest.raises(ValueError):
+        render_preview(HexFucker(make_config()), avi, str(tmp_path / 'preview.avi'), start, end, index_video(avi))
+
+def test_preview_frames_match_full_render(tmp_path, avi, make_config):
+    full, preview = str(tmp_path / 'full.avi'), str(tmp_path / 'preview.avi')
+    HexFucker(make_config()).fuck_video(avi, full)
+
+    first, end, _ = render_preview(HexFucker(make_config()), avi, preview, 30, 40, index_video(avi))
+
+    full_index, preview_index = index_video(full), index_video(preview)
+    full_data, preview_data = read_bytes(full), read_bytes(preview)
+    assert (first, end) == (24, 40)
+    assert len(preview_index) == end - first
+    for k in range(len(preview_index)):
+        i = first + k
+        assert (preview_data[preview_index.offsets[k]:preview_index.offsets[k] + 8 + preview_index.sizes[k]]
+                == full_data[full_index.offsets[i]:full_index.offsets[i] + 8 + full_index.sizes[i]])
@@ -0,0 +1,49 @@
+import shutil
+import struct
+import pytest
+from avi_index import index_video
+from recovery import rebuild_idx1
+
+def _truncate_inside_frame(path: str, frame: int) -> int:
+    """Cut the file 20 bytes into a frame's chunk, losing the tail of movi and the idx1"""
+    cut = index_video(path).offsets[frame] + 20
+    with open(path, 'r+b') as f:
+        f.truncate(cut)
+    return cut
+
+def test_rebuild_idx1_on_truncated_avi(tmp_path, avi):
+    damaged = str(tmp_path / 'damaged.avi')
+    shutil.copyfile(avi, damaged)
+    _truncate_inside_frame(damaged, 40)
+    assert index_video(damaged).source == 'scan'
+
+    entries = rebuild_idx1(damaged)
+
+    full = index_video(avi)
+    rebuilt = index_video(damaged)
+    assert entries == 41
+    assert rebuilt.source == 'idx1'
+    assert list(rebuilt.offsets) == list(full.offsets[:41])
+    assert list(rebuilt.sizes) == list(full.sizes[:41])
+    assert list(rebuilt.flags) == list(full.flags[:41])
+
+def test_rebuild_idx1_replaces_existing_index(tmp_path, avi):
+    copy = str(tmp_path / 'copy.avi')
+    shutil.copyfile(avi, copy)
+
+    assert rebuild_idx1(copy) == 60
+
+    with open(copy, 'rb') as f:
+        data = f.read()
+    assert data.count(b'idx1') == 1
+    assert struct.unpack('<I', data[4:8])[0] == len(data) - 8
+    rebuilt = index_video(copy)
+    assert list(rebuilt.offsets) == list(index_video(avi).offsets)
+
+def test_rebuild_idx1_rejects_non_avi(tmp_path):
+    path = str(tmp_path / 'noise.avi')
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * 1024)
+
+    with pytest.raises(ValueError):
+        rebuild_idx1(path)
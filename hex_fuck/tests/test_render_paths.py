@@ -0,0 +1,40 @@
+import pytest
+from conftest import read_bytes
+from glitcher import HexFucker
+
+@pytest.mark.parametrize('intensity', ['low', 'high', 'fucked'])
+def test_output_paths_render_identical_bytes(tmp_path, avi, make_config, intensity):
+    config = make_config(intensity=intensity)
+    mmap_out, memory_out = str(tmp_path / 'mmap.avi'), str(tmp_path / 'memory.avi')
+    worker_out, stream_out = str(tmp_path / 'workers.avi'), str(tmp_path / 'stream.avi')
+
+    assert HexFucker(config).fuck_video(avi, mmap_out)
+    assert HexFucker(config, output_mode='memory').fuck_video(avi, memory_out)
+    assert HexFucker(config, workers=2).fuck_video(avi, worker_out)
+    with open(avi, 'rb') as source:
+        assert HexFucker(config).fuck_stream(source, stream_out)
+
+    expected = read_bytes(mmap_out)
+    assert expected != read_bytes(avi)
+    assert read_bytes(memory_out) == expected
+    assert read_bytes(worker_out) == expected
+    assert read_bytes(stream_out) == expected
+
+def test_smear_mode_renders_identical_bytes_in_memory(tmp_path, avi, make_config):
+    config = make_config(target_strategy='time_offset', target_value=100)
+    mmap_out, memory_out = str(tmp_path / 'mmap.avi'), str(tmp_path / 'memory.avi')
+
+    assert HexFucker(config, smear_mode=True).fuck_video(avi, mmap_out)
+    assert HexFucker(config, smear_mode=True, output_mode='memory').fuck_video(avi, memory_out)
+
+    assert read_bytes(memory_out) == read_bytes(mmap_out)
+
+def test_same_seed_is_reproducible_and_other_seeds_differ(tmp_path, avi, make_config):
+    first, second, other = (str(tmp_path / name) for name in ('first.avi', 'second.avi', 'other.avi'))
+
+    HexFucker(make_config()).fuck_video(avi, first)
+    HexFucker(make_config()).fuck_video(avi, second)
+    HexFucker(make_config(seed=8)).fuck_video(avi, other)
+
+    assert read_bytes(first) == read_bytes(second)
+    assert read_bytes(first) != read_bytes(other)
@@ -0,0 +1,92 @@
+import pytest
+from avi_index import AVIIF_KEYFRAME, FrameIndex
+from selection import FrameSelection
+
+def _index(frames: int = 100, streams: int = 1) -> FrameIndex:
+    """idx1-style index at 25 fps: keyframe every 10th frame, sizes 100, 110, 120, ... interleaved over streams"""
+    index = FrameIndex('idx1')
+    index.micro_sec_per_frame = 40000
+    for i in range(frames):
+        index.append(1000 + 2000 * i, 100 + 10 * i, AVIIF_KEYFRAME if i % 10 == 0 else 0, i % streams)
+    return index
+
+def _picked(spec: str, index: FrameIndex):
+    return FrameSelection(spec).candidates(index)
+
+@pytest.mark.parametrize('spec', [
+    'bogus', 'stream', 'seconds=', 'frames=a:b', 'frames=1.5:3', 'frames=10:5', 'seconds=-1:2',
+    'largest=-3', 'largest=150%', 'stream=-1', 'stream=100', 'stream=256', 'min-size=x', 'type=IQ',
+])
+def test_bad_specs_are_rejected_at_parse_time(spec):
+    with pytest.raises(ValueError):
+        FrameSelection(spec)
+
+def test_empty_spec_selects_everything():
+    selection = FrameSelection(' , ')
+
+    assert not selection
+    assert selection.candidates(_index(20)) == list(range(20))
+
+def test_keyframe_and_delta_masks():
+    index = _index(30)
+
+    assert _picked('keyframes', index) == [0, 10, 20]
+    assert _picked('key', index) == [0, 10, 20]
+    assert len(_picked('delta', index)) == 27
+    assert 10 not in _picked('skip-keyframes', index)
+
+def test_frame_and_time_spans():
+    index = _index(100)
+
+    assert _picked('frames=5:8', index) == [5, 6, 7]
+    assert _picked('frames=95:', index) == [95, 96, 97, 98, 99]
+    assert _picked('seconds=1:1.2', index) == [25, 26, 27, 28, 29]
+
+def test_size_and_rank_masks():
+    index = _index(10)  # sizes 100..190
+
+    assert _picked('min-size=150,max-size=170', index) == [5, 6, 7]
+    assert _picked('largest=2', index) == [8, 9]
+    assert _picked('smallest=30%', index) == [0, 1, 2]
+
+def test_rank_masks_break_ties_by_frame_order():
+    index = FrameIndex('idx1')
+    for size in (50, 80, 80, 20, 80, 50):
+        index.append(len(index) * 100, size)
+
+    assert _picked('largest=2', index) == [1, 2]
+    assert _picked('largest=4', index) == [0, 1, 2, 4]
+    assert _picked('smallest=2', index) == [0, 3]
+    assert _picked('smallest=50%', index) == [0, 3, 5]
+
+def test_predicates_combine_with_and():
+    index = _index(100)
+
+    assert _picked('delta,frames=8:12', index) == [8, 9, 11]
+    assert _picked('keyframes,largest=50%', index) == [50, 60, 70, 80, 90]
+
+def test_stream_and_seconds_count_frames_per_stream():
+    index = _index(100, streams=2)
+
+    assert _picked('stream=1,frames=0:6', index) == [1, 3, 5]
+    # One second at 25 fps is frames 25..49 of each stream, i.e. file frames 50..99
+    assert _picked('seconds=1:2', index) == list(range(50, 100))
+
+@pytest.mark.parametrize('spec', ['seconds=1:2', 'delta,stream=1', 'frames=10:40,min-size=300', 'keyframes'])
+def test_accepts_matches_mask_frame_by_frame(spec):
+    index = _index(100, streams=2)
+    selection = FrameSelection(spec)
+    mask = selection.mask(index)
+
+    accepted = [selection.accepts(i, index.sizes[i], bool(index.flags[i] & AVIIF_KEYFRAME),
+                                  index.stream_ids[i], index.fps)
+                for i in range(len(index))]
+
+    assert accepted == [bool(b) for b in mask]
+
+def test_rank_predicates_cannot_stream():
+    selection = FrameSelection('largest=5%')
+
+    assert selection.needs_ranking
+    with pytest.raises(ValueError):
+        selection.accepts(0, 100, True, 0, 25.0)
@@ -0,0 +1,65 @@
+import pytest
+from glitcher import tile_pattern
+from tiles import TILE_CACHE_BYTES, TileCache
+
+PATTERNS = [b'\x00', b'\xff\xee', b'ABC', bytes(range(256)), b'0123456789']
+
+def _expected(stack, size):
+    return tile_pattern(b''.join(PATTERNS[i] for i in stack), size)
+
+@pytest.mark.parametrize('pattern', range(len(PATTERNS)))
+@pytest.mark.parametrize('size', [1, 2, 7, 256, 1000])
+def test_get_matches_tile_pattern(pattern, size):
+    tiles = TileCache(PATTERNS, tile_size=64)
+
+    assert bytes(tiles.get(pattern, size)) == _expected((pattern,), size)
+
+def test_get_reuses_tile_and_grows_it_on_demand():
+    tiles = TileCache(PATTERNS, tile_size=64)
+
+    tiles.get(2, 10)
+    tiles.get(2, 64)
+    assert tiles.misses == 1
+    assert bytes(tiles.get(2, 500)) == _expected((2,), 500)
+    assert tiles.misses == 2
+    assert len(tiles) == 1
+    assert tiles.nbytes == len(tiles.tiles[2])
+
+@pytest.mark.parametrize('stack', [(0, 1), (1, 2, 2), (3, 4), (4, 0, 1, 2, 3)])
+@pytest.mark.parametrize('size', [1, 3, 5, 300, 1500])
+def test_fill_writes_stack_in_place(stack, size):
+    tiles = TileCache(PATTERNS)
+    data = bytearray(b'.' * (size + 8))
+
+    with memoryview(data) as view:
+        tiles.fill(view, 4, 4 + size, stack)
+
+    assert data == b'....' + _expected(stack, size) + b'....'
+
+@pytest.mark.parametrize('stack', [(3,), (1, 2), (0, 4, 3)])
+def test_stacked_returns_a_buffer_of_the_stack(stack):
+    tiles = TileCache(PATTERNS, tile_size=32)
+
+    assert bytes(tiles.stacked(stack, 777)) == _expected(stack, 777)
+
+def test_lru_evicts_least_recently_used_tiles():
+    tiles = TileCache(PATTERNS, tile_size=100, max_bytes=350)
+    for pattern in (0, 1, 2):
+        tiles.get(pattern, 100)
+    tiles.get(0, 100)      # 0 becomes the most recently used
+
+    tiles.get(4, 100)      # over budget: 1 is the oldest
+
+    assert list(tiles.tiles) == [2, 0, 4]
+    assert tiles.nbytes <= 350
+
+def test_cache_stays_within_default_budget():
+    patterns = [bytes([i]) * 3 for i in range(256)]
+    tiles = TileCache(patterns, tile_size=64 * 1024)
+
+    for i in range(len(patterns)):
+        tiles.get(i, 64 * 1024)
+
+    assert tiles.nbytes <= TILE_CACHE_BYTES
+    assert 0 < len(tiles) < len(patterns)
+    assert bytes(tiles.get(0, 10)) == bytes(30)[:10]
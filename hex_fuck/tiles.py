@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
+TILE_CACHE_BYTES = 8 * 1024 * 1024  # Small enough for the tiles to stay in CPU cache
+
+class TileCache:
+    """
+    Overwrite bytes for pattern stacks, byte-identical to
+    tile_pattern(b''.join(stack patterns), size) without joining or tiling per
+    write. Each pattern is repeated into a tile (at least tile_size bytes) the
+    first time a one-pattern stack uses it, so those writes are zero-copy
+    memoryview slices; tiles live in an LRU bounded by max_bytes. Deeper stacks
+    rarely repeat, so fill writes them straight from the pattern bytes and then
+    doubles the first period in place.
+    """
+    def __init__(self, patterns: Sequence[bytes], tile_size: int = 0, max_bytes: int = TILE_CACHE_BYTES):
+        self.patterns = [memoryview(pattern) for pattern in patterns]
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.misses = 0
+        self.tiles: 'OrderedDict[int, memoryview]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def get(self, pattern: int, size: int) -> memoryview:
+        """The first size bytes of one pattern repeated"""
+        tile = self.tiles.get(pattern)
+        if tile is None or len(tile) < size:
+            return self.build(pattern, size)
+        self.tiles.move_to_end(pattern)
+        return tile[:size]
+
+    def build(self, pattern: int, size: int) -> memoryview:
+        """Miss path of get: tile the pattern, cache it and slice size bytes"""
+        self.misses += 1
+        tiles = self.tiles
+        raw = self.patterns[pattern].tobytes()
+        length = max(size, self.tile_size)
+        tile = memoryview(raw * ((length + len(raw) - 1) // len(raw)))
+        old = tiles.pop(pattern, None)
+        if old is not None:
+            self.nbytes -= len(old)
+        tiles[pattern] = tile
+        self.nbytes += len(tile)
+        while self.nbytes > self.max_bytes and len(tiles) > 1:
+            self.nbytes -= len(tiles.popitem(last=False)[1])
+        return tile[:size]
+
+    def fill(self, view: memoryview, offset: int, end: int, stack: Tuple[int, ...]):
+        """Write stack's patterns, joined and repeated, into view[offset:end]"""
+        patterns = self.patterns
+        pos = offset
+        for i in stack:
+            pattern = patterns[i]
+            step = pos + len(pattern)
+            if step >= end:
+                view[pos:end] = pattern[:end - pos]
+                return
+            view[pos:step] = pattern
+            pos = step
+        # view[offset:pos] holds whole periods: copy it forward, doubling each time
+        while pos < end:
+            step = min(end, 2 * pos - offset)
+            view[pos:step] = view[offset:offset + step - pos]
+            pos = step
+
+    def stacked(self, stack: Tuple[int, ...], size: int):
+        """The first size bytes of stack's patterns joined and repeated, as a buffer of its own"""
+        if len(stack) == 1:
+            return self.get(stack[0], size)
+        out = bytearray(size)
+        with memoryview(out) as view:
+            self.fill(view, 0, size, stack)
+        return out